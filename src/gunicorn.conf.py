@@ -0,0 +1,81 @@
+"""
+Gunicorn configuration for serving the ASGI application with uvicorn workers.
+
+Run from the ``src/`` directory:
+
+    gunicorn
+
+Every worker is a separate process with its own event loop, so a slow client
+costs a coroutine instead of a thread. All values can be overridden with
+environment variables or on the command line.
+"""
+
+import math
+import os
+
+
+def cpu_count():
+    """
+    CPUs this process may actually use: the cgroup quota in a container
+    limited with ``--cpus``, else the CPUs it is pinned to.
+    """
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, period = f.read().split()
+        if quota != "max":
+            return max(1, math.ceil(int(quota) / int(period)))
+    except (OSError, ValueError):
+        pass
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 2
+
+
+wsgi_app = "project_core.asgi:application"
+worker_class = "uvicorn_worker.UvicornWorker"
+
+bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:8000")
+
+# Password hashing runs in a thread pool inside every worker, so more
+# processes than cores only adds memory and database connections
+workers = int(os.environ.get("GUNICORN_WORKERS", cpu_count()))
+
+# Replace a worker after about this many requests, so memory that leaks or
+# fragments over time is given back; the jitter keeps workers from all
+# restarting at once. 0 disables recycling.
+max_requests = int(os.environ.get("GUNICORN_MAX_REQUESTS", 10000))
+max_requests_jitter = int(os.environ.get("GUNICORN_MAX_REQUESTS_JITTER", 1000))
+
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 30))
+graceful_timeout = int(os.environ.get("GUNICORN_GRACEFUL_TIMEOUT", 30))
+keepalive = int(os.environ.get("GUNICORN_KEEPALIVE", 5))
+
+accesslog = os.environ.get("GUNICORN_ACCESS_LOG", "-")
+errorlog = "-"
+
+# Import Django, compile URLs and templates and build the in-memory indexes
+# once in the arbiter; workers fork with all of it and share the memory, so
+# new and recycled workers start at full speed
+preload_app = os.environ.get("GUNICORN_PRELOAD", "1") == "1"
+
+
+def when_ready(server):
+    if preload_app:
+        from users.warmup import describe, warm_up
+
+        # Nothing that opens sockets or threads, they would not survive the fork
+        server.log.info("Warmed up the arbiter: %s", describe(warm_up(database=False)))
+
+
+def post_worker_init(worker):
+    from users.warmup import describe, warm_up
+
+    # Per process: fill the connection pool and load the regions
+    worker.log.info("Warmed up worker %s: %s", worker.pid, describe(warm_up()))
+
+
+def worker_exit(server, worker):
+    from users.writebehind import flush
+
+    # Buffered last_login updates and auth events, before the process goes
+    worker.log.info("Flushed %s buffered auth writes from worker %s", flush(), worker.pid)
@@ -11,7 +11,11 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
 from pathlib import Path
+import json
 import os
+import tempfile
+
+from django.core.exceptions import ImproperlyConfigured
 
 # ONLY for Windows
 if os.name == 'nt':
@@ -28,16 +32,39 @@ if os.name == 'nt':
 BASE_DIR = Path(__file__).resolve().parent.parent
 
 
-# Quick-start development settings - unsuitable for production
+# Deployment profile
 # See https://docs.djangoproject.com/en/5.2/howto/deployment/checklist/
+# DJANGO_ENV=production turns DEBUG off (which also stops Django from keeping
+# every SQL query in memory) and requires the secret key and allowed hosts
+# from the environment. The development defaults are unsuitable for production.
+
+PRODUCTION = os.environ.get("DJANGO_ENV", "development") == "production"
+
+
+def _env_list(name, default=""):
+    return [item.strip() for item in os.environ.get(name, default).split(",") if item.strip()]
+
 
 # SECURITY WARNING: keep the secret key used in production secret!
-SECRET_KEY = "django-insecure-ir1a1f!bjywcs+1$shmpbq=6ss3!0!^%tha*midcv=mn*48x^f"
+if PRODUCTION and not os.environ.get("DJANGO_SECRET_KEY"):
+    raise ImproperlyConfigured("Set DJANGO_SECRET_KEY when DJANGO_ENV=production.")
+SECRET_KEY = (
+    os.environ.get("DJANGO_SECRET_KEY") or "django-insecure-ir1a1f!bjywcs+1$shmpbq=6ss3!0!^%tha*midcv=mn*48x^f"
+)
 
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
+DEBUG = os.environ.get("DJANGO_DEBUG", "0" if PRODUCTION else "1") == "1"
+
+# Comma-separated, e.g. "dyvo.ua,www.dyvo.ua"
+ALLOWED_HOSTS = _env_list("DJANGO_ALLOWED_HOSTS")
+# Scheme and host, e.g. "https://dyvo.ua"
+CSRF_TRUSTED_ORIGINS = _env_list("DJANGO_CSRF_TRUSTED_ORIGINS")
 
-ALLOWED_HOSTS = []
+if PRODUCTION:
+    # TLS ends at nginx or in front of it; nginx passes the original scheme
+    SECURE_PROXY_SSL_HEADER = ("HTTP_X_FORWARDED_PROTO", "https")
+    SESSION_COOKIE_SECURE = CSRF_COOKIE_SECURE = os.environ.get("DJANGO_SECURE_COOKIES", "1") == "1"
+    SECURE_HSTS_SECONDS = int(os.environ.get("DJANGO_HSTS_SECONDS", "0"))
 
 
 # Application definition
@@ -50,12 +77,32 @@ INSTALLED_APPS = [
     "django.contrib.messages",
     "django.contrib.staticfiles",
     "django.contrib.gis",
+    "django.contrib.postgres",
     "users",
 ]
 
 AUTH_USER_MODEL = "users.CustomUser"
 
+# There is no home page yet, signed-in users land on the site root
+LOGIN_URL = "login"
+LOGIN_REDIRECT_URL = "/"
+
+# Failed logins allowed per client IP and per email within WINDOW seconds,
+# checked before any password is hashed. BACKEND "memory" counts per worker
+# process, "cache" shares the counts through CACHES[CACHE_ALIAS].
+LOGIN_THROTTLE = {
+    "BACKEND": os.environ.get("DJANGO_LOGIN_THROTTLE_BACKEND", "memory"),
+    "CACHE_ALIAS": "default",
+    "WINDOW": 15 * 60,
+    "IP_LIMIT": 30,
+    "EMAIL_LIMIT": 5,
+    # Registration's "is this email taken?" lookups, per IP. The form asks
+    # once per edit of the field, and many people may share one NAT
+    "EMAIL_CHECK_LIMIT": 60,
+}
+
 MIDDLEWARE = [
+    "users.middleware.PerformanceMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -69,7 +116,7 @@ ROOT_URLCONF = "project_core.urls"
 
 TEMPLATES = [
     {
-        "BACKEND": "django.template.backends.django.DjangoTemplates",
+        "BACKEND": "users.templating.DjangoTemplates",
         "DIRS": [],
         "APP_DIRS": True,
         "OPTIONS": {
@@ -77,6 +124,7 @@ TEMPLATES = [
                 "django.template.context_processors.request",
                 "django.contrib.auth.context_processors.auth",
                 "django.contrib.messages.context_processors.messages",
+                "users.context_processors.page_cache",
             ],
         },
     },
@@ -91,17 +139,101 @@ WSGI_APPLICATION = "project_core.wsgi.application"
 DATABASES = {
     "default": {
         "ENGINE": "django.contrib.gis.db.backends.postgis",
-        "HOST": "localhost",
-        "PORT": "5432",
-        "NAME": "django",
-        "USER": "django",
-        "PASSWORD": "django",
+        "HOST": os.environ.get("DJANGO_DB_HOST", "localhost"),
+        "PORT": os.environ.get("DJANGO_DB_PORT", "5432"),
+        "NAME": os.environ.get("DJANGO_DB_NAME", "django"),
+        "USER": os.environ.get("DJANGO_DB_USER", "django"),
+        "PASSWORD": os.environ.get("DJANGO_DB_PASSWORD", "django"),
+        # Ping a reused connection before handing it out. Without a pool Django
+        # checks it itself; with the pool Django skips its own check and
+        # passes ConnectionPool.check_connection to psycopg_pool instead
+        # (Django 5.2, psycopg-pool 3.2+), so "check" must not be set in
+        # the pool options below
+        "CONN_HEALTH_CHECKS": True,
         "TEST": {
             "NAME": "django_test",
         },
     }
 }
 
+# Connection pooling (psycopg_pool), one pool per worker process. It works
+# the same for WSGI threads and ASGI, where Django returns the connection to
+# the pool at the end of each request. With DJANGO_DB_POOL=0 connections are
+# kept per thread for DJANGO_CONN_MAX_AGE seconds instead.
+if os.environ.get("DJANGO_DB_POOL", "1") == "1":
+    DATABASES["default"]["OPTIONS"] = {
+        "pool": {
+            "min_size": int(os.environ.get("DJANGO_DB_POOL_MIN_SIZE", "2")),
+            "max_size": int(os.environ.get("DJANGO_DB_POOL_MAX_SIZE", "10")),
+            # Recycle connections so server-side memory and stale plans go away
+            "max_lifetime": float(os.environ.get("DJANGO_DB_POOL_MAX_LIFETIME", "1800")),
+            "max_idle": float(os.environ.get("DJANGO_DB_POOL_MAX_IDLE", "300")),
+            # Seconds a request waits for a free connection before failing
+            "timeout": float(os.environ.get("DJANGO_DB_POOL_TIMEOUT", "10")),
+        },
+    }
+else:
+    DATABASES["default"]["CONN_MAX_AGE"] = int(os.environ.get("DJANGO_CONN_MAX_AGE", "60"))
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# Local memory by default; DJANGO_CACHE_BACKEND=file shares entries between
+# worker processes on one host through DJANGO_CACHE_LOCATION
+
+if os.environ.get("DJANGO_CACHE_BACKEND") == "file":
+    cache_location = os.environ.get("DJANGO_CACHE_LOCATION", os.path.join(tempfile.gettempdir(), "dyvo-cache"))
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+            "LOCATION": cache_location,
+            "OPTIONS": {"MAX_ENTRIES": 10000},
+        },
+        "sessions": {
+            "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+            "LOCATION": cache_location + "-sessions",
+            "OPTIONS": {"MAX_ENTRIES": 50000},
+        },
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "dyvo",
+            "OPTIONS": {"MAX_ENTRIES": 10000},
+        },
+        "sessions": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "dyvo-sessions",
+            "OPTIONS": {"MAX_ENTRIES": 50000},
+        },
+    }
+
+
+# Sessions
+# https://docs.djangoproject.com/en/5.2/topics/http/sessions/
+# cached_db reads sessions from the "sessions" cache and only goes to the
+# database on a miss; signed_cookies keeps the (small) session in the cookie
+# itself. With several worker processes use DJANGO_CACHE_BACKEND=file, so a
+# logout in one process is seen by the others.
+
+SESSION_ENGINE = {
+    "db": "django.contrib.sessions.backends.db",
+    "cached_db": "django.contrib.sessions.backends.cached_db",
+    "signed_cookies": "django.contrib.sessions.backends.signed_cookies",
+}[os.environ.get("DJANGO_SESSION_ENGINE", "cached_db")]
+SESSION_CACHE_ALIAS = "sessions"
+
+# The signed-in user is cached too (users.backends), so AuthenticationMiddleware
+# does not query the user table on every request
+AUTHENTICATION_BACKENDS = ["users.backends.CachedModelBackend"]
+# Signed-in users are only cached where every process sees the same cache:
+# in a per-process local memory cache, other workers would keep serving a
+# deactivated user or an old password hash after the change. So it defaults to
+# None, which turns the user cache off, unless DJANGO_CACHE_BACKEND=file
+USER_CACHE_ALIAS = "sessions" if os.environ.get("DJANGO_CACHE_BACKEND") == "file" else None
+USER_CACHE_TIMEOUT = 300
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -121,6 +253,73 @@ AUTH_PASSWORD_VALIDATORS = [
 ]
 
 
+# Password hashing
+# https://docs.djangoproject.com/en/5.2/topics/auth/passwords/
+
+# Hasher costs calibrated on the production host by
+# `manage.py calibrate_hashers --write`; Django's defaults without the file
+PASSWORD_HASHERS_FILE = Path(os.environ.get("DJANGO_PASSWORD_HASHERS_FILE", BASE_DIR / "password_hashers.json"))
+try:
+    _hasher_calibration = json.loads(PASSWORD_HASHERS_FILE.read_text(encoding="utf-8"))
+except FileNotFoundError:
+    _hasher_calibration = {}
+
+PASSWORD_HASHER_PARAMS = _hasher_calibration.get("params", {})
+
+_TUNED_HASHERS = {
+    "pbkdf2_sha256": "users.hashers.TunedPBKDF2PasswordHasher",
+    "argon2": "users.hashers.TunedArgon2PasswordHasher",
+    "scrypt": "users.hashers.TunedScryptPasswordHasher",
+}
+_preferred_hasher = _hasher_calibration.get("preferred", "pbkdf2_sha256")
+
+# The first hasher hashes new passwords, the rest only verify old hashes,
+# which are rehashed with the first one on the user's next login
+PASSWORD_HASHERS = [
+    _TUNED_HASHERS[_preferred_hasher],
+    *(path for algorithm, path in _TUNED_HASHERS.items() if algorithm != _preferred_hasher),
+    "django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher",
+]
+
+
+# Email
+# https://docs.djangoproject.com/en/5.2/topics/email/
+# Defaults point at the MailHog container from containers/compose.yaml,
+# whose web UI at http://localhost:8025 shows everything sent
+
+EMAIL_HOST = os.environ.get("DJANGO_EMAIL_HOST", "localhost")
+EMAIL_PORT = int(os.environ.get("DJANGO_EMAIL_PORT", "1025"))
+EMAIL_HOST_USER = os.environ.get("DJANGO_EMAIL_HOST_USER", "")
+EMAIL_HOST_PASSWORD = os.environ.get("DJANGO_EMAIL_HOST_PASSWORD", "")
+EMAIL_USE_TLS = os.environ.get("DJANGO_EMAIL_USE_TLS", "0") == "1"
+EMAIL_TIMEOUT = 10
+DEFAULT_FROM_EMAIL = os.environ.get("DJANGO_DEFAULT_FROM_EMAIL", "Dyvo <noreply@dyvo.ua>")
+
+# Mail is queued in the database and sent by `manage.py run_worker`.
+# A failed message is retried after BACKOFF seconds, doubling up to
+# MAX_BACKOFF, and marked failed after MAX_ATTEMPTS; an SMTP connection
+# unused for IDLE_DISCONNECT seconds is closed.
+EMAIL_QUEUE = {
+    "BATCH_SIZE": 50,
+    "POLL_INTERVAL": 1.0,
+    "MAX_ATTEMPTS": 8,
+    "BACKOFF": 30,
+    "MAX_BACKOFF": 60 * 60,
+    "IDLE_DISCONNECT": 60,
+}
+
+
+# Write-behind buffer for sign-in side effects (users.writebehind): last_login
+# updates and AuthEvent rows are written by a background thread in each
+# worker every FLUSH_INTERVAL seconds or once BATCH_SIZE events wait, never
+# more than MAX_PENDING events held in memory.
+AUTH_EVENTS = {
+    "BATCH_SIZE": 500,
+    "FLUSH_INTERVAL": float(os.environ.get("DJANGO_AUTH_EVENTS_FLUSH_INTERVAL", "2")),
+    "MAX_PENDING": 10_000,
+}
+
+
 # Internationalization
 # https://docs.djangoproject.com/en/5.2/topics/i18n/
 
@@ -136,10 +335,63 @@ USE_TZ = True
 # Static files (CSS, JavaScript, Images)
 # https://docs.djangoproject.com/en/5.2/howto/static-files/
 
-STATIC_URL = "static/"
+# Point at the static file server in production, e.g. "http://localhost:8888/"
+STATIC_URL = os.environ.get("DJANGO_STATIC_URL", "static/")
 STATIC_ROOT = BASE_DIR.parent / "staticfiles"
 
+# collectstatic writes content-hashed names plus .gz/.br copies, which Caddy
+# serves with immutable caching (containers/caddy/Caddyfile)
+STORAGES = {
+    "default": {
+        "BACKEND": "django.core.files.storage.FileSystemStorage",
+    },
+    "staticfiles": {
+        "BACKEND": "users.storage.CompressedManifestStaticFilesStorage",
+    },
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
+
+
+# Project settings
+
+# Threads that may hash passwords concurrently for async views; leave the
+# remaining cores for the rest of the request traffic
+PASSWORD_HASHING_WORKERS = max(1, (os.cpu_count() or 2) // 2)
+
+# Resolve points to regions with the in-memory STRtree of prepared
+# boundaries; when False every lookup goes to PostGIS
+REGION_LOOKUP_IN_MEMORY = True
+
+# Seconds a rendered anonymous page stays in the page cache
+PAGE_CACHE_TIMEOUT = 600
+
+# Requests slower than this many milliseconds are logged with their queries
+# to the "users.performance" logger; unset to disable the slow log
+PERF_SLOW_REQUEST_MS = (
+    int(os.environ["DJANGO_PERF_SLOW_REQUEST_MS"]) if os.environ.get("DJANGO_PERF_SLOW_REQUEST_MS") else None
+)
+
+# Share of requests whose queries are collected for the slow log
+PERF_SLOW_SAMPLE_RATE = float(os.environ.get("DJANGO_PERF_SLOW_SAMPLE_RATE", "0.01"))
+
+# /metrics answers clients from these networks (comma-separated CIDRs) and
+# requests with "Authorization: Bearer <DJANGO_METRICS_TOKEN>"; everyone else
+# gets a 404. Without a token only the host itself can scrape.
+METRICS_ALLOWED_NETWORKS = _env_list("DJANGO_METRICS_ALLOWED_NETWORKS", "127.0.0.0/8,::1/128")
+METRICS_TOKEN = os.environ.get("DJANGO_METRICS_TOKEN", "")
+
+# Vector tiles of user locations (/tiles/z/x/y.mvt), rendered by PostGIS and
+# kept on disk; `manage.py prune_tiles` cuts the cache back to CACHE_MAX_BYTES,
+# least recently used out first. Users
+# are merged per cell of a CLUSTER_CELLS x CLUSTER_CELLS grid on each tile.
+TILES = {
+    "CACHE_DIR": os.environ.get("DJANGO_TILE_CACHE_DIR", os.path.join(tempfile.gettempdir(), "dyvo-tiles")),
+    "CACHE_MAX_BYTES": int(os.environ.get("DJANGO_TILE_CACHE_MAX_BYTES", 256 * 1024 * 1024)),
+    "MAX_ZOOM": 14,
+    "CLUSTER_CELLS": 32,
+    "MAX_AGE": 60,
+}
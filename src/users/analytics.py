@@ -0,0 +1,83 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import CustomUser, DailySignups, RollupWatermark
+
+SIGNUPS_ROLLUP = 'daily_signups'
+
+
+def rollup_signups(batch_size=50_000, lag=timedelta(minutes=1)):
+    """
+    Add users registered since the last run to ``DailySignups`` and return
+    how many were counted.
+
+    Only ids above the watermark are read, ``batch_size`` at a time, each
+    batch in its own short transaction. Users younger than ``lag`` wait for
+    the next run, so a registration whose transaction commits late with a
+    lower id is not skipped. The locked watermark row keeps concurrent runs
+    from counting a user twice.
+    """
+    users = connection.ops.quote_name(CustomUser._meta.db_table)
+    rollup = connection.ops.quote_name(DailySignups._meta.db_table)
+    total = 0
+    while True:
+        with transaction.atomic(), connection.cursor() as cursor:
+            watermark, _ = RollupWatermark.objects.select_for_update().get_or_create(name=SIGNUPS_ROLLUP)
+            cursor.execute(
+                f'SELECT max(id) FROM ('
+                f'  SELECT id FROM {users} WHERE id > %s AND date_joined < %s ORDER BY id LIMIT %s'
+                f') AS batch',
+                [watermark.last_id, timezone.now() - lag, batch_size],
+            )
+            upto = cursor.fetchone()[0]
+            if upto is None:
+                return total
+
+            cursor.execute(
+                f'WITH batch AS ('
+                f"  SELECT (date_joined AT TIME ZONE %(tz)s)::date AS day, region_id, count(*) AS count "
+                f'  FROM {users} WHERE id > %(after)s AND id <= %(upto)s GROUP BY 1, 2'
+                f'), added AS ('
+                f'  INSERT INTO {rollup} (day, region_id, count) SELECT day, region_id, count FROM batch '
+                f'  ON CONFLICT (day, region_id) DO UPDATE SET count = {rollup}.count + EXCLUDED.count'
+                f') '
+                f'SELECT coalesce(sum(count), 0) FROM batch',
+                {'tz': settings.TIME_ZONE, 'after': watermark.last_id, 'upto': upto},
+            )
+            total += cursor.fetchone()[0]
+            watermark.last_id = upto
+            watermark.save(update_fields=['last_id', 'updated_at'])
+
+
+def rebuild_signups():
+    """Recount everything from scratch in one transaction, e.g. after deleting users."""
+    with transaction.atomic():
+        RollupWatermark.objects.select_for_update().filter(name=SIGNUPS_ROLLUP).delete()
+        DailySignups.objects.all().delete()
+        return rollup_signups()
+
+
+def signup_series(start, end, region=None):
+    """
+    Signups per day from ``start`` to ``end`` inclusive, read from the
+    rollup only: ``[{'date', 'count', 'regions': {code: count}}]`` with
+    days without signups included as zero.
+    """
+    rows = DailySignups.objects.filter(day__range=(start, end))
+    if region is not None:
+        rows = rows.filter(region=region)
+    days = {}
+    for day, code, count in rows.values_list('day', 'region__code', 'count'):
+        entry = days.setdefault(day, {'count': 0, 'regions': {}})
+        entry['count'] += count
+        entry['regions'][code or 'unknown'] = count
+    series = []
+    day = start
+    while day <= end:
+        entry = days.get(day, {'count': 0, 'regions': {}})
+        series.append({'date': day.isoformat(), **entry})
+        day += timedelta(days=1)
+    return series
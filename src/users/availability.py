@@ -0,0 +1,58 @@
+import threading
+import time
+from collections import OrderedDict
+
+from .models import CustomUser
+
+
+class TTLCache:
+    """Small thread-safe LRU mapping whose entries expire after ``ttl`` seconds."""
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return default
+            value, expires = item
+            if expires < time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+            if len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+
+# Negative cache: emails recently seen as *not* registered. Typing an address
+# re-asks for the same prefixes over and over, so misses are what repeat.
+# The entry is advisory only, the unique index decides on insert.
+_unregistered = TTLCache(maxsize=10_000, ttl=60)
+
+
+def is_email_available(email):
+    key = email.lower()
+    if _unregistered.get(key):
+        return True
+    if CustomUser.objects.filter(email__lower=key).exists():
+        return False
+    _unregistered.set(key, True)
+    return True
+
+
+def mark_registered(email):
+    _unregistered.delete(email.lower())
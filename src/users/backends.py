@@ -0,0 +1,92 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import caches
+
+from .hashing import acheck_password, await_check_duration, check_user_password, wait_check_duration
+
+USER_CACHE_KEY = 'users:auth-user:{}'
+
+
+def _user_cache():
+    # None when users are not cached (USER_CACHE_ALIAS is None)
+    return caches[settings.USER_CACHE_ALIAS] if settings.USER_CACHE_ALIAS else None
+
+
+def forget_user(pk):
+    """Drop the cached copy of a user, called whenever the row changes."""
+    cache = _user_cache()
+    if cache is not None:
+        cache.delete(USER_CACHE_KEY.format(pk))
+
+
+class CachedModelBackend(ModelBackend):
+    """
+    ``ModelBackend`` whose ``get_user()``, run by ``AuthenticationMiddleware``
+    on every authenticated request, is served from the cache. Together with
+    cached sessions an authenticated request needs no query at all. Only
+    with a cache shared by all processes (``USER_CACHE_ALIAS``), so a change
+    saved by one of them reaches the others.
+
+    Unknown emails are answered after a pause as long as a password check
+    instead of hashing a dummy password, so they cost no CPU and cannot be
+    told apart by timing. The async path hashes in the bounded executor.
+    Outdated hashes are upgraded on a successful login, see ``hashing``.
+    """
+
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        user_model = get_user_model()
+        if username is None:
+            username = kwargs.get(user_model.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+        try:
+            user = user_model._default_manager.get_by_natural_key(username)
+        except user_model.DoesNotExist:
+            wait_check_duration()
+            return None
+        if check_user_password(user, password) and self.user_can_authenticate(user):
+            return user
+        return None
+
+    async def aauthenticate(self, request, username=None, password=None, **kwargs):
+        user_model = get_user_model()
+        if username is None:
+            username = kwargs.get(user_model.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+        try:
+            user = await user_model._default_manager.aget_by_natural_key(username)
+        except user_model.DoesNotExist:
+            await await_check_duration()
+            return None
+        if await acheck_password(user, password) and self.user_can_authenticate(user):
+            return user
+        return None
+
+    def get_user(self, user_id):
+        cache = _user_cache()
+        if cache is None:
+            return super().get_user(user_id)
+        key = USER_CACHE_KEY.format(user_id)
+        user = cache.get(key)
+        if user is None:
+            user = super().get_user(user_id)
+            if user is not None:
+                cache.set(key, user, settings.USER_CACHE_TIMEOUT)
+            return user
+        return user if self.user_can_authenticate(user) else None
+
+    async def aget_user(self, user_id):
+        cache = _user_cache()
+        if cache is None:
+            return await super().aget_user(user_id)
+        # Local or file caches, cheap enough to call from the event loop
+        key = USER_CACHE_KEY.format(user_id)
+        user = cache.get(key)
+        if user is None:
+            user = await super().aget_user(user_id)
+            if user is not None:
+                cache.set(key, user, settings.USER_CACHE_TIMEOUT)
+            return user
+        return user if self.user_can_authenticate(user) else None
@@ -0,0 +1,125 @@
+import hashlib
+import time
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.middleware.csrf import get_token
+from django.utils.cache import get_cache_key, get_conditional_response, learn_cache_key, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+from . import metrics
+
+KEY_PREFIX = 'pagecache'
+
+# Rendered into cached pages instead of the per-request CSRF token (see
+# users.context_processors.page_cache) and swapped back on every response
+CSRF_PLACEHOLDER = 'dyvo-page-cache-csrf-token-placeholder'
+
+
+def _is_cacheable(request):
+    # A session cookie means an authenticated or otherwise stateful visitor
+    return request.method in ('GET', 'HEAD') and settings.SESSION_COOKIE_NAME not in request.COOKIES
+
+
+def _respond(request, entry):
+    has_token = CSRF_PLACEHOLDER.encode() in entry['content']
+    token = get_token(request) if has_token else None
+
+    if has_token:
+        # Revalidating an old copy is only safe while the CSRF cookie it was
+        # issued for is unchanged, so the cookie secret is part of the ETag
+        secret = request.META.get('CSRF_COOKIE', '')
+        etag = quote_etag(hashlib.md5(f"{entry['digest']}:{secret}".encode(), usedforsecurity=False).hexdigest())
+        # If-Modified-Since alone cannot tell which token the client holds
+        last_modified = None
+    else:
+        etag = quote_etag(entry['digest'])
+        last_modified = entry['last_modified']
+
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        content = entry['content']
+        if has_token:
+            content = content.replace(CSRF_PLACEHOLDER.encode(), token.encode())
+        response = HttpResponse(content, content_type=entry['content_type'], status=entry['status'])
+
+    response.headers['ETag'] = etag
+    response.headers['Last-Modified'] = http_date(entry['last_modified'])
+    if has_token:
+        patch_cache_control(response, private=True, no_cache=True)
+    else:
+        patch_cache_control(response, public=True, max_age=0, must_revalidate=True)
+    return response
+
+
+def _lookup(request):
+    key = get_cache_key(request, key_prefix=KEY_PREFIX, method='GET', cache=cache)
+    entry = cache.get(key) if key else None
+    # In process memory: a shared cache would pay a write per request here
+    metrics.PAGE_CACHE_LOOKUPS.inc('hit' if entry else 'miss')
+    return entry
+
+
+def _fill_token(request, response):
+    # For freshly rendered pages that turned out not to be cacheable
+    if not response.streaming and CSRF_PLACEHOLDER.encode() in response.content:
+        response.content = response.content.replace(CSRF_PLACEHOLDER.encode(), get_token(request).encode())
+    return response
+
+
+def _store(request, response):
+    if response.status_code != 200 or response.streaming or response.cookies:
+        return None
+    timeout = settings.PAGE_CACHE_TIMEOUT
+    entry = {
+        'content': response.content,
+        'content_type': response['Content-Type'],
+        'status': response.status_code,
+        'last_modified': time.time(),
+        'digest': hashlib.md5(response.content, usedforsecurity=False).hexdigest(),
+    }
+    cache.set(learn_cache_key(request, response, timeout, key_prefix=KEY_PREFIX, cache=cache), entry, timeout)
+    return entry
+
+
+def cache_anonymous_page(view):
+    """
+    Cache GET responses of ``view`` for visitors without a session.
+
+    The page is rendered once with a placeholder instead of the CSRF token,
+    each response gets a fresh token, an ETag and Last-Modified, so browsers
+    and proxies can revalidate with 304s. Works for sync and async views.
+    The cache backends used here are in-process or local files, so they are
+    called directly from async code.
+    """
+    if iscoroutinefunction(view):
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            if not _is_cacheable(request):
+                return await view(request, *args, **kwargs)
+            entry = _lookup(request)
+            if entry is None:
+                request.page_cache_fill = True
+                response = await view(request, *args, **kwargs)
+                entry = _store(request, response)
+                if entry is None:
+                    return _fill_token(request, response)
+            return _respond(request, entry)
+    else:
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if not _is_cacheable(request):
+                return view(request, *args, **kwargs)
+            entry = _lookup(request)
+            if entry is None:
+                request.page_cache_fill = True
+                response = view(request, *args, **kwargs)
+                entry = _store(request, response)
+                if entry is None:
+                    return _fill_token(request, response)
+            return _respond(request, entry)
+
+    return wrapper
@@ -1,71 +1,27 @@
 ﻿from django import forms
 from django.contrib.auth import get_user_model
-from django.contrib.gis.geos import Point
 from django.core.exceptions import ValidationError
 import re
 
+from .regions import get_regions
+from .settlements import get_settlement_index
+
 User = get_user_model()
 
 
+def _region_choices():
+    # Served from the per-process region cache, so validating and rendering
+    # the form never queries the database (see regions.aget_regions)
+    return [('', 'Оберіть область')] + [(name, name) for name in get_regions()]
+
+
 class RegistrationForm(forms.ModelForm):
-    REGION_CHOICES = [
-        ('', 'Оберіть область'),
-        ('Вінницька область', 'Вінницька область'),
-        ('Волинська область', 'Волинська область'),
-        ('Дніпропетровська область', 'Дніпропетровська область'),
-        ('Донецька область', 'Донецька область'),
-        ('Житомирська область', 'Житомирська область'),
-        ('Закарпатська область', 'Закарпатська область'),
-        ('Запорізька область', 'Запорізька область'),
-        ('Івано-Франківська область', 'Івано-Франківська область'),
-        ('Київ (місто)', 'Київ (місто)'),
-        ('Київська область', 'Київська область'),
-        ('Кіровоградська область', 'Кіровоградська область'),
-        ('Львівська область', 'Львівська область'),
-        ('Миколаївська область', 'Миколаївська область'),
-        ('Одеська область', 'Одеська область'),
-        ('Полтавська область', 'Полтавська область'),
-        ('Рівненська область', 'Рівненська область'),
-        ('Сумська область', 'Сумська область'),
-        ('Тернопільська область', 'Тернопільська область'),
-        ('Харківська область', 'Харківська область'),
-        ('Херсонська область', 'Херсонська область'),
-        ('Хмельницька область', 'Хмельницька область'),
-        ('Черкаська область', 'Черкаська область'),
-        ('Чернівецька область', 'Чернівецька область'),
-        ('Чернігівська область', 'Чернігівська область'),
-    ]
-
-    REGION_COORDINATES = {
-        'Вінницька область': (28.4682, 49.2331),
-        'Волинська область': (25.3254, 50.7472),
-        'Дніпропетровська область': (35.0462, 48.4647),
-        'Донецька область': (37.8028, 48.0159),
-        'Житомирська область': (28.6687, 50.2547),
-        'Закарпатська область': (22.2879, 48.6208),
-        'Запорізька область': (35.1396, 47.8388),
-        'Івано-Франківська область': (24.7111, 48.9226),
-        'Київ (місто)': (30.5234, 50.4501),
-        'Київська область': (30.5234, 50.4501),
-        'Кіровоградська область': (32.2623, 48.5079),
-        'Львівська область': (24.0297, 49.8397),
-        'Миколаївська область': (31.9946, 46.9750),
-        'Одеська область': (30.7233, 46.4825),
-        'Полтавська область': (34.5514, 49.5883),
-        'Рівненська область': (26.2516, 50.6199),
-        'Сумська область': (34.7981, 50.9077),
-        'Тернопільська область': (25.5948, 49.5535),
-        'Харківська область': (36.2304, 49.9935),
-        'Херсонська область': (32.6169, 46.6354),
-        'Хмельницька область': (26.9871, 49.4230),
-        'Черкаська область': (32.0637, 49.4444),
-        'Чернівецька область': (25.9355, 48.2921),
-        'Чернігівська область': (31.2893, 51.4982),
-    }
+    EMAIL_TAKEN_ERROR = "Ця електронна адреса вже зареєстрована."
 
     region = forms.ChoiceField(
-        choices=REGION_CHOICES,
+        choices=_region_choices,
         required=False,
+        error_messages={'invalid_choice': "Оберіть область зі списку."},
         widget=forms.TextInput(attrs={
             'class': 'form-control',
             'placeholder': 'Оберіть область',
@@ -75,6 +31,23 @@ class RegistrationForm(forms.ModelForm):
         label='З якої ви області?'
     )
 
+    # Picked from the autocomplete on the page, which fills in the id
+    settlement = forms.IntegerField(
+        required=False,
+        widget=forms.HiddenInput(attrs={'id': 'settlementId'}),
+    )
+    settlement_name = forms.CharField(
+        required=False,
+        max_length=100,
+        widget=forms.TextInput(attrs={
+            'class': 'form-control',
+            'placeholder': 'Почніть вводити назву',
+            'autocomplete': 'off',
+            'id': 'settlementInput'
+        }),
+        label='Звідки ви?'
+    )
+
     password = forms.CharField(
         widget=forms.PasswordInput(attrs={
             'placeholder': 'Придумайте надійний пароль',
@@ -127,11 +100,12 @@ class RegistrationForm(forms.ModelForm):
             }
         }
 
-    def clean_email(self):
-        email = self.cleaned_data.get('email')
-        if User.objects.filter(email=email).exists():
-            raise ValidationError("Ця електронна адреса вже зареєстрована.")
-        return email
+    def _get_validation_exclusions(self):
+        # Email uniqueness is left to the unique index on insert (see
+        # register_view), so skip the SELECT Django would run beforehand
+        exclude = super()._get_validation_exclusions()
+        exclude.add('email')
+        return exclude
 
     def clean_first_name(self):
         first_name = self.cleaned_data.get('first_name')
@@ -152,32 +126,85 @@ class RegistrationForm(forms.ModelForm):
         return password
 
     def clean_region(self):
-        region = self.cleaned_data.get('region')
-        if region:
-            valid_regions = [choice[0] for choice in self.REGION_CHOICES]
-            if region not in valid_regions:
-                pass
-        return region
+        name = self.cleaned_data.get('region')
+        return get_regions()[name] if name else None
+
+    def clean_settlement(self):
+        pk = self.cleaned_data.get('settlement')
+        index = get_settlement_index()
+        if pk is not None:
+            settlement = index.get(pk)
+        elif self.data.get('settlement_name', '').strip():
+            # Typed without picking from the list, e.g. with JavaScript off
+            settlement = index.find_by_name(self.data['settlement_name'])
+        else:
+            return None
+        if settlement is None:
+            raise ValidationError("Оберіть населений пункт зі списку.")
+        return settlement
 
     def clean(self):
         cleaned_data = super().clean()
+        settlement = cleaned_data.get('settlement')
+        if settlement is not None:
+            # The settlement's own region is authoritative
+            regions = {region.code: region for region in get_regions().values()}
+            cleaned_data['region'] = regions.get(settlement.region_code)
+
         password = cleaned_data.get("password")
         confirm_password = cleaned_data.get("confirm_password")
 
         if password and confirm_password and password != confirm_password:
             self.add_error('confirm_password', "Паролі не співпадають.")
 
-    def save(self, commit=True):
+    def build_user(self):
+        # Unsaved user without a password, so callers decide where to hash it
         user = super().save(commit=False)
-        region_name = self.cleaned_data.get('region')
+        region = self.cleaned_data.get('region')
+        settlement = self.cleaned_data.get('settlement')
 
-        if region_name and region_name in self.REGION_COORDINATES:
-            lng, lat = self.REGION_COORDINATES[region_name]
-            user.location = Point(lng, lat)
+        user.region = region
+        if settlement is not None:
+            user.location = settlement.point
         else:
-            user.location = None
+            user.location = region.label_point if region else None
+        return user
 
+    def save(self, commit=True):
+        user = self.build_user()
         user.set_password(self.cleaned_data["password"])
         if commit:
             user.save()
         return user
+
+
+class LoginForm(forms.Form):
+    INVALID_LOGIN_ERROR = "Невірна електронна адреса або пароль."
+    THROTTLED_ERROR = "Забагато спроб входу. Спробуйте через {minutes} хв."
+
+    username = forms.EmailField(
+        max_length=254,
+        widget=forms.EmailInput(attrs={
+            'placeholder': 'emailaddress@gmail.com',
+            'class': 'form-control',
+            'id': 'id_email',
+            'autocomplete': 'email',
+        }),
+        label='Електронна адреса',
+        error_messages={
+            'required': "Введіть електронну адресу.",
+            'invalid': "Введіть коректну електронну адресу.",
+        }
+    )
+    password = forms.CharField(
+        max_length=128,
+        strip=False,
+        widget=forms.PasswordInput(attrs={
+            'placeholder': 'Ваш пароль',
+            'class': 'form-control',
+            'id': 'id_password',
+            'autocomplete': 'current-password',
+        }),
+        label="Пароль",
+        error_messages={'required': "Будь ласка, введіть пароль."}
+    )
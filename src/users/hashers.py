@@ -0,0 +1,53 @@
+from django.conf import settings
+from django.contrib.auth.hashers import Argon2PasswordHasher, PBKDF2PasswordHasher, ScryptPasswordHasher
+
+# The tuned hashers keep the stock algorithm names, so hashes stay readable by
+# plain Django and a changed parameter makes must_update() flag old hashes
+
+
+def _param(hasher, name, default):
+    return settings.PASSWORD_HASHER_PARAMS.get(hasher.algorithm, {}).get(name, default)
+
+
+class TunedPBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    """PBKDF2-SHA256 with the iteration count from ``PASSWORD_HASHER_PARAMS``."""
+
+    @property
+    def iterations(self):
+        return _param(self, 'iterations', PBKDF2PasswordHasher.iterations)
+
+
+class TunedArgon2PasswordHasher(Argon2PasswordHasher):
+    """Argon2id with the costs from ``PASSWORD_HASHER_PARAMS``, needs argon2-cffi."""
+
+    @property
+    def time_cost(self):
+        return _param(self, 'time_cost', Argon2PasswordHasher.time_cost)
+
+    @property
+    def memory_cost(self):
+        return _param(self, 'memory_cost', Argon2PasswordHasher.memory_cost)
+
+    @property
+    def parallelism(self):
+        return _param(self, 'parallelism', Argon2PasswordHasher.parallelism)
+
+
+class TunedScryptPasswordHasher(ScryptPasswordHasher):
+    """scrypt with the work factor from ``PASSWORD_HASHER_PARAMS``."""
+
+    @property
+    def work_factor(self):
+        return _param(self, 'work_factor', ScryptPasswordHasher.work_factor)
+
+    @property
+    def block_size(self):
+        return _param(self, 'block_size', ScryptPasswordHasher.block_size)
+
+    @property
+    def parallelism(self):
+        return _param(self, 'parallelism', ScryptPasswordHasher.parallelism)
+
+    @property
+    def maxmem(self):
+        return _param(self, 'maxmem', ScryptPasswordHasher.maxmem)
@@ -0,0 +1,101 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password, verify_password
+
+from . import metrics
+
+# hashlib releases the GIL while it hashes, so a small thread pool gives real
+# parallelism while capping how many cores password hashing may occupy
+_executor = None
+
+# Moving average of how long one password check takes. Logins with unknown
+# emails wait this long instead of hashing a dummy password.
+_check_duration = None
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.PASSWORD_HASHING_WORKERS,
+            thread_name_prefix='password-hashing',
+        )
+    return _executor
+
+
+async def amake_password(password):
+    loop = asyncio.get_running_loop()
+    with metrics.timed('hash_time'):
+        return await loop.run_in_executor(get_executor(), make_password, password)
+
+
+async def aset_password(user, raw_password):
+    """Async counterpart of ``AbstractBaseUser.set_password``."""
+    user.password = await amake_password(raw_password)
+    user._password = raw_password
+
+
+def _check_password(raw_password, encoded):
+    """``(is_correct, must_update)``, timing the check for the moving average."""
+    global _check_duration
+    started = time.perf_counter()
+    result = verify_password(raw_password, encoded)
+    elapsed = time.perf_counter() - started
+    _check_duration = elapsed if _check_duration is None else 0.9 * _check_duration + 0.1 * elapsed
+    return result
+
+
+def _measure_check_duration():
+    # One real hash the first time it is needed, never again per request
+    global _check_duration
+    if _check_duration is None:
+        _check_password('timing', make_password('dummy-password'))
+    return _check_duration
+
+
+def check_user_password(user, raw_password):
+    """
+    ``user.check_password()``, timed for the metrics. A correct password
+    whose hash is outdated (another hasher or weaker parameters than the
+    current ``PASSWORD_HASHERS``) is rehashed and saved right away.
+    """
+    with metrics.timed('hash_time'):
+        is_correct, must_update = _check_password(raw_password, user.password)
+        if is_correct and must_update:
+            user.set_password(raw_password)
+    if is_correct and must_update:
+        user.save(update_fields=['password'])
+    return is_correct
+
+
+async def acheck_password(user, raw_password):
+    """
+    Check ``raw_password`` against ``user`` in the hashing executor, with the
+    same rehash as ``check_user_password()``. Only the hashing leaves the
+    event loop, the save stays on it like every other async query.
+    """
+    loop = asyncio.get_running_loop()
+    with metrics.timed('hash_time'):
+        is_correct, must_update = await loop.run_in_executor(
+            get_executor(), _check_password, raw_password, user.password
+        )
+    if is_correct and must_update:
+        await aset_password(user, raw_password)
+        await user.asave(update_fields=['password'])
+    return is_correct
+
+
+def wait_check_duration():
+    """Block for about as long as a password check takes."""
+    time.sleep(_measure_check_duration())
+
+
+async def await_check_duration():
+    if _check_duration is None:
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(get_executor(), _measure_check_duration)
+    else:
+        await asyncio.sleep(_check_duration)
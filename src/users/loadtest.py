@@ -0,0 +1,197 @@
+"""
+Load generator for the signup and login flows.
+
+Talks plain HTTP to a running server (``runserver``, uvicorn or gunicorn in
+front of the compose PostGIS), so it measures the whole stack. Every virtual
+client keeps its own cookies, reads the CSRF token from the form like a
+browser would, registers a synthetic user in a random region and signs in
+with it afterwards. Only the standard library is used.
+"""
+
+import http.cookiejar
+import json
+import random
+import re
+import statistics
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+import uuid
+from dataclasses import dataclass
+
+from .regions import REGIONS_GEOJSON
+
+# Transliterated (KMU 2010), as the registration form only accepts Latin letters
+FIRST_NAMES = [
+    'Oleksandr', 'Olena', 'Andrii', 'Iryna', 'Dmytro', 'Nataliia', 'Serhii', 'Tetiana',
+    'Mykola', 'Oksana', 'Yurii', 'Kateryna', 'Volodymyr', 'Yuliia', 'Bohdan', 'Sofiia',
+    'Taras', 'Hanna', 'Vasyl', 'Marharyta', 'Ostap', 'Khrystyna', 'Yaroslav', 'Solomiia',
+    'Ihor', 'Liudmyla', 'Maksym', 'Viktoriia', 'Petro', 'Zoriana', 'Anatolii', 'Halyna',
+]
+PASSWORD = 'Loadtest2024'
+EMAIL_DOMAIN = 'loadtest.dyvo.ua'
+
+CSRF_INPUT_RE = re.compile(r'name="csrfmiddlewaretoken" value="([^"]+)"')
+
+
+def region_names(path=REGIONS_GEOJSON):
+    with open(path, encoding='utf-8') as f:
+        return [feature['properties']['name'] for feature in json.load(f)['features']]
+
+
+def _has_csrf_input(status, content):
+    return CSRF_INPUT_RE.search(content) is not None
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    # A redirect after a POST is the result we measure, not a page to load
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        return None
+
+
+@dataclass
+class LoadTestConfig:
+    base_url: str = 'http://127.0.0.1:8000'
+    clients: int = 20
+    iterations: int = 10
+    timeout: float = 30.0
+    seed: int | None = None
+
+
+class Client:
+    """One visitor with its own cookie jar."""
+
+    def __init__(self, config, record):
+        self.config = config
+        self.record = record
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()),
+            _NoRedirect,
+        )
+
+    def request(self, step, path, data=None, expect=None):
+        """
+        Send one request and record it under ``step``. It counts as an error
+        on a 4xx/5xx status, a network failure, or when ``expect`` returns
+        False for ``(status, content)``.
+        """
+        url = urllib.parse.urljoin(self.config.base_url, path)
+        body = urllib.parse.urlencode(data).encode() if data is not None else None
+        request = urllib.request.Request(url, data=body, headers={'Referer': url})
+
+        started = time.perf_counter()
+        try:
+            with self.opener.open(request, timeout=self.config.timeout) as response:
+                status, content = response.status, response.read()
+        except urllib.error.HTTPError as exc:
+            # Redirects end up here as well because of _NoRedirect
+            status, content = exc.code, exc.read()
+        except OSError:
+            status, content = None, b''
+        elapsed = time.perf_counter() - started
+
+        content = content.decode('utf-8', 'replace')
+        ok = status is not None and status < 400 and (expect is None or expect(status, content))
+        self.record(step, elapsed, ok)
+        return status, content
+
+    def csrf_token(self, path):
+        _, content = self.request(f'GET {path}', path, expect=_has_csrf_input)
+        match = CSRF_INPUT_RE.search(content)
+        return match.group(1) if match else None
+
+
+class LoadTest:
+    """
+    Run ``config.clients`` concurrent visitors, each doing ``config.iterations``
+    rounds of: read the terms, register, then sign in from a fresh session.
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self.random = random.Random(config.seed)
+        self.regions = region_names()
+        self.run_id = uuid.uuid4().hex[:8]
+        self.samples = {}
+        self.lock = threading.Lock()
+
+    def record(self, step, elapsed, ok):
+        with self.lock:
+            latencies, errors = self.samples.setdefault(step, ([], [0]))
+            latencies.append(elapsed)
+            errors[0] += not ok
+
+    def user(self, client_no, iteration):
+        with self.lock:
+            first_name = self.random.choice(FIRST_NAMES)
+            region = self.random.choice(self.regions)
+        return {
+            'email': f'{first_name.lower()}.{self.run_id}.{client_no}.{iteration}@{EMAIL_DOMAIN}',
+            'first_name': first_name,
+            'region': region,
+            'password': PASSWORD,
+            'confirm_password': PASSWORD,
+            'terms_confirmed': 'on',
+        }
+
+    def visit(self, client_no):
+        for iteration in range(self.config.iterations):
+            user = self.user(client_no, iteration)
+
+            visitor = Client(self.config, self.record)
+            visitor.request('GET terms/', 'terms/')
+            token = visitor.csrf_token('register/')
+            if token:
+                # A re-rendered form (200) means validation failed
+                visitor.request(
+                    'POST register/', 'register/', {**user, 'csrfmiddlewaretoken': token},
+                    expect=lambda status, content: status == 302,
+                )
+
+            visitor = Client(self.config, self.record)
+            token = visitor.csrf_token('login/')
+            if token:
+                visitor.request(
+                    'POST login/', 'login/',
+                    {'username': user['email'], 'password': user['password'], 'csrfmiddlewaretoken': token},
+                    expect=lambda status, content: status == 302,
+                )
+
+    def run(self):
+        threads = [threading.Thread(target=self.visit, args=(n,)) for n in range(self.config.clients)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return self.report(time.perf_counter() - started)
+
+    def report(self, elapsed):
+        steps = {}
+        for step, (latencies, errors) in sorted(self.samples.items()):
+            timed = sorted(latencies)
+            quantiles = statistics.quantiles(timed, n=100, method='inclusive') if len(timed) > 1 else timed * 99
+            steps[step] = {
+                'requests': len(timed),
+                'errors': errors[0],
+                'rps': round(len(timed) / elapsed, 2),
+                'p50_ms': round(quantiles[49] * 1000, 2),
+                'p90_ms': round(quantiles[89] * 1000, 2),
+                'p95_ms': round(quantiles[94] * 1000, 2),
+                'p99_ms': round(quantiles[98] * 1000, 2),
+                'max_ms': round(timed[-1] * 1000, 2),
+            }
+        requests = sum(step['requests'] for step in steps.values())
+        return {
+            'base_url': self.config.base_url,
+            'run_id': self.run_id,
+            'clients': self.config.clients,
+            'iterations': self.config.iterations,
+            'elapsed_s': round(elapsed, 3),
+            'requests': requests,
+            'errors': sum(step['errors'] for step in steps.values()),
+            'rps': round(requests / elapsed, 2) if elapsed else 0.0,
+            'steps': steps,
+        }
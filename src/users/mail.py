@@ -0,0 +1,144 @@
+import logging
+import random
+import smtplib
+import socket
+import time
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import transaction
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+from .models import EmailJob
+
+logger = logging.getLogger(__name__)
+
+# Errors after which the connection is useless for the rest of the batch.
+# Any other SMTPException is the server refusing one message; since
+# SMTPException is an OSError too, socket errors are told apart by not being one.
+CONNECTION_ERRORS = (
+    smtplib.SMTPServerDisconnected,
+    smtplib.SMTPConnectError,
+    smtplib.SMTPAuthenticationError,
+    ConnectionError,
+    socket.timeout,
+)
+
+
+def _is_connection_error(exc):
+    return isinstance(exc, CONNECTION_ERRORS) or not isinstance(exc, smtplib.SMTPException)
+
+
+def _welcome_job(user):
+    context = {'user': user}
+    return EmailJob(
+        recipient=user.email,
+        subject=render_to_string('users/emails/welcome_subject.txt', context).strip(),
+        body=render_to_string('users/emails/welcome.txt', context),
+    )
+
+
+def save_with_welcome_email(user):
+    """
+    Save a new ``user`` and queue its welcome mail in one transaction, so
+    there is never an account without its mail or a mail without its
+    account. One INSERT each instead of an SMTP round trip in the request.
+    """
+    job = _welcome_job(user)
+    with transaction.atomic():
+        user.save()
+        job.save()
+
+
+async def asave_with_welcome_email(user):
+    # The async ORM cannot hold a transaction across awaits
+    await sync_to_async(save_with_welcome_email)(user)
+
+
+def backoff(attempts):
+    """Delay before retry number ``attempts``: doubling, capped, with jitter."""
+    options = settings.EMAIL_QUEUE
+    delay = min(options['BACKOFF'] * 2 ** (attempts - 1), options['MAX_BACKOFF'])
+    return timedelta(seconds=delay * random.uniform(0.8, 1.2))
+
+
+class Worker:
+    """
+    Sends queued mail in batches over one SMTP connection kept open between
+    batches. A batch is claimed with ``SELECT ... FOR UPDATE SKIP LOCKED``
+    and held until it is sent, so any number of workers can poll the same
+    table without sending a message twice. Delivery is at least once: a
+    worker killed mid-batch leaves its rows pending for the next one.
+    """
+
+    def __init__(self, batch_size=None, connection=None):
+        options = settings.EMAIL_QUEUE
+        self.batch_size = batch_size or options['BATCH_SIZE']
+        self.max_attempts = options['MAX_ATTEMPTS']
+        self.idle_disconnect = options['IDLE_DISCONNECT']
+        self.connection = connection or get_connection()
+        self.last_used = None
+
+    def run_batch(self):
+        """Send one batch, return how many messages went out."""
+        with transaction.atomic():
+            jobs = list(
+                EmailJob.objects.select_for_update(skip_locked=True)
+                .filter(status=EmailJob.PENDING, run_after__lte=timezone.now())
+                .order_by('run_after')[: self.batch_size]
+            )
+            if not jobs:
+                return 0
+
+            sent = []
+            for job in jobs:
+                try:
+                    # Opens the connection when needed, keeps it open otherwise
+                    self.connection.open()
+                    self.connection.send_messages([self._message(job)])
+                except OSError as exc:
+                    self._failed(job, exc)
+                    if _is_connection_error(exc):
+                        # The rest of the batch stays pending and untouched
+                        self.disconnect()
+                        break
+                else:
+                    sent.append(job.pk)
+            self.last_used = time.monotonic()
+            EmailJob.objects.filter(pk__in=sent).delete()
+        return len(sent)
+
+    def drop_idle_connection(self):
+        # Servers drop idle clients after a few minutes anyway
+        if self.last_used is not None and time.monotonic() - self.last_used > self.idle_disconnect:
+            self.disconnect()
+
+    def disconnect(self):
+        try:
+            self.connection.close()
+        except smtplib.SMTPException:
+            pass
+        self.last_used = None
+
+    def _message(self, job):
+        message = EmailMultiAlternatives(
+            job.subject, job.body, settings.DEFAULT_FROM_EMAIL, [job.recipient], connection=self.connection
+        )
+        if job.html_body:
+            message.attach_alternative(job.html_body, 'text/html')
+        return message
+
+    def _failed(self, job, exc):
+        job.attempts += 1
+        job.last_error = f'{type(exc).__name__}: {exc}'
+        if job.attempts >= self.max_attempts:
+            job.status = EmailJob.FAILED
+            logger.error('Giving up on email %s to %s: %s', job.pk, job.recipient, job.last_error)
+        else:
+            job.run_after = timezone.now() + backoff(job.attempts)
+            logger.warning('Email %s to %s failed, attempt %s: %s', job.pk, job.recipient, job.attempts,
+                           job.last_error)
+        job.save(update_fields=['attempts', 'last_error', 'status', 'run_after'])
@@ -0,0 +1,82 @@
+import copy
+import statistics
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.utils import load_backend
+
+
+class Command(BaseCommand):
+    help = (
+        'Simulate concurrent requests against the configured database, each taking a connection, '
+        'running one query and giving the connection back, and report p50/p99 latency with '
+        'a fresh connection per request and with the connection pool.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=2000, help='Requests per run (default: 2000).')
+        parser.add_argument('--concurrency', type=int, default=16, help='Concurrent clients (default: 16).')
+        parser.add_argument('--query', default='SELECT 1', help='Query run by every request (default: SELECT 1).')
+
+    def handle(self, *args, **options):
+        base = copy.deepcopy(connections[DEFAULT_DB_ALIAS].settings_dict)
+        pool_options = base.get('OPTIONS', {}).get('pool') or {
+            'min_size': options['concurrency'],
+            'max_size': options['concurrency'],
+        }
+
+        direct = copy.deepcopy(base)
+        direct['OPTIONS'].pop('pool', None)
+        direct['CONN_MAX_AGE'] = 0
+
+        pooled = copy.deepcopy(base)
+        pooled['OPTIONS']['pool'] = pool_options
+        pooled['CONN_MAX_AGE'] = 0
+
+        self.stdout.write(f"{'mode':<10}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}")
+        for alias, settings_dict in (('bench_direct', direct), ('bench_pooled', pooled)):
+            elapsed, latencies = self._run(alias, settings_dict, options)
+            quantiles = statistics.quantiles(latencies, n=100)
+            self.stdout.write(
+                f"{alias.removeprefix('bench_'):<10}{len(latencies) / elapsed:>10.0f}"
+                f"{quantiles[49] * 1000:>10.2f}{quantiles[98] * 1000:>10.2f}"
+            )
+
+    def _run(self, alias, settings_dict, options):
+        backend = load_backend(settings_dict['ENGINE'])
+        concurrency = options['concurrency']
+        latencies = []
+        lock = threading.Lock()
+
+        def client(count):
+            # One wrapper per thread, as Django keeps one per request thread;
+            # wrappers with the same alias share the pool
+            wrapper = backend.DatabaseWrapper(settings_dict, alias)
+            own = []
+            for _ in range(count):
+                started = time.perf_counter()
+                with wrapper.cursor() as cursor:
+                    cursor.execute(options['query'])
+                    cursor.fetchall()
+                # What Django does at the end of every request
+                wrapper.close()
+                own.append(time.perf_counter() - started)
+            with lock:
+                latencies.extend(own)
+
+        total = options['requests']
+        threads = [
+            threading.Thread(target=client, args=(total // concurrency + (i < total % concurrency),))
+            for i in range(concurrency)
+        ]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        backend.DatabaseWrapper(settings_dict, alias).close_pool()
+        return elapsed, latencies
@@ -0,0 +1,83 @@
+import asyncio
+import threading
+import time
+import uuid
+
+from asgiref.sync import sync_to_async
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from users.forms import RegistrationForm
+from users.hashing import aset_password
+from users.regions import aget_regions
+
+
+def _form_data():
+    return {
+        'email': f'bench-{uuid.uuid4().hex}@dyvo.ua',
+        'first_name': 'Bench',
+        'password': 'Benchmark123',
+        'confirm_password': 'Benchmark123',
+        'region': 'Київська область',
+        'terms_confirmed': 'on',
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare registration throughput of the old double-hash sync path with the '
+        'current single-hash path that hashes in the bounded executor. Nothing is saved.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help='Registrations per run (default: 200).')
+        parser.add_argument('--concurrency', type=int, default=8, help='Concurrent registrations (default: 8).')
+
+    def handle(self, *args, **options):
+        total, concurrency = options['requests'], options['concurrency']
+
+        before = self._run_legacy(total, concurrency)
+        after = asyncio.run(self._run_current(total, concurrency))
+
+        for label, elapsed in (('before (2 hashes, sync)', before), ('after (1 hash, executor)', after)):
+            self.stdout.write(f'{label:<26} {total / elapsed:8.1f} req/s  {elapsed * 1000 / total:8.2f} ms/req')
+        self.stdout.write(self.style.SUCCESS(f'Speed-up: x{before / after:.2f}'))
+
+    def _run_legacy(self, total, concurrency):
+        # What register_view used to do: save(commit=False) hashed once and
+        # the view hashed the same password again
+        def worker(count):
+            for _ in range(count):
+                form = RegistrationForm(_form_data())
+                form.is_valid()
+                user = form.save(commit=False)
+                user.set_password(form.cleaned_data['password'])
+            connections.close_all()
+
+        threads = [
+            threading.Thread(target=worker, args=(total // concurrency + (i < total % concurrency),))
+            for i in range(concurrency)
+        ]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return time.perf_counter() - started
+
+    async def _run_current(self, total, concurrency):
+        semaphore = asyncio.Semaphore(concurrency)
+        await aget_regions()
+
+        async def register():
+            async with semaphore:
+                form = RegistrationForm(_form_data())
+                form.is_valid()
+                user = form.build_user()
+                await aset_password(user, form.cleaned_data['password'])
+
+        started = time.perf_counter()
+        await asyncio.gather(*(register() for _ in range(total)))
+        elapsed = time.perf_counter() - started
+        await sync_to_async(connections.close_all)()
+        return elapsed
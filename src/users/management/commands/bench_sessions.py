@@ -0,0 +1,83 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.middleware import AuthenticationMiddleware
+from django.contrib.sessions.middleware import SessionMiddleware
+from django.core.cache import caches
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.http import HttpResponse
+from django.test import Client, RequestFactory
+from django.test.utils import CaptureQueriesContext, override_settings
+
+ENGINES = {
+    'db': 'django.contrib.sessions.backends.db',
+    'cached_db': 'django.contrib.sessions.backends.cached_db',
+    'signed_cookies': 'django.contrib.sessions.backends.signed_cookies',
+}
+BACKENDS = {
+    'model': 'django.contrib.auth.backends.ModelBackend',
+    'cached': 'users.backends.CachedModelBackend',
+}
+
+
+class _Rollback(Exception):
+    pass
+
+
+def _view(request):
+    # What any view that looks at the signed-in user triggers
+    request.user.pk
+    return HttpResponse()
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure database queries and latency of the session and authentication middleware for '
+        'an authenticated request, for every session engine with and without the cached user backend. '
+        'Uses a temporary user inside a transaction that is rolled back.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=1000, help='Requests per combination (default: 1000).')
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"{'engine':<16}{'user backend':<14}{'queries/req':>12}{'us/req':>10}")
+        try:
+            with transaction.atomic():
+                user = get_user_model().objects.create_user(
+                    email='bench-sessions@dyvo.ua', first_name='Bench',
+                )
+                for engine_name, engine in ENGINES.items():
+                    for backend_name, backend in BACKENDS.items():
+                        queries, elapsed = self._run(user, engine, backend, options['requests'])
+                        self.stdout.write(
+                            f'{engine_name:<16}{backend_name:<14}{queries:>12.2f}{elapsed * 1e6:>10.0f}'
+                        )
+                raise _Rollback
+        except _Rollback:
+            pass
+
+    def _run(self, user, engine, backend, requests):
+        # One process, so the local memory cache is as good as a shared one here
+        with override_settings(SESSION_ENGINE=engine, AUTHENTICATION_BACKENDS=[backend], USER_CACHE_ALIAS='sessions'):
+            caches['sessions'].clear()
+            client = Client()
+            client.force_login(user, backend=backend)
+            cookies = {name: morsel.value for name, morsel in client.cookies.items()}
+            handler = SessionMiddleware(AuthenticationMiddleware(_view))
+            factory = RequestFactory()
+
+            # The first request fills the caches, the rest are what is measured
+            handler(self._request(factory, cookies))
+            with CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                for _ in range(requests):
+                    handler(self._request(factory, cookies))
+                elapsed = time.perf_counter() - started
+        return len(queries) / requests, elapsed / requests
+
+    def _request(self, factory, cookies):
+        request = factory.get('/')
+        request.COOKIES.update(cookies)
+        return request
@@ -0,0 +1,82 @@
+import csv
+import re
+
+from django.core.management.base import BaseCommand, CommandError
+
+from users.settlements import SETTLEMENTS_TSV
+
+# GeoNames admin1 codes of Ukraine to ISO 3166-2
+ADMIN1_TO_ISO = {
+    '01': 'UA-71', '02': 'UA-74', '03': 'UA-77', '04': 'UA-12', '05': 'UA-14', '06': 'UA-26',
+    '07': 'UA-63', '08': 'UA-65', '09': 'UA-68', '10': 'UA-35', '11': 'UA-43', '12': 'UA-30',
+    '13': 'UA-32', '14': 'UA-09', '15': 'UA-46', '16': 'UA-48', '17': 'UA-51', '18': 'UA-53',
+    '19': 'UA-56', '20': 'UA-40', '21': 'UA-59', '22': 'UA-61', '23': 'UA-05', '24': 'UA-07',
+    '25': 'UA-21', '26': 'UA-23', '27': 'UA-18',
+}
+
+UKRAINIAN_LETTERS = re.compile('[ґєіїҐЄІЇ]')
+CYRILLIC_NAME = re.compile("^[А-ЩЬЮЯЄІЇҐа-щьюяєіїґ'’ʼ\\- ]+$")
+
+
+class Command(BaseCommand):
+    help = (
+        'Rebuild the bundled settlement gazetteer (users/data/settlements.tsv) from a GeoNames '
+        'country dump, e.g. UA.txt from https://download.geonames.org/export/dump/UA.zip. '
+        'Restart the server afterwards, the index is loaded once per process.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('dump', help='GeoNames country dump (UA.txt).')
+        parser.add_argument('--alternate-names',
+                            help='GeoNames alternate names of the country (alternatenames/UA.zip), '
+                                 'used for the Ukrainian spelling of each name.')
+        parser.add_argument('--min-population', type=int, default=0,
+                            help='Skip settlements with a smaller population (default: 0).')
+        parser.add_argument('--output', default=str(SETTLEMENTS_TSV), help='Output file (default: the bundled one).')
+
+    def handle(self, *args, **options):
+        ukrainian = self._read_ukrainian_names(options['alternate_names']) if options['alternate_names'] else {}
+
+        rows = []
+        try:
+            with open(options['dump'], encoding='utf-8', newline='') as f:
+                for fields in csv.reader(f, delimiter='\t', quoting=csv.QUOTE_NONE):
+                    if len(fields) < 15 or fields[6] != 'P' or fields[10] not in ADMIN1_TO_ISO:
+                        continue
+                    population = int(fields[14] or 0)
+                    if population < options['min_population']:
+                        continue
+                    pk = int(fields[0])
+                    name = ukrainian.get(pk) or self._guess_ukrainian(fields[3].split(','))
+                    if not name:
+                        continue
+                    rows.append((pk, name, fields[1], ADMIN1_TO_ISO[fields[10]], fields[4], fields[5], population))
+        except OSError as exc:
+            raise CommandError(f'Cannot read {options["dump"]}: {exc}')
+
+        rows.sort()
+        with open(options['output'], 'w', encoding='utf-8', newline='') as f:
+            writer = csv.writer(f, delimiter='\t', lineterminator='\n')
+            writer.writerow(['geonameid', 'name', 'name_latin', 'region', 'latitude', 'longitude', 'population'])
+            writer.writerows(rows)
+        self.stdout.write(self.style.SUCCESS(f'Wrote {len(rows)} settlements to {options["output"]}.'))
+
+    def _read_ukrainian_names(self, path):
+        names = {}
+        with open(path, encoding='utf-8', newline='') as f:
+            for fields in csv.reader(f, delimiter='\t', quoting=csv.QUOTE_NONE):
+                if len(fields) < 8 or fields[2] != 'uk' or fields[7] == '1':
+                    continue
+                pk = int(fields[1])
+                # The preferred name wins over any other Ukrainian spelling
+                if fields[4] == '1' or pk not in names:
+                    names[pk] = fields[3].replace("'", '’')
+        return names
+
+    def _guess_ukrainian(self, alternate_names):
+        # Without language tags, take a Cyrillic name with letters Russian lacks
+        for name in alternate_names:
+            name = name.replace('\u0301', '').strip()
+            if CYRILLIC_NAME.match(name) and UKRAINIAN_LETTERS.search(name):
+                return name.replace("'", '’')
+        return None
@@ -0,0 +1,178 @@
+import hashlib
+import json
+import os
+import platform
+import statistics
+import time
+
+from django.conf import settings
+from django.contrib.auth.hashers import Argon2PasswordHasher, PBKDF2PasswordHasher, ScryptPasswordHasher
+from django.core.management.base import BaseCommand, CommandError
+
+# Most to least preferred when more than one is available
+ALGORITHMS = ['argon2', 'scrypt', 'pbkdf2_sha256']
+
+# OWASP's floor for Argon2id memory, in KiB
+ARGON2_MIN_MEMORY = 19 * 1024
+SCRYPT_MAX_WORK_FACTOR = 2**20
+
+
+def _hasher(base, **params):
+    # A throwaway subclass, the stock classes take their costs from attributes
+    return type(base.__name__, (base,), params)()
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark the password hashers available on this host and pick the parameters that make '
+        'one hash take about --target-ms. With --write the result is saved to PASSWORD_HASHERS_FILE, '
+        'which settings read to build PASSWORD_HASHERS; existing users are rehashed on their next login. '
+        "Costs never go below Django's defaults unless --allow-weaker is given. "
+        'Run it on the production host while it is idle.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--target-ms', type=float, default=250,
+                            help='Wanted duration of one hash in milliseconds (default: 250).')
+        parser.add_argument('--prefer', choices=ALGORITHMS,
+                            help='Hasher for new passwords (default: the first available of '
+                                 f'{", ".join(ALGORITHMS)}).')
+        parser.add_argument('--rounds', type=int, default=5,
+                            help='Hashes per measurement, the median counts (default: 5).')
+        parser.add_argument('--write', nargs='?', const=str(settings.PASSWORD_HASHERS_FILE),
+                            help='Save the result, by default to PASSWORD_HASHERS_FILE.')
+        parser.add_argument('--allow-weaker', action='store_true',
+                            help="Allow costs below Django's defaults when the target asks for it.")
+
+    def handle(self, *args, **options):
+        self.rounds = options['rounds']
+        self.allow_weaker = options['allow_weaker']
+        self.raised = False
+        target = options['target_ms']
+
+        calibrators = {
+            'argon2': self._calibrate_argon2,
+            'scrypt': self._calibrate_scrypt,
+            'pbkdf2_sha256': self._calibrate_pbkdf2,
+        }
+        available = [algorithm for algorithm in ALGORITHMS if self._available(algorithm)]
+        preferred = options['prefer'] or available[0]
+        if preferred not in available:
+            raise CommandError(f'{preferred} is not available on this host.')
+
+        params, measured = {}, {}
+        for algorithm in available:
+            params[algorithm], measured[algorithm] = calibrators[algorithm](target)
+            summary = ' '.join(f'{name}={value}' for name, value in params[algorithm].items())
+            self.stdout.write(f'{algorithm:<14} {measured[algorithm]:8.1f} ms  {summary}')
+
+        if self.raised:
+            self.stdout.write(
+                "Some costs were raised to Django's defaults and take longer than the target; "
+                'pass --allow-weaker to keep them lower.'
+            )
+
+        result = {
+            'target_ms': target,
+            'host': platform.node(),
+            'cpu_count': os.cpu_count(),
+            'preferred': preferred,
+            'params': params,
+            'measured_ms': {algorithm: round(ms, 1) for algorithm, ms in measured.items()},
+        }
+        if options['write']:
+            with open(options['write'], 'w', encoding='utf-8') as f:
+                json.dump(result, f, indent=2)
+                f.write('\n')
+            self.stdout.write(self.style.SUCCESS(
+                f'Wrote {options["write"]}, new passwords will use {preferred} after a restart.'
+            ))
+        else:
+            self.stdout.write(json.dumps(result, indent=2))
+
+    def _available(self, algorithm):
+        if algorithm == 'argon2':
+            try:
+                Argon2PasswordHasher()._load_library()
+            except ValueError:
+                return False
+        if algorithm == 'scrypt':
+            return hasattr(hashlib, 'scrypt')
+        return True
+
+    def _measure(self, hasher):
+        salt = hasher.salt()
+        durations = []
+        for _ in range(self.rounds):
+            started = time.perf_counter()
+            hasher.encode('calibration-password', salt)
+            durations.append((time.perf_counter() - started) * 1000)
+        return statistics.median(durations)
+
+    def _calibrate_pbkdf2(self, target):
+        # Linear in the iterations; probe once, scale, then measure the result
+        probe = 100_000
+        per_iteration = self._measure(_hasher(PBKDF2PasswordHasher, iterations=probe)) / probe
+        iterations = max(probe, round(target / per_iteration, -4))
+        params = {'iterations': self._at_least('pbkdf2_sha256', 'iterations', int(iterations), PBKDF2PasswordHasher)}
+        return params, self._measure(_hasher(PBKDF2PasswordHasher, **params))
+
+    def _calibrate_argon2(self, target):
+        # Keep Django's memory and lanes and add passes; when a single pass is
+        # already too slow and --allow-weaker is given, give up memory down to
+        # the OWASP floor instead
+        memory_cost = Argon2PasswordHasher.memory_cost
+        parallelism = Argon2PasswordHasher.parallelism
+        one_pass = self._measure(_hasher(Argon2PasswordHasher, time_cost=1, memory_cost=memory_cost,
+                                         parallelism=parallelism))
+        while self.allow_weaker and one_pass > target and memory_cost // 2 >= ARGON2_MIN_MEMORY:
+            memory_cost //= 2
+            one_pass = self._measure(_hasher(Argon2PasswordHasher, time_cost=1, memory_cost=memory_cost,
+                                             parallelism=parallelism))
+        params = {
+            'time_cost': self._at_least('argon2', 'time_cost', max(1, round(target / one_pass)), Argon2PasswordHasher),
+            'memory_cost': self._at_least('argon2', 'memory_cost', memory_cost, Argon2PasswordHasher),
+            'parallelism': parallelism,
+        }
+        return params, self._measure(_hasher(Argon2PasswordHasher, **params))
+
+    def _calibrate_scrypt(self, target):
+        # Memory first: the largest power-of-two work factor whose single lane
+        # fits the target, then as many lanes, each as slow again, as still fit
+        block_size = ScryptPasswordHasher.block_size
+        work_factor = ScryptPasswordHasher.work_factor
+        one_lane = self._measure(_hasher(ScryptPasswordHasher, **self._scrypt_params(work_factor, block_size, 1)))
+        while work_factor * 2 <= SCRYPT_MAX_WORK_FACTOR:
+            ms = self._measure(_hasher(ScryptPasswordHasher, **self._scrypt_params(work_factor * 2, block_size, 1)))
+            if ms > target:
+                break
+            work_factor, one_lane = work_factor * 2, ms
+        params = self._scrypt_params(
+            self._at_least('scrypt', 'work_factor', work_factor, ScryptPasswordHasher),
+            block_size,
+            self._at_least('scrypt', 'parallelism', max(1, round(target / one_lane)), ScryptPasswordHasher),
+        )
+        return params, self._measure(_hasher(ScryptPasswordHasher, **params))
+
+    def _at_least(self, algorithm, name, value, base):
+        """``value``, or the stock hasher's default when it is lower, unless --allow-weaker."""
+        default = getattr(base, name)
+        if value >= default:
+            return value
+        if self.allow_weaker:
+            self.stderr.write(self.style.WARNING(
+                f"{algorithm}: {name}={value} is below Django's default of {default}, "
+                'passwords hashed with it are weaker.'
+            ))
+            return value
+        self.raised = True
+        return default
+
+    def _scrypt_params(self, work_factor, block_size, parallelism):
+        return {
+            'work_factor': work_factor,
+            'block_size': block_size,
+            'parallelism': parallelism,
+            # OpenSSL refuses more than 32 MiB unless told otherwise
+            'maxmem': 2 * 128 * work_factor * block_size,
+        }
@@ -0,0 +1,42 @@
+import sys
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+
+from users.export import CHUNK_SIZE, FORMATS, export_queryset, iter_export
+from users.models import Region
+
+
+class Command(BaseCommand):
+    help = (
+        'Export users as CSV or GeoJSON. Rows are read through a server-side cursor and written as '
+        'they arrive, so memory use does not grow with the number of users.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=FORMATS, default='csv', help='Output format (default: csv).')
+        parser.add_argument('--region', help='Only users of this region, by ISO code (UA-32) or name.')
+        parser.add_argument('--joined-from', type=date.fromisoformat, help='Joined on or after YYYY-MM-DD.')
+        parser.add_argument('--joined-to', type=date.fromisoformat, help='Joined on or before YYYY-MM-DD.')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE,
+                            help=f'Rows per fetch from the cursor (default: {CHUNK_SIZE}).')
+        parser.add_argument('--output', '-o', help='Output file (default: standard output).')
+
+    def handle(self, *args, **options):
+        region = None
+        if options['region']:
+            region = Region.objects.filter(Q(code=options['region']) | Q(name=options['region'])).first()
+            if region is None:
+                raise CommandError(f'Unknown region {options["region"]!r}.')
+
+        queryset = export_queryset(
+            region=region, joined_from=options['joined_from'], joined_to=options['joined_to']
+        )
+        output = open(options['output'], 'w', encoding='utf-8', newline='') if options['output'] else sys.stdout
+        try:
+            for part in iter_export(queryset, options['format'], options['chunk_size']):
+                output.write(part)
+        finally:
+            if output is not sys.stdout:
+                output.close()
@@ -0,0 +1,182 @@
+import csv
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+import django
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from users.models import CustomUser, Region
+from users.tiles import get_tile_cache
+
+STAGING_TABLE = 'import_users_staging'
+
+
+def _setup_worker():
+    # Workers are spawned, not forked, so they never share the parent's
+    # database socket; they only need settings to pick the hasher
+    django.setup()
+
+
+def _hash_password(password):
+    return make_password(password)
+
+
+class Command(BaseCommand):
+    help = (
+        'Bulk import users from a CSV or JSONL file '
+        '(columns: email, first_name, password, region as a name or ISO code). '
+        'Passwords are hashed in a process pool and rows are loaded with COPY in batches.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Input file, or '-' to read from stdin.")
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help='Input format (default: by file extension).')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Rows per COPY batch (default: 5000).')
+        parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                            help='Password hashing processes (default: number of cores).')
+
+    def handle(self, *args, **options):
+        fmt = options['format']
+        if fmt is None:
+            fmt = 'jsonl' if options['path'].endswith(('.jsonl', '.ndjson')) else 'csv'
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive.')
+
+        stream = sys.stdin if options['path'] == '-' else open(options['path'], encoding='utf-8-sig', newline='')
+        try:
+            rows = self._read_rows(stream, fmt)
+            self._import(rows, options['batch_size'], max(1, options['workers']))
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+
+    def _read_rows(self, stream, fmt):
+        if fmt == 'csv':
+            for line, record in enumerate(csv.DictReader(stream), start=2):
+                yield line, record
+        else:
+            for line, raw in enumerate(stream, start=1):
+                if raw.strip():
+                    try:
+                        yield line, json.loads(raw)
+                    except json.JSONDecodeError as exc:
+                        raise CommandError(f'Line {line}: invalid JSON ({exc}).')
+
+    def _import(self, rows, batch_size, workers):
+        totals = {'read': 0, 'inserted': 0, 'duplicates': 0, 'skipped': 0}
+        self.regions = {}
+        for region in Region.objects.only('pk', 'code', 'name', 'label_point'):
+            value = (region.pk, region.label_point.ewkt)
+            self.regions[region.name] = self.regions[region.code] = value
+        started = time.perf_counter()
+
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(workers, mp_context=context, initializer=_setup_worker) as pool:
+            pending = None
+            while chunk := list(islice(rows, batch_size)):
+                batch = self._prepare(chunk, totals)
+                if not batch:
+                    continue
+                # Start hashing this batch before loading the previous one,
+                # so COPY overlaps with the CPU-bound work
+                chunksize = max(1, len(batch) // (workers * 4))
+                hashed = pool.map(_hash_password, [row['password'] for row in batch], chunksize=chunksize)
+                if pending is not None:
+                    self._load(*pending, totals, started)
+                pending = (batch, hashed)
+            if pending is not None:
+                self._load(*pending, totals, started)
+
+        # COPY bypasses the signals that invalidate single tiles
+        if totals['inserted']:
+            get_tile_cache().clear()
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {totals['inserted']} of {totals['read']} rows in {elapsed:.1f}s "
+            f"({totals['read'] / elapsed if elapsed else 0:.0f} rows/s); "
+            f"{totals['duplicates']} duplicate(s), {totals['skipped']} skipped."
+        ))
+
+    def _prepare(self, records, totals):
+        batch = []
+        for line, record in records:
+            totals['read'] += 1
+            email = CustomUser.objects.normalize_email((record.get('email') or '').strip())
+            first_name = (record.get('first_name') or '').strip()
+            if not email or not first_name:
+                totals['skipped'] += 1
+                self.stderr.write(f'Line {line}: email and first_name are required, skipped.')
+                continue
+
+            region_id = location = None
+            region = (record.get('region') or '').strip()
+            if region in self.regions:
+                region_id, location = self.regions[region]
+            elif region:
+                self.stderr.write(f'Line {line}: unknown region {region!r}, location left empty.')
+
+            batch.append({
+                'line': line,
+                'email': email,
+                'first_name': first_name,
+                'password': record.get('password') or None,
+                'region_id': region_id,
+                'location': location,
+            })
+        return batch
+
+    def _load(self, batch, hashed, totals, started):
+        now = timezone.now()
+        table = connection.ops.quote_name(CustomUser._meta.db_table)
+
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(
+                f'CREATE TEMPORARY TABLE {STAGING_TABLE} ('
+                'line integer, email varchar(254), first_name varchar(150), '
+                'password varchar(128), region_id bigint, location geometry(Point, 4326)'
+                ') ON COMMIT DROP'
+            )
+            with cursor.copy(
+                f'COPY {STAGING_TABLE} (line, email, first_name, password, region_id, location) FROM STDIN'
+            ) as copy:
+                for row, password in zip(batch, hashed):
+                    copy.write_row((
+                        row['line'], row['email'], row['first_name'], password, row['region_id'], row['location'],
+                    ))
+
+            # Duplicates, either against the table or inside the batch, are
+            # dropped by ON CONFLICT / DISTINCT ON instead of failing the COPY
+            cursor.execute(
+                f'INSERT INTO {table} '
+                '(email, first_name, password, region_id, location, is_superuser, is_staff, is_active, date_joined) '
+                'SELECT DISTINCT ON (lower(email)) '
+                'email, first_name, password, region_id, location, false, false, true, %s '
+                f'FROM {STAGING_TABLE} ORDER BY lower(email), line '
+                'ON CONFLICT DO NOTHING '
+                'RETURNING email',
+                [now],
+            )
+            inserted = {email.lower() for email, in cursor.fetchall()}
+
+        totals['inserted'] += len(inserted)
+        for row in batch:
+            if row['email'].lower() in inserted:
+                inserted.discard(row['email'].lower())
+            else:
+                totals['duplicates'] += 1
+                self.stderr.write(f"Line {row['line']}: duplicate email {row['email']}, skipped.")
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f"{totals['read']} rows read, {totals['inserted']} inserted "
+            f"({totals['read'] / elapsed if elapsed else 0:.0f} rows/s)"
+        )
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from users.models import Region
+from users.regions import REGIONS_GEOJSON, load_regions
+
+
+class Command(BaseCommand):
+    help = 'Create or update region boundaries from a GeoJSON FeatureCollection.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', default=REGIONS_GEOJSON,
+                            help='GeoJSON file with "code" and "name" properties (default: the bundled file).')
+
+    def handle(self, *args, **options):
+        count = load_regions(Region, options['path'])
+        self.stdout.write(self.style.SUCCESS(f'Loaded {count} regions from {options["path"]}.'))
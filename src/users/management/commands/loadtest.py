@@ -0,0 +1,41 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from users.loadtest import LoadTest, LoadTestConfig
+
+
+class Command(BaseCommand):
+    help = (
+        'Drive the terms, register and login pages of a running server with concurrent '
+        'synthetic users and report throughput and latency percentiles as JSON. '
+        'Every run registers clients x iterations new users.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8000/',
+                            help='Base URL of the server under test (default: http://127.0.0.1:8000/).')
+        parser.add_argument('--clients', type=int, default=20, help='Concurrent visitors (default: 20).')
+        parser.add_argument('--iterations', type=int, default=10,
+                            help='Signup and login rounds per visitor (default: 10).')
+        parser.add_argument('--timeout', type=float, default=30.0, help='Per-request timeout in seconds (default: 30).')
+        parser.add_argument('--seed', type=int, help='Seed for names and regions, to repeat a run.')
+        parser.add_argument('--output', help='Also write the JSON report to this file.')
+
+    def handle(self, *args, **options):
+        if options['clients'] < 1 or options['iterations'] < 1:
+            raise CommandError('--clients and --iterations must be positive.')
+
+        config = LoadTestConfig(
+            base_url=options['url'],
+            clients=options['clients'],
+            iterations=options['iterations'],
+            timeout=options['timeout'],
+            seed=options['seed'],
+        )
+        report = json.dumps(LoadTest(config).run(), indent=2)
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                f.write(report + '\n')
+        self.stdout.write(report)
@@ -0,0 +1,100 @@
+import json
+import os
+import re
+import subprocess
+import sys
+from collections import defaultdict
+
+from django.apps import apps
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Runs in a fresh interpreter, so nothing is imported yet
+PROBE = '''
+import json, sys, time
+started = time.perf_counter()
+import django
+django.setup()
+setup_done = time.perf_counter()
+from django.urls import get_resolver
+get_resolver().url_patterns
+urls_done = time.perf_counter()
+result = {'phases': {'django.setup()': setup_done - started, 'URLconf': urls_done - setup_done}}
+if WARMUP:
+    from users.warmup import warm_up
+    result['warmup'] = warm_up(database=WARMUP_DATABASE)
+from django.utils.functional import empty
+geos = sys.modules.get('django.contrib.gis.geos.libgeos')
+result['libraries'] = {
+    'GDAL': 'django.contrib.gis.gdal.libgdal' in sys.modules,
+    'GEOS': geos is not None and geos.lgeos._wrapped is not empty,
+}
+print(json.dumps(result))
+'''
+
+IMPORT_LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \| ( *)(\S+)$')
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure how long a worker takes to boot: import time per installed app and package '
+        '(python -X importtime), django.setup() and URLconf loading, and whether the GDAL and GEOS '
+        'libraries were loaded by then. Runs in a fresh interpreter, so the numbers are those of a '
+        'cold worker.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top', type=int, default=15,
+                            help='Show this many apps/packages and modules (default: 15).')
+        parser.add_argument('--warmup', action='store_true', help='Also time the worker warmup steps.')
+        parser.add_argument('--no-database', action='store_true',
+                            help='With --warmup, skip the steps that need the database.')
+
+    def handle(self, *args, **options):
+        probe = f"WARMUP = {options['warmup']}\nWARMUP_DATABASE = {not options['no_database']}\n" + PROBE
+        process = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', probe],
+            cwd=settings.BASE_DIR, env=os.environ.copy(), capture_output=True, text=True,
+        )
+        if process.returncode:
+            raise CommandError(f'The probe failed:\n{process.stderr[-4000:]}')
+        result = json.loads(process.stdout.strip().splitlines()[-1])
+        modules = self._parse_importtime(process.stderr)
+
+        self.app_names = [config.name for config in apps.get_app_configs()] + [settings.ROOT_URLCONF.split('.')[0]]
+        owners = defaultdict(lambda: [0, 0])
+        for module, self_us in modules.items():
+            owner = owners[self._owner(module)]
+            owner[0] += self_us
+            owner[1] += 1
+        total = sum(modules.values())
+
+        self.stdout.write(f'Imports: {total / 1000:.0f} ms in {len(modules)} modules')
+        self.stdout.write(f'{"app / package":<32} {"ms":>8} {"share":>6} {"modules":>8}')
+        for name, (self_us, count) in sorted(owners.items(), key=lambda item: -item[1][0])[:options['top']]:
+            self.stdout.write(f'{name:<32} {self_us / 1000:8.1f} {self_us / total:6.1%} {count:8}')
+
+        self.stdout.write('\nSlowest modules (own import time):')
+        for module, self_us in sorted(modules.items(), key=lambda item: -item[1])[:options['top']]:
+            self.stdout.write(f'  {self_us / 1000:8.1f} ms  {module}')
+
+        self.stdout.write('\nPhases:')
+        for name, seconds in {**result['phases'], **result.get('warmup', {})}.items():
+            self.stdout.write(f'  {seconds * 1000:8.1f} ms  {name}')
+
+        self.stdout.write('\nNative libraries loaded at boot:')
+        for name, loaded in result['libraries'].items():
+            self.stdout.write(f'  {name}: {"yes" if loaded else "no, loads on first use"}')
+
+    def _parse_importtime(self, stderr):
+        modules = {}
+        for line in stderr.splitlines():
+            match = IMPORT_LINE.match(line)
+            if match:
+                modules[match[4]] = int(match[1])
+        return modules
+
+    def _owner(self, module):
+        # The installed app owning the module, else its top-level package
+        matches = [name for name in self.app_names if module == name or module.startswith(name + '.')]
+        return max(matches, key=len) if matches else module.split('.')[0]
@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from users.tiles import get_tile_cache
+
+
+class Command(BaseCommand):
+    help = (
+        'Delete the least recently used cached tiles once the tile cache is over TILES["CACHE_MAX_BYTES"], '
+        'outside the request path. With --every it keeps running, e.g. as a sidecar process.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--every', type=float, help='Repeat every this many seconds.')
+
+    def handle(self, *args, **options):
+        cache = get_tile_cache()
+        while True:
+            deleted, size = cache.prune()
+            self.stdout.write(
+                f'{timezone.now():%Y-%m-%d %H:%M:%S} deleted {deleted} tile(s), {size / 2**20:.1f} MiB left.'
+            )
+            if options['every'] is None:
+                return
+            time.sleep(options['every'])
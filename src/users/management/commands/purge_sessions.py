@@ -0,0 +1,44 @@
+import time
+from importlib import import_module
+
+from django.conf import settings
+from django.contrib.sessions.backends.db import SessionStore as DatabaseSessionStore
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+
+class Command(BaseCommand):
+    help = (
+        'Delete expired sessions from the database in small batches, so the purge never holds '
+        'long locks. With --every it keeps running and purges periodically, e.g. as a sidecar process.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000, help='Rows per DELETE (default: 5000).')
+        parser.add_argument('--pause', type=float, default=0.1,
+                            help='Seconds to sleep between batches (default: 0.1).')
+        parser.add_argument('--every', type=float, help='Repeat the purge every this many seconds.')
+
+    def handle(self, *args, **options):
+        store = import_module(settings.SESSION_ENGINE).SessionStore
+        if not issubclass(store, DatabaseSessionStore):
+            self.stdout.write(f'{settings.SESSION_ENGINE} keeps no sessions in the database, nothing to purge.')
+            return
+
+        while True:
+            deleted = self._purge(store.get_model_class(), options['batch_size'], options['pause'])
+            self.stdout.write(f'{timezone.now():%Y-%m-%d %H:%M:%S} deleted {deleted} expired session(s).')
+            if options['every'] is None:
+                return
+            time.sleep(options['every'])
+
+    def _purge(self, model, batch_size, pause):
+        total = 0
+        now = timezone.now()
+        while True:
+            expired = model.objects.filter(expire_date__lt=now).values('pk')[:batch_size]
+            deleted, _ = model.objects.filter(pk__in=expired).delete()
+            total += deleted
+            if deleted < batch_size:
+                return total
+            time.sleep(pause)
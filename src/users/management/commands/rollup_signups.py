@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from users.analytics import rebuild_signups, rollup_signups
+
+
+class Command(BaseCommand):
+    help = (
+        'Count new registrations into the daily signups rollup, reading only users added since the '
+        'last run. With --every it keeps running, e.g. as a sidecar process; --rebuild recounts everything.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=50_000, help='Users per transaction (default: 50000).')
+        parser.add_argument('--every', type=float, help='Repeat every this many seconds.')
+        parser.add_argument('--rebuild', action='store_true',
+                            help='Recount from scratch first, e.g. after users were deleted or imported.')
+
+    def handle(self, *args, **options):
+        if options['rebuild']:
+            counted = rebuild_signups()
+            self.stdout.write(f'{timezone.now():%Y-%m-%d %H:%M:%S} rebuilt the rollup from {counted} user(s).')
+
+        while True:
+            counted = rollup_signups(batch_size=options['batch_size'])
+            self.stdout.write(f'{timezone.now():%Y-%m-%d %H:%M:%S} counted {counted} new signup(s).')
+            if options['every'] is None:
+                return
+            time.sleep(options['every'])
@@ -0,0 +1,51 @@
+import signal
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from users.mail import Worker
+
+
+class Command(BaseCommand):
+    help = (
+        'Send queued email. Polls the queue, sends each batch over one SMTP connection that stays open '
+        'between batches, and retries failures with exponential backoff. Start as many as needed, '
+        'they never claim the same rows. Stops after the current batch on SIGTERM or Ctrl-C.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int,
+                            help=f'Jobs per batch (default: {settings.EMAIL_QUEUE["BATCH_SIZE"]}).')
+        parser.add_argument('--poll-interval', type=float, default=settings.EMAIL_QUEUE['POLL_INTERVAL'],
+                            help='Seconds to sleep when the queue is empty (default: %(default)s).')
+        parser.add_argument('--once', action='store_true',
+                            help='Exit as soon as a poll sends nothing.')
+
+    def handle(self, *args, **options):
+        self.stopping = False
+        signal.signal(signal.SIGTERM, self._stop)
+        signal.signal(signal.SIGINT, self._stop)
+
+        worker = Worker(batch_size=options['batch_size'])
+        sent = 0
+        try:
+            while not self.stopping:
+                batch = worker.run_batch()
+                sent += batch
+                if batch:
+                    continue
+                if options['once']:
+                    break
+                worker.drop_idle_connection()
+                # Empty queue or unreachable mail server; drop a broken database
+                # connection while at it
+                close_old_connections()
+                time.sleep(options['poll_interval'])
+        finally:
+            worker.disconnect()
+        self.stdout.write(f'Sent {sent} message(s).')
+
+    def _stop(self, signum, frame):
+        self.stopping = True
@@ -0,0 +1,186 @@
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+# Timings of the request being served. Context variables follow the request
+# into sync_to_async threads, so the ORM in async views is accounted too.
+_current = ContextVar('request_metrics', default=None)
+
+
+class Histogram:
+    """Prometheus-style histogram with one label, kept in process memory."""
+
+    def __init__(self, name, documentation, label, buckets):
+        self.name = name
+        self.documentation = documentation
+        self.label = label
+        self.buckets = buckets
+        self.series = {}
+        self.lock = threading.Lock()
+
+    def observe(self, label_value, value):
+        index = bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.series.get(label_value)
+            if series is None:
+                # Per-bucket counts plus +Inf, then sum and count
+                series = self.series[label_value] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def expose(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        with self.lock:
+            series = {key: (list(counts), total, count) for key, (counts, total, count) in self.series.items()}
+        for label_value, (counts, total, count) in sorted(series.items()):
+            label = f'{self.label}="{_escape(label_value)}"'
+            cumulative = 0
+            for bound, bucket_count in zip((*self.buckets, '+Inf'), counts):
+                cumulative += bucket_count
+                lines.append(f'{self.name}_bucket{{{label},le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_sum{{{label}}} {total}')
+            lines.append(f'{self.name}_count{{{label}}} {count}')
+        return lines
+
+    def reset(self):
+        with self.lock:
+            self.series.clear()
+
+
+class Counter:
+    """Prometheus-style counter with one label, kept in process memory."""
+
+    def __init__(self, name, documentation, label):
+        self.name = name
+        self.documentation = documentation
+        self.label = label
+        self.series = {}
+        self.lock = threading.Lock()
+
+    def inc(self, label_value, amount=1):
+        with self.lock:
+            self.series[label_value] = self.series.get(label_value, 0) + amount
+
+    def expose(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} counter']
+        with self.lock:
+            series = dict(self.series)
+        for label_value, value in sorted(series.items()):
+            lines.append(f'{self.name}{{{self.label}="{_escape(label_value)}"}} {value}')
+        return lines
+
+    def reset(self):
+        with self.lock:
+            self.series.clear()
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+REQUEST_DURATION = Histogram(
+    'dyvo_request_duration_seconds', 'Wall time of the whole request.', 'view', DURATION_BUCKETS,
+)
+SQL_QUERIES = Histogram(
+    'dyvo_request_sql_queries', 'SQL queries run by a request.', 'view', COUNT_BUCKETS,
+)
+SQL_DURATION = Histogram(
+    'dyvo_request_sql_duration_seconds', 'Time a request spent in SQL.', 'view', DURATION_BUCKETS,
+)
+HASH_DURATION = Histogram(
+    'dyvo_request_hash_duration_seconds', 'Time a request spent hashing or checking passwords.', 'view',
+    DURATION_BUCKETS,
+)
+RENDER_DURATION = Histogram(
+    'dyvo_request_render_duration_seconds', 'Time a request spent rendering templates.', 'view', DURATION_BUCKETS,
+)
+HISTOGRAMS = [REQUEST_DURATION, SQL_QUERIES, SQL_DURATION, HASH_DURATION, RENDER_DURATION]
+
+# Write-behind buffer (users.writebehind), labelled by event kind or "last_login"
+WRITE_BEHIND_WRITTEN = Counter(
+    'dyvo_write_behind_written_total', 'Buffered auth events and last_login updates written.', 'kind',
+)
+WRITE_BEHIND_DROPPED = Counter(
+    'dyvo_write_behind_dropped_total', 'Auth events and last_login updates dropped by a full buffer.', 'kind',
+)
+PAGE_CACHE_LOOKUPS = Counter(
+    'dyvo_page_cache_lookups_total', 'Anonymous page cache lookups (users.caching).', 'result',
+)
+COUNTERS = [PAGE_CACHE_LOOKUPS, WRITE_BEHIND_WRITTEN, WRITE_BEHIND_DROPPED]
+
+
+class RequestMetrics:
+    __slots__ = ('sql_count', 'sql_time', 'hash_time', 'render_time', 'queries')
+
+    def __init__(self, record_queries=False):
+        self.sql_count = 0
+        self.sql_time = 0.0
+        self.hash_time = 0.0
+        self.render_time = 0.0
+        # Only filled for requests sampled for the slow log
+        self.queries = [] if record_queries else None
+
+
+def start_request(record_queries=False):
+    metrics = RequestMetrics(record_queries)
+    return metrics, _current.set(metrics)
+
+
+def finish_request(token):
+    _current.reset(token)
+
+
+def observe_request(view, elapsed, metrics):
+    REQUEST_DURATION.observe(view, elapsed)
+    SQL_QUERIES.observe(view, metrics.sql_count)
+    SQL_DURATION.observe(view, metrics.sql_time)
+    HASH_DURATION.observe(view, metrics.hash_time)
+    RENDER_DURATION.observe(view, metrics.render_time)
+
+
+@contextmanager
+def timed(attribute):
+    """Add the time spent in the block to ``attribute`` of the current request."""
+    metrics = _current.get()
+    if metrics is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        setattr(metrics, attribute, getattr(metrics, attribute) + time.perf_counter() - started)
+
+
+def record_query(execute, sql, params, many, context):
+    """Database execute wrapper, installed on every connection (see users.signals)."""
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        elapsed = time.perf_counter() - started
+        metrics.sql_count += 1
+        metrics.sql_time += elapsed
+        if metrics.queries is not None:
+            metrics.queries.append((elapsed, sql))
+
+
+def expose():
+    lines = []
+    for metric in HISTOGRAMS + COUNTERS:
+        lines.extend(metric.expose())
+    return '\n'.join(lines) + '\n'
+
+
+def reset():
+    for metric in HISTOGRAMS + COUNTERS:
+        metric.reset()
@@ -0,0 +1,94 @@
+import gc
+import json
+import re
+import statistics
+import time
+from pathlib import Path
+
+BASELINES_JSON = Path(__file__).resolve().parent / 'data' / 'benchmarks.json'
+
+_REFERENCE_PATTERN = re.compile(r'^[a-z0-9]+$')
+
+
+def _reference():
+    # Fixed mix of the interpreter work the hot paths do: loops, string
+    # methods, a regex and a dict
+    seen = {}
+    for i in range(200):
+        word = f'word{i}'
+        seen[word] = bool(_REFERENCE_PATTERN.match(word)) and any(char.isdigit() for char in word.upper())
+    return seen
+
+
+class BenchmarkSuite:
+    """
+    Times callables and compares them with baselines kept in the repository.
+
+    Absolute timings differ between machines, so every result is stored and
+    compared relative to a fixed reference workload timed in the same run.
+    A benchmark regresses when its relative time exceeds the baseline by
+    more than ``threshold`` (0.25 = 25% slower).
+    """
+
+    def __init__(self, path=BASELINES_JSON, threshold=0.25, min_round_time=0.02, rounds=9):
+        self.path = Path(path)
+        self.threshold = threshold
+        self.min_round_time = min_round_time
+        self.rounds = rounds
+        try:
+            self.baselines = json.loads(self.path.read_text(encoding='utf-8'))
+        except FileNotFoundError:
+            self.baselines = {}
+        self.results = {}
+        self._reference_time = None
+
+    def time(self, func):
+        """Median seconds per call over ``rounds`` rounds, GC off like timeit."""
+        calls = 1
+        while True:
+            elapsed = self._round(func, calls)
+            if elapsed >= self.min_round_time:
+                break
+            calls *= 2 if elapsed <= 0 else max(2, int(self.min_round_time / elapsed) + 1)
+        return statistics.median(self._round(func, calls) / calls for _ in range(self.rounds))
+
+    def _round(self, func, calls):
+        enabled = gc.isenabled()
+        gc.disable()
+        try:
+            started = time.perf_counter()
+            for _ in range(calls):
+                func()
+            return time.perf_counter() - started
+        finally:
+            if enabled:
+                gc.enable()
+
+    @property
+    def reference_time(self):
+        if self._reference_time is None:
+            self._reference_time = self.time(_reference)
+        return self._reference_time
+
+    def check(self, name, func):
+        """Benchmark ``func``; return a message if it regressed, else None."""
+        seconds = self.time(func)
+        relative = seconds / self.reference_time
+        self.results[name] = {'relative': float(f'{relative:.4g}'), 'median_us': float(f'{seconds * 1e6:.4g}')}
+
+        baseline = self.baselines.get(name)
+        if baseline is None:
+            return None
+        limit = baseline['relative'] * (1 + self.threshold)
+        if relative > limit:
+            return (
+                f'{name} regressed: {relative:.4g}x the reference workload, baseline {baseline["relative"]:.4g}x '
+                f'({relative / baseline["relative"] - 1:+.0%}, threshold {self.threshold:+.0%}); '
+                f'{seconds * 1e6:.1f} us per call'
+            )
+        return None
+
+    def save(self):
+        """Merge this run's results into the baselines file."""
+        self.baselines.update(self.results)
+        self.path.write_text(json.dumps(dict(sorted(self.baselines.items())), indent=2) + '\n', encoding='utf-8')
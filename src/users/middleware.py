@@ -0,0 +1,71 @@
+import logging
+import random
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from . import metrics
+
+logger = logging.getLogger('users.performance')
+
+
+class PerformanceMiddleware:
+    """
+    Record wall time, SQL count and time, password hashing time and template
+    render time of every request into the histograms of ``users.metrics``,
+    labelled with the URL name of the view.
+
+    Requests slower than ``PERF_SLOW_REQUEST_MS`` are logged with their
+    queries for a ``PERF_SLOW_SAMPLE_RATE`` share of the traffic; SQL text
+    is only collected for those sampled requests.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.slow_threshold = settings.PERF_SLOW_REQUEST_MS
+        self.sample_rate = settings.PERF_SLOW_SAMPLE_RATE if self.slow_threshold is not None else 0.0
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        current, token, started = self._start()
+        try:
+            return self.get_response(request)
+        finally:
+            self._finish(request, current, token, started)
+
+    async def __acall__(self, request):
+        current, token, started = self._start()
+        try:
+            return await self.get_response(request)
+        finally:
+            self._finish(request, current, token, started)
+
+    def _start(self):
+        sampled = self.sample_rate > 0 and random.random() < self.sample_rate
+        current, token = metrics.start_request(record_queries=sampled)
+        return current, token, time.perf_counter()
+
+    def _finish(self, request, current, token, started):
+        elapsed = time.perf_counter() - started
+        metrics.finish_request(token)
+
+        match = request.resolver_match
+        view = (match.view_name if match else None) or 'unresolved'
+        metrics.observe_request(view, elapsed, current)
+
+        if current.queries is not None and elapsed * 1000 >= self.slow_threshold:
+            logger.warning(
+                'Slow request %s %s (%s): %.0f ms, %d queries in %.0f ms, hashing %.0f ms, rendering %.0f ms\n%s',
+                request.method, request.path, view, elapsed * 1000,
+                current.sql_count, current.sql_time * 1000,
+                current.hash_time * 1000, current.render_time * 1000,
+                '\n'.join(f'  {duration * 1000:8.2f} ms  {sql}' for duration, sql in current.queries),
+            )
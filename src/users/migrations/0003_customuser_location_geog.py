@@ -0,0 +1,38 @@
+# Generated by Django 5.2.7 on 2026-10-18 09:12
+
+import django.contrib.gis.db.models.fields
+import django.contrib.postgres.indexes
+import django.db.models.functions.comparison
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0002_alter_customuser_options_alter_customuser_managers_and_more"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="customuser",
+            name="location_geog",
+            field=models.GeneratedField(
+                db_persist=True,
+                expression=django.db.models.functions.comparison.Cast(
+                    "location",
+                    django.contrib.gis.db.models.fields.PointField(
+                        geography=True, srid=4326
+                    ),
+                ),
+                output_field=django.contrib.gis.db.models.fields.PointField(
+                    geography=True, srid=4326
+                ),
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="customuser",
+            index=django.contrib.postgres.indexes.GistIndex(
+                fields=["location_geog"], name="users_location_geog_gist"
+            ),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.7 on 2026-10-18 10:03
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0003_customuser_location_geog"),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name="customuser",
+            constraint=models.UniqueConstraint(
+                django.db.models.functions.text.Lower("email"),
+                name="users_customuser_email_ci_unique",
+            ),
+        ),
+    ]
@@ -0,0 +1,28 @@
+from django.db import migrations
+
+from users.regions import load_regions
+
+
+def forwards(apps, schema_editor):
+    Region = apps.get_model("users", "Region")
+    CustomUser = apps.get_model("users", "CustomUser")
+    load_regions(Region)
+
+    # Attach existing users to the region their location falls into
+    schema_editor.execute(
+        f"UPDATE {CustomUser._meta.db_table} AS u SET region_id = r.id "
+        f"FROM {Region._meta.db_table} AS r "
+        "WHERE u.region_id IS NULL AND u.location IS NOT NULL "
+        "AND ST_Intersects(r.boundary, u.location)"
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0005_region_customuser_region"),
+    ]
+
+    operations = [
+        migrations.RunPython(forwards, migrations.RunPython.noop),
+    ]
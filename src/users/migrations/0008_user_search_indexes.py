@@ -0,0 +1,46 @@
+# Generated by Django 5.2.7 on 2026-10-18 16:40
+
+import django.contrib.postgres.indexes
+import django.db.models.functions.text
+from django.contrib.postgres.operations import AddIndexConcurrently, TrigramExtension
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction; it keeps
+    # the user table writable while the indexes build
+    atomic = False
+
+    dependencies = [
+        ("users", "0007_emailjob"),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        AddIndexConcurrently(
+            model_name="customuser",
+            index=django.contrib.postgres.indexes.GinIndex(
+                django.contrib.postgres.indexes.OpClass(
+                    django.db.models.functions.text.Upper("email"),
+                    name="gin_trgm_ops",
+                ),
+                name="users_email_upper_trgm",
+            ),
+        ),
+        AddIndexConcurrently(
+            model_name="customuser",
+            index=django.contrib.postgres.indexes.GinIndex(
+                django.contrib.postgres.indexes.OpClass(
+                    django.db.models.functions.text.Upper("first_name"),
+                    name="gin_trgm_ops",
+                ),
+                name="users_first_name_upper_trgm",
+            ),
+        ),
+        AddIndexConcurrently(
+            model_name="customuser",
+            index=django.contrib.postgres.indexes.BrinIndex(
+                fields=["date_joined"], name="users_date_joined_brin"
+            ),
+        ),
+    ]
@@ -1,7 +1,18 @@
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager, PermissionsMixin
 from django.contrib.gis.db import models as gis_models  # Import GeoDjango models
+from django.contrib.postgres.indexes import BrinIndex, GinIndex, GistIndex, OpClass
+from django.db import connections
+from django.db.models import Q
+from django.db.models.functions import Cast, Lower, Upper
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
+from .regions import region_id_for_point
+from .tiles import MERCATOR_HALF_EXTENT
+
+# Enables `email__lower=...`, which matches the case-insensitive unique index
+gis_models.EmailField.register_lookup(Lower)
+
 
 class CustomUserManager(BaseUserManager):
     def create_user(self, email, password=None, **extra_fields):
@@ -9,6 +20,8 @@ class CustomUserManager(BaseUserManager):
             raise ValueError(_('The Email field must be set'))
         email = self.normalize_email(email)
         user = self.model(email=email, **extra_fields)
+        if user.location is not None and user.region_id is None:
+            user.region_id = region_id_for_point(user.location)
         user.set_password(password)
         user.save(using=self._db)
         return user
@@ -25,6 +38,108 @@ class CustomUserManager(BaseUserManager):
 
         return self.create_user(email, password, **extra_fields)
 
+    def get_by_natural_key(self, username):
+        return self.get(email__lower=username.lower())
+
+    async def aget_by_natural_key(self, username):
+        return await self.aget(email__lower=username.lower())
+
+    def nearby(self, lng, lat, limit=20, after=None, exclude_pk=None):
+        """
+        Return up to ``limit`` active users closest to (lng, lat) as dicts
+        with ``pk``, ``first_name`` and ``distance`` in meters.
+
+        Rows are ordered by the GiST KNN operator on ``location_geog`` and
+        paged with a keyset: pass ``(pk, min_distance)`` of the last row of
+        the previous page as ``after``. Its distance is looked up again
+        rather than taken from the caller, so cursors need not carry it;
+        ``min_distance``, a lower bound of it, is where the next page starts
+        when that user has been deleted or lost the location meanwhile.
+        """
+        connection = connections[self.db]
+        table = connection.ops.quote_name(self.model._meta.db_table)
+        # Keep the reference point inline so the planner can drive the
+        # ordering straight from the index instead of sorting
+        ref = 'ST_SetSRID(ST_MakePoint(%(lng)s, %(lat)s), 4326)::geography'
+        where = ['is_active', 'location_geog IS NOT NULL']
+        params = {'lng': lng, 'lat': lat, 'limit': limit}
+
+        if exclude_pk is not None:
+            where.append('id <> %(exclude_pk)s')
+            params['exclude_pk'] = exclude_pk
+        if after is not None:
+            where.append(
+                f'(location_geog <-> {ref}, id) > ('
+                f'  coalesce((SELECT location_geog <-> {ref} FROM {table} WHERE id = %(after_pk)s), %(min_distance)s),'
+                f'  %(after_pk)s'
+                f')'
+            )
+            params['after_pk'], params['min_distance'] = after
+
+        sql = (
+            f'SELECT id, first_name, location_geog <-> {ref} AS distance '
+            f'FROM {table} '
+            f'WHERE {" AND ".join(where)} '
+            f'ORDER BY location_geog <-> {ref}, id '
+            f'LIMIT %(limit)s'
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return [
+                {'pk': pk, 'first_name': first_name, 'distance': distance}
+                for pk, first_name, distance in cursor.fetchall()
+            ]
+
+    def tile(self, z, x, y, cell_size):
+        """
+        Mapbox Vector Tile z/x/y of active users, rendered by PostGIS.
+
+        One ``users`` layer of points with a ``count`` attribute: users are
+        merged per ``cell_size`` grid cell (Web Mercator meters, a whole
+        fraction of the tile width) into one point at their centroid, so a
+        tile stays small however many users it covers.
+        """
+        connection = connections[self.db]
+        table = connection.ops.quote_name(self.model._meta.db_table)
+        # The bounding box in 4326 lets the GiST index on `location` find the rows
+        sql = (
+            'WITH bounds AS (SELECT ST_TileEnvelope(%(z)s, %(x)s, %(y)s) AS geom), '
+            'points AS ('
+            '  SELECT ST_Transform(location, 3857) AS geom '
+            f' FROM {table}, bounds '
+            '  WHERE is_active AND location && ST_Transform(bounds.geom, 4326)'
+            '), '
+            'features AS ('
+            '  SELECT ST_AsMVTGeom(ST_Centroid(ST_Collect(points.geom)), bounds.geom) AS geom, '
+            '         count(*) AS count '
+            '  FROM points, bounds '
+            '  GROUP BY ST_SnapToGrid(points.geom, %(origin)s, %(origin)s, %(cell)s, %(cell)s), bounds.geom'
+            ') '
+            "SELECT ST_AsMVT(features, 'users', 4096, 'geom') FROM features"
+        )
+        with connection.cursor() as cursor:
+            # ST_SnapToGrid rounds to the nearest grid point; with the grid
+            # points at cell centers the cells line up with the tile edges
+            origin = -MERCATOR_HALF_EXTENT + cell_size / 2
+            cursor.execute(sql, {'z': z, 'x': x, 'y': y, 'origin': origin, 'cell': cell_size})
+            return bytes(cursor.fetchone()[0] or b'')
+
+
+class Region(gis_models.Model):
+    # ISO 3166-2 code, e.g. UA-32
+    code = gis_models.CharField(max_length=8, unique=True)
+    name = gis_models.CharField(max_length=100, unique=True)
+    boundary = gis_models.MultiPolygonField(srid=4326)
+    # A point guaranteed to lie inside the boundary (unlike the centroid),
+    # used as the user location when only the region is known
+    label_point = gis_models.PointField(srid=4326, spatial_index=False)
+
+    class Meta:
+        ordering = ['name']
+
+    def __str__(self):
+        return self.name
+
 
 class CustomUser(AbstractBaseUser, PermissionsMixin):
     email = gis_models.EmailField(_('email address'), unique=True)
@@ -32,6 +147,16 @@ class CustomUser(AbstractBaseUser, PermissionsMixin):
 
     # srid=4326 is the standard for GPS coordinates (WGS 84)
     location = gis_models.PointField(srid=4326, blank=True, null=True)
+    region = gis_models.ForeignKey(
+        Region, on_delete=gis_models.SET_NULL, blank=True, null=True, related_name='users'
+    )
+    # Geography copy of `location` maintained by PostgreSQL itself,
+    # used for KNN lookups and distances in meters
+    location_geog = gis_models.GeneratedField(
+        expression=Cast('location', gis_models.PointField(geography=True, srid=4326)),
+        output_field=gis_models.PointField(geography=True, srid=4326),
+        db_persist=True,
+    )
 
     # Required for Admin/Auth
     is_staff = gis_models.BooleanField(default=False)
@@ -43,5 +168,115 @@ class CustomUser(AbstractBaseUser, PermissionsMixin):
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['first_name']
 
+    class Meta:
+        indexes = [
+            GistIndex(fields=['location_geog'], name='users_location_geog_gist'),
+            # Admin search: icontains compiles to UPPER(col::text) LIKE '%...%'
+            GinIndex(OpClass(Upper('email'), name='gin_trgm_ops'), name='users_email_upper_trgm'),
+            GinIndex(OpClass(Upper('first_name'), name='gin_trgm_ops'), name='users_first_name_upper_trgm'),
+            # Rows are appended in join order, so block ranges stay tight
+            BrinIndex(fields=['date_joined'], name='users_date_joined_brin'),
+        ]
+        constraints = [
+            gis_models.UniqueConstraint(Lower('email'), name='users_customuser_email_ci_unique'),
+        ]
+
     def __str__(self):
         return self.email
+
+
+class EmailJob(gis_models.Model):
+    """
+    Outbound email waiting for ``manage.py run_worker``. Sent jobs are
+    deleted, so the table only holds the backlog and the failures.
+    """
+
+    PENDING = 'pending'
+    FAILED = 'failed'
+    STATUS_CHOICES = [(PENDING, _('pending')), (FAILED, _('failed'))]
+
+    recipient = gis_models.EmailField()
+    subject = gis_models.CharField(max_length=255)
+    body = gis_models.TextField()
+    html_body = gis_models.TextField(blank=True)
+    status = gis_models.CharField(max_length=8, choices=STATUS_CHOICES, default=PENDING)
+    attempts = gis_models.PositiveSmallIntegerField(default=0)
+    # Not picked up before this moment, pushed back after every failure
+    run_after = gis_models.DateTimeField(default=timezone.now)
+    last_error = gis_models.TextField(blank=True)
+    created_at = gis_models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # What the workers poll: only the pending rows, oldest first
+            gis_models.Index(
+                fields=['run_after'], condition=Q(status='pending'), name='users_emailjob_pending_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.subject} → {self.recipient}'
+
+
+class DailySignups(gis_models.Model):
+    """Registrations per day and region, maintained by ``manage.py rollup_signups``."""
+
+    day = gis_models.DateField()
+    region = gis_models.ForeignKey(Region, on_delete=gis_models.CASCADE, blank=True, null=True, related_name='+')
+    count = gis_models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            # One row per day for users without a region too (PostgreSQL 15+)
+            gis_models.UniqueConstraint(
+                fields=['day', 'region'], name='users_dailysignups_day_region_unique', nulls_distinct=False
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.day} {self.region_id}: {self.count}'
+
+
+class RollupWatermark(gis_models.Model):
+    """The last user id a rollup has processed, so each run only reads newer rows."""
+
+    name = gis_models.CharField(max_length=50, primary_key=True)
+    last_id = gis_models.BigIntegerField(default=0)
+    updated_at = gis_models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f'{self.name}: {self.last_id}'
+
+
+class AuthEvent(gis_models.Model):
+    """
+    Append-only log of sign-ins and registrations for security review,
+    written in batches by ``users.writebehind``.
+    """
+
+    LOGIN = 'login'
+    LOGIN_FAILED = 'login_failed'
+    REGISTER = 'register'
+    KIND_CHOICES = [(LOGIN, _('login')), (LOGIN_FAILED, _('failed login')), (REGISTER, _('registration'))]
+
+    kind = gis_models.CharField(max_length=16, choices=KIND_CHOICES)
+    # Kept after the user is deleted; failed logins may have no user at all.
+    # Indexed together with created_at below.
+    user = gis_models.ForeignKey(
+        CustomUser, on_delete=gis_models.SET_NULL, blank=True, null=True, related_name='+', db_index=False
+    )
+    email = gis_models.EmailField(blank=True)
+    ip = gis_models.GenericIPAddressField(blank=True, null=True)
+    user_agent = gis_models.CharField(max_length=255, blank=True)
+    # When it happened, not when the batch was written
+    created_at = gis_models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            # Appended in time order, so block ranges stay tight
+            BrinIndex(fields=['created_at'], name='users_authevent_created_brin'),
+            gis_models.Index(fields=['user', 'created_at'], name='users_authevent_user_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.created_at} {self.kind} {self.email}'
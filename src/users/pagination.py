@@ -0,0 +1,40 @@
+import json
+from functools import cached_property
+
+from django.core.paginator import Paginator
+from django.db import connections
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator that never counts more than ``exact_limit`` rows. Larger
+    results get PostgreSQL's estimate instead: ``pg_class.reltuples`` for the
+    whole table, the planner's row estimate for a filtered queryset. Page
+    numbers past the real end simply come out empty.
+    """
+
+    exact_limit = 10_000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        # COUNT(*) over a LIMITed subquery stops after exact_limit + 1 rows
+        exact = queryset[: self.exact_limit + 1].count()
+        if exact <= self.exact_limit:
+            return exact
+
+        if not queryset.query.where:
+            estimate = self._table_estimate(queryset)
+        else:
+            plan = json.loads(queryset.explain(format='json'))
+            estimate = int(plan[0]['Plan']['Plan Rows'])
+        # reltuples is -1 before the first ANALYZE
+        return max(estimate, exact)
+
+    def _table_estimate(self, queryset):
+        with connections[queryset.db].cursor() as cursor:
+            cursor.execute(
+                'SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass',
+                [queryset.model._meta.db_table],
+            )
+            return cursor.fetchone()[0]
@@ -0,0 +1,158 @@
+import json
+import math
+import threading
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.gis.geos import GEOSException, GEOSGeometry, MultiPolygon
+
+REGIONS_GEOJSON = Path(__file__).resolve().parent / 'data' / 'regions.geojson'
+
+
+class STRtree:
+    """
+    Read-only R-tree bulk loaded with the Sort-Tile-Recursive algorithm.
+
+    Built from ``(bbox, payload)`` pairs where ``bbox`` is
+    ``(xmin, ymin, xmax, ymax)``; ``query(x, y)`` yields the payloads whose
+    boxes contain the point.
+    """
+
+    def __init__(self, entries, node_capacity=8):
+        self.node_capacity = node_capacity
+        nodes = [(bbox, payload, True) for bbox, payload in entries]
+        while len(nodes) > node_capacity:
+            nodes = self._pack(nodes)
+        self._root = (self._union(nodes), nodes, False) if nodes else None
+
+    def _pack(self, nodes):
+        capacity = self.node_capacity
+        slice_count = math.ceil(math.sqrt(math.ceil(len(nodes) / capacity)))
+        slice_size = slice_count * capacity
+
+        nodes = sorted(nodes, key=lambda node: node[0][0] + node[0][2])
+        packed = []
+        for i in range(0, len(nodes), slice_size):
+            vertical = sorted(nodes[i:i + slice_size], key=lambda node: node[0][1] + node[0][3])
+            for j in range(0, len(vertical), capacity):
+                children = vertical[j:j + capacity]
+                packed.append((self._union(children), children, False))
+        return packed
+
+    @staticmethod
+    def _union(nodes):
+        return (
+            min(node[0][0] for node in nodes),
+            min(node[0][1] for node in nodes),
+            max(node[0][2] for node in nodes),
+            max(node[0][3] for node in nodes),
+        )
+
+    def query(self, x, y):
+        stack = [self._root] if self._root else []
+        while stack:
+            (xmin, ymin, xmax, ymax), content, is_entry = stack.pop()
+            if not (xmin <= x <= xmax and ymin <= y <= ymax):
+                continue
+            if is_entry:
+                yield content
+            else:
+                stack.extend(content)
+
+
+class RegionIndex:
+    """In-memory point-in-region lookup over prepared region boundaries."""
+
+    def __init__(self, regions):
+        self._tree = STRtree(
+            (region.boundary.extent, (region.pk, region.boundary.prepared))
+            for region in regions
+        )
+        # Prepared geometries build their internal index lazily on first use,
+        # which GEOS does not guard against concurrent callers
+        self._lock = threading.Lock()
+
+    def find(self, point):
+        with self._lock:
+            for pk, prepared in self._tree.query(point.x, point.y):
+                if prepared.covers(point):
+                    return pk
+        return None
+
+
+_index = None
+_index_lock = threading.Lock()
+_regions = None
+
+
+def get_region_index():
+    global _index
+    if _index is None:
+        from .models import Region
+
+        with _index_lock:
+            if _index is None:
+                _index = RegionIndex(Region.objects.only('pk', 'boundary'))
+    return _index
+
+
+def _region_queryset():
+    from .models import Region
+
+    return Region.objects.only('pk', 'code', 'name', 'label_point')
+
+
+def get_regions():
+    """All regions keyed by name, without boundaries, cached per process."""
+    global _regions
+    if _regions is None:
+        _regions = {region.name: region for region in _region_queryset()}
+    return _regions
+
+
+async def aget_regions():
+    global _regions
+    if _regions is None:
+        _regions = {region.name: region async for region in _region_queryset()}
+    return _regions
+
+
+def reset_region_cache():
+    global _index, _regions
+    _index = None
+    _regions = None
+
+
+def region_id_for_point(point):
+    """Return the pk of the region containing ``point`` (SRID 4326), or None."""
+    if settings.REGION_LOOKUP_IN_MEMORY:
+        try:
+            return get_region_index().find(point)
+        except GEOSException:
+            pass
+
+    from .models import Region
+
+    return Region.objects.filter(boundary__intersects=point).values_list('pk', flat=True).first()
+
+
+def load_regions(region_model, path=REGIONS_GEOJSON):
+    """Create or update regions from a GeoJSON FeatureCollection with ``code`` and ``name`` properties."""
+    with open(path, encoding='utf-8') as f:
+        collection = json.load(f)
+
+    count = 0
+    for feature in collection['features']:
+        boundary = GEOSGeometry(json.dumps(feature['geometry']), srid=4326)
+        if boundary.geom_type == 'Polygon':
+            boundary = MultiPolygon(boundary, srid=4326)
+        region_model.objects.update_or_create(
+            code=feature['properties']['code'],
+            defaults={
+                'name': feature['properties']['name'],
+                'boundary': boundary,
+                'label_point': boundary.point_on_surface,
+            },
+        )
+        count += 1
+    return count
@@ -0,0 +1,38 @@
+from django.contrib.gis.db.models.functions import Distance
+from django.contrib.gis.geos import Point
+from django.contrib.postgres.search import TrigramWordSimilarity
+from django.db.models import Q
+from django.db.models.functions import Greatest, Upper
+
+# Shorter queries have too few trigrams for the index to narrow anything down
+MIN_QUERY_LENGTH = 3
+
+
+def search_users(queryset, query, near=None, radius=None):
+    """
+    Users from ``queryset`` whose email or first name contains something
+    like ``query``, best matches first, annotated with ``search_rank``
+    (0..1, pg_trgm word similarity).
+
+    ``UPPER(col) %> query`` is what the trigram GIN indexes on UPPER(email)
+    and UPPER(first_name) can answer, so only candidate rows above
+    ``pg_trgm.word_similarity_threshold`` (0.6 by default) are ranked; case
+    does not matter to pg_trgm. With ``near`` (lng, lat) and ``radius`` in
+    meters only users within that distance are kept, through the GiST index
+    on ``location_geog``, and annotated with ``distance``.
+    """
+    query = query.strip()
+    queryset = queryset.alias(email_upper=Upper('email'), first_name_upper=Upper('first_name')).filter(
+        Q(email_upper__trigram_word_similar=query) | Q(first_name_upper__trigram_word_similar=query)
+    ).annotate(
+        search_rank=Greatest(
+            TrigramWordSimilarity(query, Upper('email')),
+            TrigramWordSimilarity(query, Upper('first_name')),
+        ),
+    )
+    if near is not None:
+        point = Point(*near, srid=4326)
+        queryset = queryset.filter(location_geog__dwithin=(point, radius)).annotate(
+            distance=Distance('location_geog', point)
+        )
+    return queryset.order_by('-search_rank', 'pk')
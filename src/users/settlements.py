@@ -0,0 +1,138 @@
+import csv
+import heapq
+import threading
+import unicodedata
+from bisect import bisect_left
+from collections import Counter
+from dataclasses import dataclass
+from pathlib import Path
+
+from django.contrib.gis.geos import Point
+
+SETTLEMENTS_TSV = Path(__file__).resolve().parent / 'data' / 'settlements.tsv'
+
+MAX_RESULTS = 20
+
+# Typed in every possible way: ASCII, typographic, modifier letter, accents
+APOSTROPHES = "'’ʼ‘`´ʹ"
+_FOLD_TABLE = str.maketrans({**dict.fromkeys(APOSTROPHES), '\u0301': None, 'ґ': 'г', 'ё': 'е', '-': ' '})
+
+# Prefixes matching more names than this are ranked once, when the index is
+# built, so short queries like "ново" cost a dict lookup instead of a sort
+_PRECOMPUTE_ABOVE = 64
+
+
+def fold(text):
+    """
+    Search key for ``text``: NFC, case-folded, without apostrophes and
+    stress marks, with ґ as г and hyphens as spaces, so "Мар'їнка",
+    "МАРʼЇНКА" and "мар’їнка" are the same key.
+    """
+    text = unicodedata.normalize('NFC', text).casefold().translate(_FOLD_TABLE)
+    return ' '.join(text.split())
+
+
+@dataclass(frozen=True, slots=True)
+class Settlement:
+    id: int
+    name: str
+    name_latin: str
+    region_code: str
+    latitude: float
+    longitude: float
+    population: int
+
+    @property
+    def point(self):
+        return Point(self.longitude, self.latitude, srid=4326)
+
+
+class SettlementIndex:
+    """
+    Prefix search over settlement names in a sorted array of folded keys.
+
+    Every settlement is indexed by its Ukrainian and Latin names and by each
+    word of them, so "покр" finds "Нова Покровка". Matches of the whole name
+    rank above matches of a later word, then larger places come first.
+    """
+
+    def __init__(self, settlements):
+        self.by_id = {settlement.id: settlement for settlement in settlements}
+
+        entries = set()
+        for settlement in self.by_id.values():
+            for name in (settlement.name, settlement.name_latin):
+                words = fold(name).split(' ')
+                for i in range(len(words)):
+                    entries.add((' '.join(words[i:]), i > 0, settlement.id))
+        entries = sorted(entries)
+        self._keys = [key for key, _, _ in entries]
+        self._hits = [(later_word, pk) for _, later_word, pk in entries]
+
+        counts = Counter(key[:length] for key in self._keys for length in range(1, len(key) + 1))
+        self._precomputed = {
+            prefix: self._rank(prefix, MAX_RESULTS) for prefix, count in counts.items() if count > _PRECOMPUTE_ABOVE
+        }
+
+    def get(self, pk):
+        return self.by_id.get(pk)
+
+    def search(self, query, limit=10):
+        key = fold(query)
+        if not key:
+            return []
+        limit = min(limit, MAX_RESULTS)
+        if key in self._precomputed:
+            return self._precomputed[key][:limit]
+        return self._rank(key, limit)
+
+    def _rank(self, key, limit):
+        lo = bisect_left(self._keys, key)
+        hi = bisect_left(self._keys, key + '\uffff', lo)
+        best = {}
+        for later_word, pk in self._hits[lo:hi]:
+            best[pk] = min(best.get(pk, later_word), later_word)
+        return heapq.nsmallest(
+            limit,
+            (self.by_id[pk] for pk in best),
+            key=lambda settlement: (best[settlement.id], -settlement.population, settlement.name),
+        )
+
+    def find_by_name(self, name):
+        """The largest settlement called exactly ``name``, for submissions without JavaScript."""
+        key = fold(name)
+        i = bisect_left(self._keys, key)
+        matches = []
+        while i < len(self._keys) and self._keys[i] == key:
+            later_word, pk = self._hits[i]
+            if not later_word:
+                matches.append(self.by_id[pk])
+            i += 1
+        return max(matches, key=lambda settlement: settlement.population, default=None)
+
+
+def read_settlements(path=SETTLEMENTS_TSV):
+    with open(path, encoding='utf-8', newline='') as f:
+        for row in csv.DictReader(f, delimiter='\t'):
+            yield Settlement(
+                id=int(row['geonameid']),
+                name=row['name'],
+                name_latin=row['name_latin'],
+                region_code=row['region'],
+                latitude=float(row['latitude']),
+                longitude=float(row['longitude']),
+                population=int(row['population'] or 0),
+            )
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_settlement_index():
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = SettlementIndex(read_settlements())
+    return _index
@@ -0,0 +1,58 @@
+from functools import partial
+
+from django.contrib.auth.models import update_last_login
+from django.contrib.auth.signals import user_logged_in
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .backends import forget_user
+from .metrics import record_query
+from .models import CustomUser, Region
+from .regions import reset_region_cache
+from .tiles import TILE_FIELDS, invalidate_tiles
+from .writebehind import record_login
+
+# Django's receiver saves last_login inside every login; it is buffered instead
+user_logged_in.disconnect(update_last_login, dispatch_uid='update_last_login')
+
+
+@receiver([post_save, post_delete], sender=Region)
+def region_changed(sender, **kwargs):
+    reset_region_cache()
+
+
+@receiver(connection_created)
+def instrument_connection(sender, connection, **kwargs):
+    # Fired again on reconnects of the same wrapper, so install only once
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+@receiver(pre_save, sender=CustomUser)
+def remember_old_location(sender, instance, raw=False, update_fields=None, **kwargs):
+    # A user who moves leaves a stale tile behind at the old spot too
+    instance._old_location = None
+    if instance.pk is not None and not raw and (update_fields is None or TILE_FIELDS.intersection(update_fields)):
+        instance._old_location = (
+            sender._default_manager.filter(pk=instance.pk).values_list('location', flat=True).first()
+        )
+
+
+@receiver([post_save, post_delete], sender=CustomUser)
+def user_changed(sender, instance, update_fields=None, **kwargs):
+    forget_user(instance.pk)
+    # Until the commit other workers still read the old row and may cache
+    # it again, so forget it once more when the change is visible
+    transaction.on_commit(partial(forget_user, instance.pk))
+    if update_fields is None or TILE_FIELDS.intersection(update_fields):
+        points = [point for point in (instance.location, getattr(instance, '_old_location', None)) if point is not None]
+        transaction.on_commit(partial(invalidate_tiles, points))
+
+
+@receiver(user_logged_in)
+def login_recorded(sender, request, user, **kwargs):
+    user.last_login = timezone.now()
+    record_login(request, user)
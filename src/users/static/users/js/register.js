@@ -40,6 +40,36 @@
         }
     }
 
+    // Ask the server whether the email is free once the field is left, not
+    // while typing: the lookups are rate limited per IP, and one NAT can hide
+    // many people registering at once
+    const emailTakenError = document.getElementById('emailTakenError');
+    const emailCheckUrl = form ? form.dataset.emailCheckUrl : null;
+    let emailCheckController = null;
+
+    function hideEmailTaken() {
+        if (emailCheckController) emailCheckController.abort();
+        emailTakenError.style.display = 'none';
+    }
+
+    function checkEmailAvailability() {
+        hideEmailTaken();
+
+        const email = emailInput.value.trim();
+        if (!emailCheckUrl || !/^[^\s@]+@[^\s@]+\.[^\s@]+$/.test(email)) return;
+
+        emailCheckController = new AbortController();
+        fetch(emailCheckUrl + '?email=' + encodeURIComponent(email), {signal: emailCheckController.signal})
+            .then(function (response) { return response.ok ? response.json() : null; })
+            .then(function (data) {
+                if (data && data.available === false && emailInput.value.trim() === email) {
+                    emailInput.classList.add('is-invalid');
+                    emailTakenError.style.display = 'block';
+                }
+            })
+            .catch(function () { /* aborted, offline or limited: the server validates on submit anyway */ });
+    }
+
     function validatePassword() {
         const val = passwordInput.value;
         const lenCheck = val.length >= 8;
@@ -87,7 +117,14 @@
     }
 
     // Attach listeners
-    if (emailInput) emailInput.addEventListener('blur', validateEmail);
+    if (emailInput) {
+        emailInput.addEventListener('blur', validateEmail);
+        if (emailTakenError) {
+            emailInput.addEventListener('input', hideEmailTaken);
+            // Fires when the field is left after a change
+            emailInput.addEventListener('change', checkEmailAvailability);
+        }
+    }
 
     if (passwordInput) {
         passwordInput.addEventListener('blur', validatePassword);
@@ -100,52 +137,61 @@
     if (nameInput) nameInput.addEventListener('blur', validateName);
 
 
-    // Searchable dropdown for region selection
-    const regionInput = document.getElementById('regionInput');
-    const regionWrapper = document.getElementById('regionWrapper');
-    const regionList = document.getElementById('regionList');
-
-    if (regionInput && regionWrapper && regionList) {
-        const listItems = regionList.getElementsByTagName('li');
-
-        regionInput.addEventListener('input', function() {
-            const filter = regionInput.value.toLowerCase();
-            regionWrapper.classList.add('active');
+    // Settlement autocomplete, searched on the server
+    const settlementInput = document.getElementById('settlementInput');
+    const settlementId = document.getElementById('settlementId');
+    const settlementWrapper = document.getElementById('settlementWrapper');
+    const settlementList = document.getElementById('settlementList');
+    const settlementsUrl = form ? form.dataset.settlementsUrl : null;
+
+    if (settlementInput && settlementId && settlementWrapper && settlementList && settlementsUrl) {
+        let settlementTimer = null;
+        let settlementController = null;
+
+        function showSettlements(results) {
+            settlementList.replaceChildren();
+            results.forEach(function (settlement) {
+                const item = document.createElement('li');
+                item.dataset.id = settlement.id;
+                item.dataset.name = settlement.name;
+                item.textContent = settlement.region ? settlement.name + ', ' + settlement.region : settlement.name;
+                settlementList.appendChild(item);
+            });
+            settlementWrapper.classList.toggle('active', results.length > 0);
+        }
 
-            for (let i = 0; i < listItems.length; i++) {
-                const txtValue = listItems[i].textContent || listItems[i].innerText;
-                if (txtValue.toLowerCase().startsWith(filter)) {
-                    listItems[i].style.display = "";
-                } else {
-                    listItems[i].style.display = "none";
-                }
-            }
+        settlementInput.addEventListener('input', function() {
+            // Typing again invalidates the previous choice
+            settlementId.value = '';
+            clearTimeout(settlementTimer);
+            if (settlementController) settlementController.abort();
 
-            if(filter === '') {
-                for (let i = 0; i < listItems.length; i++) {
-                    listItems[i].style.display = "";
-                }
+            const query = settlementInput.value.trim();
+            if (query === '') {
+                showSettlements([]);
+                return;
             }
-        });
 
-        regionInput.addEventListener('focus', function() {
-            regionWrapper.classList.add('active');
-            // Reset to show all on focus
-            for (let i = 0; i < listItems.length; i++) {
-                listItems[i].style.display = "";
-            }
+            settlementTimer = setTimeout(function () {
+                settlementController = new AbortController();
+                fetch(settlementsUrl + '?q=' + encodeURIComponent(query), {signal: settlementController.signal})
+                    .then(function (response) { return response.ok ? response.json() : {results: []}; })
+                    .then(function (data) { showSettlements(data.results); })
+                    .catch(function () { /* aborted or offline: the server resolves the typed name on submit */ });
+            }, 150);
         });
 
-        regionList.addEventListener('click', function(e) {
+        settlementList.addEventListener('click', function(e) {
             if (e.target && e.target.nodeName === "LI") {
-                regionInput.value = e.target.textContent;
-                regionWrapper.classList.remove('active');
+                settlementInput.value = e.target.dataset.name;
+                settlementId.value = e.target.dataset.id;
+                settlementWrapper.classList.remove('active');
             }
         });
 
         document.addEventListener('click', function(e) {
-            if (!regionWrapper.contains(e.target)) {
-                regionWrapper.classList.remove('active');
+            if (!settlementWrapper.contains(e.target)) {
+                settlementWrapper.classList.remove('active');
             }
         });
     }
@@ -1,3 +1,1425 @@
-from django.test import TestCase
+import asyncio
+import csv
+import io
+import json
+import os
+import re
+import runpy
+import smtplib
+import tempfile
+import time
+import zoneinfo
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+
+from django.conf import settings
+from django.contrib.auth import authenticate
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
+from django.contrib.auth.models import AnonymousUser
+from django.contrib.gis.geos import GEOSGeometry, Point
+from django.core import signing
+from django.core.cache import caches
+from django.core.management import CommandError, call_command
+from django.db import DatabaseError, IntegrityError, OperationalError
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from . import mail, metrics, regions, throttling
+from .analytics import SIGNUPS_ROLLUP, rollup_signups, signup_series
+from .availability import TTLCache
+from .backends import USER_CACHE_KEY, CachedModelBackend
+from .caching import CSRF_PLACEHOLDER
+from .export import EXPORT_FIELDS, aiter_export, export_queryset, export_response, iter_export
+from .forms import LoginForm, RegistrationForm
+from .hashers import TunedPBKDF2PasswordHasher
+from .loadtest import LoadTest, LoadTestConfig
+from .management.commands import calibrate_hashers
+from .microbench import BenchmarkSuite
+from .models import AuthEvent, CustomUser, DailySignups, EmailJob, Region, RollupWatermark
+from .pagination import EstimatedCountPaginator
+from .search import search_users
+from .settlements import Settlement, SettlementIndex, fold
+from .tiles import TileCache, is_valid_tile, tile_for_point
+from .validators import CustomRequirementsValidator
+from .views import NEARBY_CURSOR_MAX_AGE, NEARBY_CURSOR_SALT, nearby_view
+from .writebehind import LAST_LOGIN, WriteBehindBuffer
+
+
+@skipUnless(os.environ.get('LOADTEST_URL'), 'Set LOADTEST_URL to the base URL of a running server.')
+class SignupLoadTest(SimpleTestCase):
+    """
+    Load test against a live server, for example:
+
+        LOADTEST_URL=http://127.0.0.1:8000/ pytest src/users/tests.py
+
+    LOADTEST_CLIENTS and LOADTEST_ITERATIONS set the size of the run and
+    LOADTEST_REPORT a file for the JSON report.
+    """
+
+    def test_signup_and_login(self):
+        config = LoadTestConfig(
+            base_url=os.environ['LOADTEST_URL'],
+            clients=int(os.environ.get('LOADTEST_CLIENTS', 20)),
+            iterations=int(os.environ.get('LOADTEST_ITERATIONS', 10)),
+        )
+        report = LoadTest(config).run()
+
+        if os.environ.get('LOADTEST_REPORT'):
+            with open(os.environ['LOADTEST_REPORT'], 'w', encoding='utf-8') as f:
+                json.dump(report, f, indent=2)
+
+        self.assertEqual(report['errors'], 0, json.dumps(report['steps'], indent=2))
+
+
+def _regions_from_geojson():
+    # The bundled boundaries as unsaved rows, so nothing needs a database
+    with open(regions.REGIONS_GEOJSON, encoding='utf-8') as f:
+        features = json.load(f)['features']
+    result = []
+    for pk, feature in enumerate(features, start=1):
+        boundary = GEOSGeometry(json.dumps(feature['geometry']), srid=4326)
+        result.append(Region(
+            pk=pk, code=feature['properties']['code'], name=feature['properties']['name'],
+            boundary=boundary, label_point=boundary.point_on_surface,
+        ))
+    return result
+
+
+REGISTRATION_DATA = {
+    'email': 'olena@dyvo.ua',
+    'first_name': 'Olena',
+    'password': 'Benchmark123',
+    'confirm_password': 'Benchmark123',
+    'region': 'Київська область',
+    'terms_confirmed': 'on',
+}
+
+
+@skipUnless(os.environ.get('BENCHMARK'), 'Set BENCHMARK=1 to run the micro-benchmarks.')
+# A fixed, cheap hash, so set_password measures the same work on every host
+@override_settings(
+    PASSWORD_HASHERS=['users.hashers.TunedPBKDF2PasswordHasher'],
+    PASSWORD_HASHER_PARAMS={'pbkdf2_sha256': {'iterations': 10_000}},
+)
+class HotPathBenchmarks(SimpleTestCase):
+    """
+    Micro-benchmarks of the CPU-bound registration paths, compared with the
+    baselines in users/data/benchmarks.json:
+
+        BENCHMARK=1 pytest src/users/tests.py -k Benchmarks
+
+    BENCHMARK_THRESHOLD sets the allowed slowdown (default 0.25, i.e. 25%)
+    and BENCHMARK_SAVE=1 records the run as the new baselines, for changes
+    that are meant to be slower or faster.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.suite = BenchmarkSuite(threshold=float(os.environ.get('BENCHMARK_THRESHOLD', 0.25)))
+        region_list = _regions_from_geojson()
+        regions._regions = {region.name: region for region in region_list}
+        regions._index = regions.RegionIndex(region_list)
+
+    @classmethod
+    def tearDownClass(cls):
+        regions.reset_region_cache()
+        if os.environ.get('BENCHMARK_SAVE'):
+            cls.suite.save()
+        super().tearDownClass()
+
+    def assertNoRegression(self, name, func):
+        regression = self.suite.check(name, func)
+        if regression:
+            self.fail(regression)
+
+    def _cleaned_form(self, **cleaned_data):
+        form = RegistrationForm(REGISTRATION_DATA)
+        form.cleaned_data = cleaned_data
+        return form
+
+    def test_clean_first_name(self):
+        form = self._cleaned_form(first_name='Olena')
+        self.assertNoRegression('form.clean_first_name', form.clean_first_name)
+
+    def test_clean_password(self):
+        form = self._cleaned_form(password='Benchmark123')
+        self.assertNoRegression('form.clean_password', form.clean_password)
+
+    def test_clean_region(self):
+        form = self._cleaned_form(region='Київська область')
+        self.assertNoRegression('form.clean_region', form.clean_region)
+
+    def test_password_validator(self):
+        validator = CustomRequirementsValidator()
+        self.assertNoRegression('validators.CustomRequirementsValidator', lambda: validator.validate('Benchmark123'))
+
+    def test_region_lookup(self):
+        kyiv = Point(30.5234, 50.4501, srid=4326)
+        self.assertIsNotNone(regions.region_id_for_point(kyiv))
+        self.assertNoRegression('regions.region_id_for_point', lambda: regions.region_id_for_point(kyiv))
+
+    def test_set_password(self):
+        user = CustomUser(email='olena@dyvo.ua')
+        self.assertNoRegression('user.set_password', lambda: user.set_password('Benchmark123'))
+
+    def test_registration_cycle(self):
+        def register():
+            form = RegistrationForm(REGISTRATION_DATA)
+            assert form.is_valid(), form.errors
+            form.save(commit=False)
+
+        self.assertNoRegression('form.is_valid+save(commit=False)', register)
+
+
+# Tests run without collectstatic, so there is no manifest to look names up in
+PLAIN_STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+}
+FAST_HASHING = {
+    'PASSWORD_HASHERS': ['users.hashers.TunedPBKDF2PasswordHasher'],
+    'PASSWORD_HASHER_PARAMS': {'pbkdf2_sha256': {'iterations': 1_000}},
+}
+
+
+def _skip_write_behind(test):
+    # Its thread would write login side effects outside the test transaction
+    for target in ('users.signals.record_login', 'users.views.record_event'):
+        patcher = mock.patch(target)
+        patcher.start()
+        test.addCleanup(patcher.stop)
+
+
+class NearbyRequestTests(SimpleTestCase):
+    def _get(self, user=None, **params):
+        request = RequestFactory().get(reverse('nearby'), {'lng': 30.52, 'lat': 50.45, **params})
+        request.user = user or CustomUser(pk=1, email='olena@dyvo.ua')
+        return nearby_view(request)
+
+    def test_login_required(self):
+        self.assertEqual(self._get(AnonymousUser()).status_code, 401)
+
+    def test_tampered_cursor(self):
+        cursor = signing.dumps([5, 1000], salt=NEARBY_CURSOR_SALT)
+        self.assertEqual(self._get(cursor=cursor[:-1] + ('A' if cursor[-1] != 'A' else 'B')).status_code, 400)
+        self.assertEqual(self._get(cursor=signing.dumps([5, 1000], salt='other')).status_code, 400)
+
+    def test_expired_cursor(self):
+        with mock.patch('django.core.signing.time.time', return_value=time.time() - NEARBY_CURSOR_MAX_AGE - 1):
+            cursor = signing.dumps([5, 1000], salt=NEARBY_CURSOR_SALT)
+        response = self._get(cursor=cursor)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('застарів', json.loads(response.content)['error'])
+
+    def test_cursor_of_another_shape(self):
+        for value in (5, [5], [5, 'x'], {'pk': 5}):
+            self.assertEqual(self._get(cursor=signing.dumps(value, salt=NEARBY_CURSOR_SALT)).status_code, 400)
+
+
+class TTLCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.now = 0.0
+        patcher = mock.patch('users.availability.time.monotonic', lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_entries_expire_after_ttl(self):
+        cache = TTLCache(maxsize=10, ttl=60)
+        cache.set('a', 1)
+        self.now = 59
+        self.assertEqual(cache.get('a'), 1)
+        self.now = 61
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(cache.get('a', 'missing'), 'missing')
+
+    def test_set_again_restarts_the_ttl(self):
+        cache = TTLCache(maxsize=10, ttl=60)
+        cache.set('a', 1)
+        self.now = 50
+        cache.set('a', 2)
+        self.now = 100
+        self.assertEqual(cache.get('a'), 2)
+
+    def test_least_recently_used_entry_is_evicted(self):
+        cache = TTLCache(maxsize=2, ttl=60)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+        self.assertEqual(cache.get('a'), 1)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('c'), 3)
+
+    def test_delete(self):
+        cache = TTLCache(maxsize=2, ttl=60)
+        cache.set('a', 1)
+        cache.delete('a')
+        cache.delete('missing')
+        self.assertIsNone(cache.get('a'))
+
+
+@override_settings(LOGIN_THROTTLE={'BACKEND': 'memory', 'WINDOW': 900, 'IP_LIMIT': 30, 'EMAIL_LIMIT': 5,
+                                   'EMAIL_CHECK_LIMIT': 2})
+class EmailAvailableTests(SimpleTestCase):
+    def setUp(self):
+        for patcher in (mock.patch('users.throttling._limiter', throttling.MemoryLimiter(900)),
+                        mock.patch('users.views.is_email_available', return_value=True)):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def _get(self, email='olena@dyvo.ua', ip='203.0.113.7'):
+        return self.client.get(reverse('email_available'), {'email': email}, REMOTE_ADDR=ip)
+
+    def test_limited_per_ip(self):
+        for _ in range(2):
+            response = self._get()
+            self.assertEqual(response.status_code, 200)
+            self.assertIs(response.json()['available'], True)
+        response = self._get()
+        self.assertEqual(response.status_code, 429)
+        self.assertGreater(int(response['Retry-After']), 0)
+        self.assertIn('no-store', response['Cache-Control'])
+        self.assertEqual(self._get(ip='203.0.113.8').status_code, 200)
+
+    def test_invalid_email_is_not_counted(self):
+        for _ in range(3):
+            self.assertEqual(self._get('not-an-email').status_code, 400)
+        self.assertEqual(self._get().status_code, 200)
+
+
+class RegionIndexTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.regions = _regions_from_geojson()
+        cls.index = regions.RegionIndex(cls.regions)
+
+    def test_strtree_finds_the_same_boxes_as_a_scan(self):
+        boxes = [((x, y, x + 1.5, y + 1.5), (x, y)) for x in range(20) for y in range(20)]
+        tree = regions.STRtree(boxes, node_capacity=4)
+        for x, y in [(0, 0), (3.2, 7.7), (10.5, 10.5), (21, 21), (-1, 5)]:
+            expected = {
+                payload for (xmin, ymin, xmax, ymax), payload in boxes if xmin <= x <= xmax and ymin <= y <= ymax
+            }
+            self.assertEqual(set(tree.query(x, y)), expected)
+
+    def test_empty_strtree(self):
+        self.assertEqual(list(regions.STRtree([]).query(0, 0)), [])
+
+    def test_find_matches_the_boundaries(self):
+        for lng, lat in [(30.5234, 50.4501), (24.0316, 49.8429), (35.0462, 48.4647), (30.7233, 46.4825)]:
+            point = Point(lng, lat, srid=4326)
+            expected = [region.pk for region in self.regions if region.boundary.covers(point)]
+            self.assertEqual(len(expected), 1)
+            self.assertEqual(self.index.find(point), expected[0])
+
+    def test_find_outside_every_region(self):
+        self.assertIsNone(self.index.find(Point(13.4050, 52.5200, srid=4326)))
+
+
+@override_settings(
+    STORAGES=PLAIN_STORAGES,
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'page-cache-tests'}},
+    SESSION_ENGINE='django.contrib.sessions.backends.signed_cookies',
+)
+class AnonymousPageCacheTests(SimpleTestCase):
+    def setUp(self):
+        caches['default'].clear()
+
+    def _token(self, response):
+        return re.search(r'name="csrfmiddlewaretoken" value="([^"]+)"', response.content.decode()).group(1)
+
+    def test_cached_hits_get_a_fresh_csrf_token_and_cookie(self):
+        first = self.client.get(reverse('login'))
+        with mock.patch('users.views.LoginForm', side_effect=AssertionError('rendered again')):
+            second = self.client_class().get(reverse('login'))
+        self.assertEqual(second.status_code, 200)
+        self.assertNotIn(CSRF_PLACEHOLDER, second.content.decode())
+        self.assertIn(settings.CSRF_COOKIE_NAME, second.cookies)
+        self.assertNotEqual(self._token(second), self._token(first))
+        self.assertIn('private', second['Cache-Control'])
+
+    def test_if_none_match_gets_304(self):
+        response = self.client.get(reverse('login'))
+        again = self.client.get(reverse('login'), HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(again.status_code, 304)
+        self.assertEqual(again.content, b'')
+        # The ETag is tied to the CSRF cookie the page's token was made for
+        other = self.client_class().get(reverse('login'), HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(other.status_code, 200)
+
+    def test_pages_without_a_token_revalidate_publicly(self):
+        response = self.client.get(reverse('terms'))
+        self.assertIn('public', response['Cache-Control'])
+        again = self.client_class().get(reverse('terms'), HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(again.status_code, 304)
+
+    def test_session_cookie_bypasses_the_cache(self):
+        self.client.cookies[settings.SESSION_COOKIE_NAME] = 'signed-in'
+        with mock.patch('users.caching._lookup') as lookup:
+            response = self.client.get(reverse('login'))
+        lookup.assert_not_called()
+        self.assertNotIn('ETag', response)
+        self.assertNotIn(CSRF_PLACEHOLDER, response.content.decode())
+
+
+class MetricsExpositionTests(SimpleTestCase):
+    def test_histogram(self):
+        histogram = metrics.Histogram('test_seconds', 'Test.', 'view', (0.1, 1.0))
+        for value in (0.05, 0.5, 5):
+            histogram.observe('users.views.login_view', value)
+        self.assertEqual(histogram.expose(), [
+            '# HELP test_seconds Test.',
+            '# TYPE test_seconds histogram',
+            'test_seconds_bucket{view="users.views.login_view",le="0.1"} 1',
+            'test_seconds_bucket{view="users.views.login_view",le="1.0"} 2',
+            'test_seconds_bucket{view="users.views.login_view",le="+Inf"} 3',
+            'test_seconds_sum{view="users.views.login_view"} 5.55',
+            'test_seconds_count{view="users.views.login_view"} 3',
+        ])
+
+    def test_counter_escapes_label_values(self):
+        counter = metrics.Counter('test_total', 'Test.', 'kind')
+        counter.inc('b')
+        counter.inc('a"\\\n', 2)
+        self.assertEqual(counter.expose(), [
+            '# HELP test_total Test.',
+            '# TYPE test_total counter',
+            'test_total{kind="a\\"\\\\\\n"} 2',
+            'test_total{kind="b"} 1',
+        ])
+
+    def test_expose_lists_every_metric(self):
+        metrics.reset()
+        self.addCleanup(metrics.reset)
+        metrics.PAGE_CACHE_LOOKUPS.inc('hit')
+        text = metrics.expose()
+        self.assertTrue(text.endswith('\n'))
+        for metric in metrics.HISTOGRAMS + metrics.COUNTERS:
+            self.assertIn(f'# TYPE {metric.name} ', text)
+        self.assertIn('dyvo_page_cache_lookups_total{result="hit"} 1\n', text)
+
+
+@override_settings(METRICS_ALLOWED_NETWORKS=['127.0.0.0/8', '10.1.0.0/16'], METRICS_TOKEN='s3cret')
+class MetricsViewTests(SimpleTestCase):
+    def _get(self, ip, **headers):
+        return self.client.get(reverse('metrics'), REMOTE_ADDR=ip, headers=headers)
+
+    def test_allowed_networks(self):
+        for ip in ('127.0.0.1', '10.1.2.3'):
+            response = self._get(ip)
+            self.assertEqual(response.status_code, 200)
+            self.assertIn('# TYPE ', response.content.decode())
+        self.assertEqual(self._get('10.2.0.1').status_code, 404)
+        self.assertEqual(self._get('2001:db8::1').status_code, 404)
+
+    def test_token(self):
+        self.assertEqual(self._get('203.0.113.7', Authorization='Bearer s3cret').status_code, 200)
+        self.assertEqual(self._get('203.0.113.7', Authorization='Bearer wrong').status_code, 404)
+
+    @override_settings(METRICS_TOKEN='')
+    def test_no_token_configured(self):
+        self.assertEqual(self._get('203.0.113.7', Authorization='Bearer ').status_code, 404)
+
+
+def _settlement(pk, name, name_latin, population):
+    return Settlement(
+        id=pk, name=name, name_latin=name_latin, region_code='UA-32', latitude=50.0, longitude=30.0,
+        population=population,
+    )
+
+
+class SettlementSearchTests(SimpleTestCase):
+    def setUp(self):
+        self.index = SettlementIndex([
+            _settlement(1, 'Покровськ', 'Pokrovsk', 60_000),
+            _settlement(2, 'Нова Покровка', 'Nova Pokrovka', 3_000),
+            _settlement(3, 'Покровка', 'Pokrovka', 500),
+            _settlement(4, "Мар'їнка", 'Marinka', 9_000),
+            _settlement(5, 'Ґалаґани', 'Halahany', 100),
+            _settlement(6, 'Покровка', 'Pokrovka', 1_200),
+        ])
+
+    def test_fold_ignores_case_apostrophes_and_accents(self):
+        self.assertEqual(fold("Мар'їнка"), fold('МАРʼЇНКА'))
+        self.assertEqual(fold("Мар'їнка"), fold('мар’їнка'))
+        self.assertEqual(fold('Ки\u0301їв'), fold('київ'))
+        self.assertEqual(fold('Ґалаґани'), 'галагани')
+
+    def test_fold_turns_hyphens_and_runs_of_spaces_into_one_space(self):
+        self.assertEqual(fold('  Івано-Франківськ '), 'івано франківськ')
+
+    def test_whole_name_ranks_above_later_word_then_population(self):
+        # Whole names by population, then "Нова Покровка" through its second word
+        self.assertEqual([settlement.id for settlement in self.index.search('покр')], [1, 6, 3, 2])
+
+    def test_search_matches_latin_names_and_folded_queries(self):
+        self.assertEqual([settlement.id for settlement in self.index.search('marinka')], [4])
+        self.assertEqual([settlement.id for settlement in self.index.search('МАРʼЇН')], [4])
+        self.assertEqual([settlement.id for settlement in self.index.search('галаг')], [5])
+
+    def test_search_limit_and_empty_query(self):
+        self.assertEqual(len(self.index.search('покр', limit=2)), 2)
+        self.assertEqual(self.index.search('  '), [])
+        self.assertEqual(self.index.search('xyz'), [])
+
+    def test_precomputed_prefixes_rank_like_a_search(self):
+        index = SettlementIndex([_settlement(pk, f'Нове {pk}', f'Nove {pk}', pk) for pk in range(1, 101)])
+        self.assertIn('нове', index._precomputed)
+        self.assertEqual(index.search('нове', limit=5), index._rank('нове', 5))
+        self.assertEqual([settlement.id for settlement in index.search('нове', limit=3)], [100, 99, 98])
+
+    def test_find_by_name_prefers_the_largest_exact_match(self):
+        self.assertEqual(self.index.find_by_name('покровка').id, 6)
+        self.assertIsNone(self.index.find_by_name('Покр'))
+
+
+@override_settings(USER_CACHE_ALIAS='sessions')
+class CachedUserTests(SimpleTestCase):
+    # No database here: a query would fail the test, so answers come from the cache
+    def setUp(self):
+        caches['sessions'].clear()
+        self.backend = CachedModelBackend()
+
+    def _cache(self, **fields):
+        user = CustomUser(pk=7, email='olena@dyvo.ua', **fields)
+        caches['sessions'].set(USER_CACHE_KEY.format(7), user)
+        return user
+
+    def test_cache_hit(self):
+        self._cache()
+        self.assertEqual(self.backend.get_user(7).email, 'olena@dyvo.ua')
+
+    def test_inactive_user_on_a_cache_hit(self):
+        self._cache(is_active=False)
+        self.assertIsNone(self.backend.get_user(7))
+
+    async def test_inactive_user_on_an_async_cache_hit(self):
+        self._cache(is_active=False)
+        self.assertIsNone(await self.backend.aget_user(7))
+        self._cache()
+        self.assertEqual((await self.backend.aget_user(7)).pk, 7)
+
+
+class MemoryLimiterTests(SimpleTestCase):
+    def setUp(self):
+        self.now = 1000.0
+        patcher = mock.patch('users.throttling.time.monotonic', lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.limiter = throttling.MemoryLimiter(window=60)
+
+    def test_limit_is_reached_within_the_window(self):
+        for _ in range(3):
+            self.assertEqual(self.limiter.acquire('key', 3), 0)
+            self.now += 10
+        # The first hit, at 1000, leaves the window at 1060
+        self.assertEqual(self.limiter.acquire('key', 3), 30)
+        self.assertEqual(self.limiter.retry_after('key', 3), 30)
+
+    def test_hits_slide_out_of_the_window(self):
+        for _ in range(3):
+            self.limiter.acquire('key', 3)
+        self.now += 60
+        self.assertEqual(self.limiter.retry_after('key', 3), 0)
+        self.assertEqual(self.limiter.acquire('key', 3), 0)
+
+    def test_refused_attempts_are_not_counted(self):
+        for _ in range(2):
+            self.limiter.acquire('key', 2)
+        for _ in range(5):
+            self.assertGreater(self.limiter.acquire('key', 2), 0)
+        self.now += 60
+        self.assertEqual(self.limiter.acquire('key', 2), 0)
+        self.assertEqual(self.limiter.acquire('key', 2), 0)
+
+    def test_release_and_reset(self):
+        self.limiter.acquire('key', 2)
+        self.limiter.acquire('key', 2)
+        self.limiter.release('key')
+        self.assertEqual(self.limiter.acquire('key', 2), 0)
+        self.limiter.reset('key')
+        self.assertEqual(self.limiter.retry_after('key', 2), 0)
+
+    def test_keys_are_independent(self):
+        self.limiter.acquire('a', 1)
+        self.assertGreater(self.limiter.acquire('a', 1), 0)
+        self.assertEqual(self.limiter.acquire('b', 1), 0)
+
+
+@override_settings(CACHES={
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'limiter-tests'},
+})
+class CacheLimiterTests(SimpleTestCase):
+    def setUp(self):
+        caches['default'].clear()
+        # At the start of a window
+        self.now = 6000.0
+        patcher = mock.patch('users.throttling.time.time', lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.limiter = throttling.CacheLimiter(window=60)
+
+    def test_limit_within_one_window(self):
+        for _ in range(3):
+            self.assertEqual(self.limiter.acquire('key', 3), 0)
+        self.now += 15
+        self.assertEqual(self.limiter.acquire('key', 3), 45)
+        self.assertEqual(self.limiter.retry_after('key', 3), 45)
+
+    def test_previous_window_counts_by_its_overlap(self):
+        for _ in range(4):
+            self.limiter.acquire('key', 4)
+        # Halfway through the next window the 4 earlier hits weigh 2
+        self.now += 90
+        self.assertEqual(self.limiter.acquire('key', 4), 0)
+        self.assertEqual(self.limiter.acquire('key', 4), 0)
+        self.assertEqual(self.limiter.acquire('key', 4), 30)
+        # Two windows later they are gone
+        self.now += 60
+        self.assertEqual(self.limiter.retry_after('key', 4), 0)
+
+    def test_refused_attempts_are_taken_back(self):
+        for _ in range(2):
+            self.limiter.acquire('key', 2)
+        for _ in range(5):
+            self.assertGreater(self.limiter.acquire('key', 2), 0)
+        self.assertEqual(caches['default'].get('throttle:key:100'), 2)
+
+    def test_release_and_reset(self):
+        self.limiter.acquire('key', 1)
+        self.limiter.release('key')
+        self.assertEqual(self.limiter.acquire('key', 1), 0)
+        self.limiter.reset('key')
+        self.assertEqual(self.limiter.retry_after('key', 1), 0)
+        # Never below zero
+        self.limiter.release('key')
+        self.limiter.release('key')
+        self.assertEqual(self.limiter.acquire('key', 1), 0)
+        self.assertGreater(self.limiter.acquire('key', 1), 0)
+
+
+class CalibrateHashersTests(SimpleTestCase):
+    def setUp(self):
+        # A slow host: every measured hash takes a second, PBKDF2 only
+        for patcher in (
+            mock.patch.object(calibrate_hashers.Command, '_measure', return_value=1000.0),
+            mock.patch.object(calibrate_hashers.Command, '_available', lambda self, algorithm: algorithm == 'pbkdf2_sha256'),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'password_hashers.json')
+
+    def _calibrate(self, **options):
+        stdout, stderr = io.StringIO(), io.StringIO()
+        call_command('calibrate_hashers', target_ms=250, rounds=1, write=self.path, stdout=stdout, stderr=stderr,
+                     **options)
+        with open(self.path, encoding='utf-8') as f:
+            return json.load(f), stdout.getvalue(), stderr.getvalue()
+
+    def test_costs_never_go_below_the_defaults(self):
+        result, stdout, _ = self._calibrate()
+        self.assertEqual(result['preferred'], 'pbkdf2_sha256')
+        self.assertEqual(result['params'], {'pbkdf2_sha256': {'iterations': PBKDF2PasswordHasher.iterations}})
+        self.assertIn('--allow-weaker', stdout)
+
+    def test_allow_weaker(self):
+        result, _, stderr = self._calibrate(allow_weaker=True)
+        self.assertEqual(result['params']['pbkdf2_sha256']['iterations'], 100_000)
+        self.assertIn('weaker', stderr)
+
+    def test_settings_read_the_calibration(self):
+        with open(self.path, 'w', encoding='utf-8') as f:
+            json.dump({'preferred': 'scrypt', 'params': {'scrypt': {'work_factor': 2**15}}}, f)
+        with mock.patch.dict(os.environ, {'DJANGO_PASSWORD_HASHERS_FILE': self.path}):
+            namespace = runpy.run_path(str(settings.BASE_DIR / 'project_core' / 'settings.py'))
+        self.assertEqual(namespace['PASSWORD_HASHER_PARAMS'], {'scrypt': {'work_factor': 2**15}})
+        self.assertEqual(namespace['PASSWORD_HASHERS'][0], 'users.hashers.TunedScryptPasswordHasher')
+        self.assertIn('users.hashers.TunedPBKDF2PasswordHasher', namespace['PASSWORD_HASHERS'])
+
+    def test_settings_without_a_calibration(self):
+        with mock.patch.dict(os.environ, {'DJANGO_PASSWORD_HASHERS_FILE': self.path}):
+            namespace = runpy.run_path(str(settings.BASE_DIR / 'project_core' / 'settings.py'))
+        self.assertEqual(namespace['PASSWORD_HASHER_PARAMS'], {})
+        self.assertEqual(namespace['PASSWORD_HASHERS'][0], 'users.hashers.TunedPBKDF2PasswordHasher')
+
+    @override_settings(PASSWORD_HASHER_PARAMS={'pbkdf2_sha256': {'iterations': 1_234}})
+    def test_tuned_hasher_uses_the_params(self):
+        self.assertTrue(TunedPBKDF2PasswordHasher().encode('password', 'salt').startswith('pbkdf2_sha256$1234$'))
+
+
+class BackoffTests(SimpleTestCase):
+    def test_doubles_up_to_the_cap(self):
+        with mock.patch('users.mail.random.uniform', return_value=1.0):
+            self.assertEqual([mail.backoff(attempts).total_seconds() for attempts in (1, 2, 3, 8, 20)],
+                             [30, 60, 120, 3600, 3600])
+
+    def test_jitter(self):
+        for _ in range(20):
+            self.assertTrue(24 <= mail.backoff(1).total_seconds() <= 36)
+
+
+@override_settings(TILES={'MAX_ZOOM': 14, 'CLUSTER_CELLS': 32})
+class TileTests(SimpleTestCase):
+    def test_tile_for_point(self):
+        self.assertEqual(tile_for_point(Point(0, 0, srid=4326), 0), (0, 0))
+        self.assertEqual(tile_for_point(Point(0.1, 0.1, srid=4326), 1), (1, 0))
+        self.assertEqual(tile_for_point(Point(-0.1, -0.1, srid=4326), 1), (0, 1))
+        # Kyiv, as in any slippy map
+        self.assertEqual(tile_for_point(Point(30.5234, 50.4501, srid=4326), 10), (598, 345))
+
+    def test_tile_for_point_clamps_to_the_map(self):
+        self.assertEqual(tile_for_point(Point(180, 89.9, srid=4326), 3), (7, 0))
+        self.assertEqual(tile_for_point(Point(-180, -89.9, srid=4326), 3), (0, 7))
+
+    def test_is_valid_tile(self):
+        self.assertTrue(is_valid_tile(0, 0, 0))
+        self.assertTrue(is_valid_tile(14, 2**14 - 1, 0))
+        self.assertFalse(is_valid_tile(15, 0, 0))
+        self.assertFalse(is_valid_tile(-1, 0, 0))
+        self.assertFalse(is_valid_tile(3, 8, 0))
+        self.assertFalse(is_valid_tile(3, 0, 8))
+
+
+class TileCacheTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.cache = TileCache(directory.name, max_bytes=1000)
+
+    def test_set_get_delete(self):
+        self.assertIsNone(self.cache.get(1, 0, 0))
+        self.assertTrue(self.cache.set(1, 0, 0, b'tile'))
+        self.assertEqual(self.cache.get(1, 0, 0), b'tile')
+        self.cache.delete(1, 0, 0)
+        self.assertIsNone(self.cache.get(1, 0, 0))
+
+    def test_render_started_before_an_invalidation_is_refused(self):
+        started = self.cache.now()
+        self.cache.delete(1, 0, 0)
+        self.assertFalse(self.cache.set(1, 0, 0, b'old rows', started))
+        self.assertIsNone(self.cache.get(1, 0, 0))
+        self.assertTrue(self.cache.set(1, 0, 0, b'new rows', self.cache.now()))
+        self.assertEqual(self.cache.get(1, 0, 0), b'new rows')
+
+    def test_clear_refuses_renders_of_any_tile(self):
+        self.cache.set(2, 1, 1, b'tile')
+        started = self.cache.now()
+        self.cache.clear()
+        self.assertIsNone(self.cache.get(2, 1, 1))
+        self.assertFalse(self.cache.set(3, 0, 0, b'tile', started))
+
+    def test_prune_deletes_least_recently_used_down_to_90_percent(self):
+        for y in range(5):
+            self.cache.set(5, 0, y, b'x' * 300)
+            path = self.cache._path(5, 0, y)
+            os.utime(path, (time.time() - 100 + y, time.time() - 100 + y))
+        # A hit makes the oldest tile the newest
+        self.cache.get(5, 0, 0)
+        self.assertEqual(self.cache.prune(), (2, 900))
+        self.assertIsNotNone(self.cache.get(5, 0, 0))
+        self.assertIsNone(self.cache.get(5, 0, 1))
+        self.assertIsNone(self.cache.get(5, 0, 2))
+        self.assertIsNotNone(self.cache.get(5, 0, 4))
+
+    def test_prune_removes_expired_markers(self):
+        self.cache.delete(1, 0, 0)
+        marker = self.cache._path(1, 0, 0).with_suffix('.stale')
+        self.cache.prune()
+        self.assertTrue(marker.exists())
+        expired = time.time() - self.cache.marker_max_age - 1
+        os.utime(marker, (expired, expired))
+        self.cache.prune()
+        self.assertFalse(marker.exists())
+
+
+class WriteBehindBufferTests(SimpleTestCase):
+    def setUp(self):
+        metrics.reset()
+        self.addCleanup(metrics.reset)
+        self.buffer = WriteBehindBuffer(batch_size=10, flush_interval=3600, max_pending=2)
+        # No background thread, flushes are called by the tests
+        self.buffer._started = lambda: None
+
+    def _user(self, pk, minute):
+        last_login = datetime(2026, 1, 1, 12, minute, tzinfo=dt_timezone.utc)
+        return CustomUser(pk=pk, email=f'user{pk}@dyvo.ua', last_login=last_login)
+
+    def test_events_past_max_pending_are_dropped_and_counted(self):
+        for _ in range(3):
+            self.buffer.record_event(AuthEvent.LOGIN_FAILED, None, 'a@dyvo.ua', None, '')
+        self.buffer.record_event(AuthEvent.REGISTER, 1, 'b@dyvo.ua', None, '')
+        self.assertEqual(len(self.buffer._events), 2)
+        self.assertEqual(metrics.WRITE_BEHIND_DROPPED.series, {AuthEvent.LOGIN_FAILED: 1, AuthEvent.REGISTER: 1})
+
+    def test_last_logins_coalesce_per_user(self):
+        self.buffer.record_login(self._user(1, 5))
+        self.buffer.record_login(self._user(1, 1))
+        self.buffer.record_login(self._user(2, 1))
+        # A third user does not fit, more logins of known users still do
+        self.buffer.record_login(self._user(3, 1))
+        self.buffer.record_login(self._user(2, 9))
+        self.assertEqual(
+            {pk: last_login.minute for pk, last_login in self.buffer._last_logins.items()}, {1: 5, 2: 9},
+        )
+        self.assertEqual(metrics.WRITE_BEHIND_DROPPED.series, {LAST_LOGIN: 1})
+
+    def test_flush_counts_what_was_written(self):
+        self.buffer.record_login(self._user(1, 0))
+        self.buffer.record_event(AuthEvent.LOGIN, 1, 'a@dyvo.ua', None, '')
+        with mock.patch.object(self.buffer, '_write') as write:
+            self.assertEqual(self.buffer.flush(), 2)
+            self.assertEqual(self.buffer.flush(), 0)
+        write.assert_called_once()
+        self.assertEqual(metrics.WRITE_BEHIND_WRITTEN.series, {AuthEvent.LOGIN: 1, LAST_LOGIN: 1})
+        self.assertEqual(self.buffer._events, [])
+
+    def test_unreachable_database_requeues_within_the_bound(self):
+        self.buffer.record_event(AuthEvent.LOGIN, 1, 'a@dyvo.ua', None, '')
+        self.buffer.record_login(self._user(1, 0))
+
+        def write(events, last_logins):
+            # Recorded while the flush was failing
+            self.buffer.record_event(AuthEvent.REGISTER, 2, 'b@dyvo.ua', None, '')
+            self.buffer.record_event(AuthEvent.REGISTER, 3, 'c@dyvo.ua', None, '')
+            self.buffer.record_login(self._user(1, 7))
+            raise OperationalError
+
+        with mock.patch.object(self.buffer, '_write', side_effect=write), self.assertLogs('users.writebehind'):
+            self.assertEqual(self.buffer.flush(), 0)
+        self.assertEqual(len(self.buffer._events), 2)
+        self.assertEqual(metrics.WRITE_BEHIND_DROPPED.series, {AuthEvent.LOGIN: 1})
+        self.assertEqual(self.buffer._last_logins[1].minute, 7)
+
+    def test_other_errors_drop_the_batch(self):
+        self.buffer.record_event(AuthEvent.LOGIN, 1, 'a@dyvo.ua', None, '')
+        with mock.patch.object(self.buffer, '_write', side_effect=ValueError), self.assertRaises(ValueError):
+            self.buffer.flush()
+        self.assertEqual(self.buffer._events, [])
+        self.assertEqual(metrics.WRITE_BEHIND_DROPPED.series, {AuthEvent.LOGIN: 1})
+
+
+# Database tests from here on: PostgreSQL with PostGIS, like the app itself
+
+class NearbyUsersTests(TestCase):
+    origin = (30.52, 50.45)
+
+    @classmethod
+    def setUpTestData(cls):
+        lng, lat = cls.origin
+        cls.viewer = CustomUser.objects.create_user(
+            email='viewer@dyvo.ua', first_name='Viewer', location=Point(lng, lat, srid=4326),
+        )
+        # About 1.1 km apart, northwards, inserted out of order
+        cls.neighbours = {
+            step: CustomUser.objects.create_user(
+                email=f'n{step}@dyvo.ua', first_name=f'N{step}', location=Point(lng, lat + step * 0.01, srid=4326),
+            )
+            for step in (3, 1, 5, 2, 4)
+        }
+        CustomUser.objects.create_user(
+            email='inactive@dyvo.ua', first_name='Inactive', location=Point(lng, lat + 0.005, srid=4326),
+            is_active=False,
+        )
+        CustomUser.objects.create_user(email='nowhere@dyvo.ua', first_name='Nowhere')
+
+    def setUp(self):
+        _skip_write_behind(self)
+        self.client.force_login(self.viewer)
+
+    def _pages(self, limit, **params):
+        pages, cursor = [], None
+        while True:
+            query = {'limit': limit, **params}
+            if cursor:
+                query['cursor'] = cursor
+            response = self.client.get(reverse('nearby'), query)
+            self.assertEqual(response.status_code, 200)
+            pages.append(response.json()['results'])
+            cursor = response.json()['next_cursor']
+            if cursor is None:
+                return pages
+
+    def test_manager_orders_by_distance(self):
+        rows = CustomUser.objects.nearby(*self.origin, limit=10, exclude_pk=self.viewer.pk)
+        self.assertEqual([row['pk'] for row in rows], [self.neighbours[step].pk for step in range(1, 6)])
+        self.assertEqual([row['distance'] for row in rows], sorted(row['distance'] for row in rows))
+
+    def test_pages_follow_the_distance_order(self):
+        pages = self._pages(2)
+        self.assertEqual([len(page) for page in pages], [2, 2, 1])
+        results = [result for page in pages for result in page]
+        self.assertEqual([result['id'] for result in results], [self.neighbours[step].pk for step in range(1, 6)])
+        # Whole kilometers only, rounded up
+        self.assertEqual([result['distance_m'] for result in results], [2000, 3000, 4000, 5000, 6000])
+
+    def test_explicit_point_includes_the_caller(self):
+        results = self._pages(10, lng=self.origin[0], lat=self.origin[1])[0]
+        self.assertEqual(results[0]['id'], self.viewer.pk)
+        self.assertEqual(results[0]['distance_m'], 1000)
+
+    def test_next_page_survives_the_last_user_being_deleted(self):
+        response = self.client.get(reverse('nearby'), {'limit': 2})
+        first_page = response.json()['results']
+        CustomUser.objects.filter(pk=first_page[-1]['id']).delete()
+
+        response = self.client.get(reverse('nearby'), {'limit': 10, 'cursor': response.json()['next_cursor']})
+        ids = [result['id'] for result in response.json()['results']]
+        # Continues from the deleted user's distance bucket instead of coming back empty
+        self.assertEqual(ids[-3:], [self.neighbours[step].pk for step in (3, 4, 5)])
+        self.assertNotIn(first_page[-1]['id'], ids)
+
+
+class ImportUsersTests(TestCase):
+    def _import(self, content, suffix='.csv'):
+        with tempfile.NamedTemporaryFile('w', suffix=suffix, encoding='utf-8', delete=False) as f:
+            f.write(content)
+        self.addCleanup(os.unlink, f.name)
+        stdout, stderr = io.StringIO(), io.StringIO()
+        # COPY bypasses the signals, the command clears the tile cache instead
+        with mock.patch('users.management.commands.import_users.get_tile_cache') as tile_cache:
+            call_command('import_users', f.name, workers=1, stdout=stdout, stderr=stderr)
+        return stdout.getvalue(), stderr.getvalue(), tile_cache
+
+    def test_csv(self):
+        existing = CustomUser.objects.create_user(email='Taras@dyvo.ua', first_name='Taras', password='Existing123')
+        stdout, stderr, tile_cache = self._import(
+            'email,first_name,password,region\n'
+            'olena@DYVO.UA,Olena,Secret123,UA-05\n'
+            'Olena@dyvo.ua,Olena again,Other123,\n'
+            'taras@dyvo.ua,Taras,Other123,\n'
+            ',No email,Secret123,\n'
+            'petro@dyvo.ua,,Secret123,\n'
+            'ivan@dyvo.ua,Ivan,,Atlantis\n'
+        )
+        self.assertIn('Imported 2 of 6 rows', stdout)
+        self.assertIn('2 duplicate(s), 2 skipped', stdout)
+        self.assertIn('Line 3: duplicate email Olena@dyvo.ua', stderr)
+        self.assertIn('Line 4: duplicate email taras@dyvo.ua', stderr)
+        self.assertIn("Line 7: unknown region 'Atlantis'", stderr)
+        tile_cache.return_value.clear.assert_called_once()
+
+        # The first of the case variants wins, its domain normalized
+        olena = CustomUser.objects.get(email__lower='olena@dyvo.ua')
+        self.assertEqual((olena.email, olena.first_name), ('olena@dyvo.ua', 'Olena'))
+        self.assertTrue(olena.check_password('Secret123'))
+        region = Region.objects.get(code='UA-05')
+        self.assertEqual(olena.region, region)
+        self.assertEqual(olena.location, region.label_point)
+
+        ivan = CustomUser.objects.get(email='ivan@dyvo.ua')
+        self.assertFalse(ivan.has_usable_password())
+        self.assertIsNone(ivan.region)
+
+        existing.refresh_from_db()
+        self.assertTrue(existing.check_password('Existing123'))
+        self.assertEqual(CustomUser.objects.count(), 3)
+
+    def test_jsonl(self):
+        self._import(
+            '{"email": "olena@dyvo.ua", "first_name": "Olena", "password": "Secret123"}\n'
+            '\n'
+            '{"email": "ivan@dyvo.ua", "first_name": "Ivan", "password": "Secret456"}\n',
+            suffix='.jsonl',
+        )
+        self.assertTrue(CustomUser.objects.get(email='olena@dyvo.ua').check_password('Secret123'))
+        self.assertTrue(CustomUser.objects.get(email='ivan@dyvo.ua').check_password('Secret456'))
+
+    def test_invalid_json(self):
+        with self.assertRaisesMessage(CommandError, 'Line 2: invalid JSON'):
+            self._import('{"email": "olena@dyvo.ua", "first_name": "Olena"}\n{"email": \n', suffix='.jsonl')
+        self.assertFalse(CustomUser.objects.exists())
+
+
+@override_settings(STORAGES=PLAIN_STORAGES, **FAST_HASHING)
+class RegistrationHashingTests(TestCase):
+    def setUp(self):
+        _skip_write_behind(self)
+        self.hashed_on_loop = []
+        encode = TunedPBKDF2PasswordHasher.encode
+
+        def spy(hasher, password, salt, *args, **kwargs):
+            try:
+                asyncio.get_running_loop()
+                self.hashed_on_loop.append(True)
+            except RuntimeError:
+                self.hashed_on_loop.append(False)
+            return encode(hasher, password, salt, *args, **kwargs)
+
+        patcher = mock.patch.object(TunedPBKDF2PasswordHasher, 'encode', autospec=True, side_effect=spy)
+        self.encode = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_registration_hashes_once_off_the_event_loop(self):
+        response = self.client.post(reverse('register'), REGISTRATION_DATA)
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.encode.call_count, 1)
+        self.assertEqual(self.hashed_on_loop, [False])
+        user = CustomUser.objects.get(email='olena@dyvo.ua')
+        self.assertTrue(user.password.startswith('pbkdf2_sha256$1000$'))
+
+    def test_taken_email_is_not_hashed(self):
+        CustomUser.objects.create_user(email='Olena@dyvo.ua', first_name='Olena')
+        self.encode.reset_mock()
+        response = self.client.post(reverse('register'), REGISTRATION_DATA)
+        self.assertContains(response, RegistrationForm.EMAIL_TAKEN_ERROR)
+        self.encode.assert_not_called()
+
+
+@override_settings(USER_CACHE_ALIAS='sessions')
+class CachedUserInvalidationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user(email='olena@dyvo.ua', first_name='Olena')
+
+    def setUp(self):
+        caches['sessions'].clear()
+        self.backend = CachedModelBackend()
+        self.key = USER_CACHE_KEY.format(self.user.pk)
+
+    def test_cached_after_the_first_lookup(self):
+        self.backend.get_user(self.user.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.backend.get_user(self.user.pk), self.user)
+
+    def test_save_forgets_the_cached_user(self):
+        self.backend.get_user(self.user.pk)
+        self.user.first_name = 'Олена'
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            self.user.save(update_fields=['first_name'])
+            self.assertIsNone(caches['sessions'].get(self.key))
+            # Another worker may cache the old row again before the commit
+            caches['sessions'].set(self.key, CustomUser.objects.get(pk=self.user.pk))
+        self.assertTrue(callbacks)
+        self.assertIsNone(caches['sessions'].get(self.key))
+        self.assertEqual(self.backend.get_user(self.user.pk).first_name, 'Олена')
+
+    def test_deactivated_user_is_signed_out(self):
+        self.backend.get_user(self.user.pk)
+        self.user.is_active = False
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.save(update_fields=['is_active'])
+        self.assertIsNone(self.backend.get_user(self.user.pk))
+
+    def test_deleted_user_is_forgotten(self):
+        self.backend.get_user(self.user.pk)
+        pk = self.user.pk
+        with self.captureOnCommitCallbacks(execute=True):
+            CustomUser.objects.get(pk=pk).delete()
+        self.assertIsNone(self.backend.get_user(pk))
+
+
+@override_settings(
+    STORAGES=PLAIN_STORAGES,
+    LOGIN_THROTTLE={'BACKEND': 'memory', 'WINDOW': 900, 'IP_LIMIT': 30, 'EMAIL_LIMIT': 5, 'EMAIL_CHECK_LIMIT': 20},
+    **FAST_HASHING,
+)
+class LoginThrottleTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user(email='olena@dyvo.ua', password='Benchmark123', first_name='Olena')
+
+    def setUp(self):
+        _skip_write_behind(self)
+        # A limiter of its own
+        patcher = mock.patch('users.throttling._limiter', throttling.MemoryLimiter(900))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _login(self, password, email='olena@dyvo.ua'):
+        return self.client.post(reverse('login'), {'username': email, 'password': password})
+
+    def test_email_is_limited_after_failures(self):
+        for _ in range(5):
+            self.assertEqual(self._login('wrong').status_code, 200)
+        with mock.patch('users.backends.acheck_password') as check:
+            response = self._login('Benchmark123')
+        self.assertEqual(response.status_code, 429)
+        self.assertGreater(int(response['Retry-After']), 0)
+        self.assertContains(response, LoginForm.THROTTLED_ERROR.format(minutes=15), status_code=429)
+        # Refused before any password was hashed
+        check.assert_not_called()
+
+    def test_success_clears_the_email_failures(self):
+        for _ in range(4):
+            self._login('wrong')
+        self.assertEqual(self._login('Benchmark123').status_code, 302)
+        self.client.logout()
+        for _ in range(5):
+            self.assertEqual(self._login('wrong').status_code, 200)
+        self.assertEqual(self._login('wrong').status_code, 429)
+
+    @override_settings(
+        LOGIN_THROTTLE={'BACKEND': 'memory', 'WINDOW': 900, 'IP_LIMIT': 3, 'EMAIL_LIMIT': 5, 'EMAIL_CHECK_LIMIT': 20},
+    )
+    def test_ip_is_limited_across_emails(self):
+        for i in range(3):
+            self._login('wrong', email=f'user{i}@dyvo.ua')
+        self.assertEqual(self._login('Benchmark123').status_code, 429)
+
+
+@override_settings(STORAGES=PLAIN_STORAGES, **FAST_HASHING)
+class RehashOnLoginTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user(email='olena@dyvo.ua', password='Benchmark123', first_name='Olena')
+
+    def setUp(self):
+        _skip_write_behind(self)
+
+    def _stored_hash(self):
+        return CustomUser.objects.values_list('password', flat=True).get(pk=self.user.pk)
+
+    @override_settings(PASSWORD_HASHER_PARAMS={'pbkdf2_sha256': {'iterations': 2_000}})
+    def test_login_rehashes_with_new_params(self):
+        response = self.client.post(reverse('login'), {'username': 'olena@dyvo.ua', 'password': 'Benchmark123'})
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(self._stored_hash().startswith('pbkdf2_sha256$2000$'))
+
+    @override_settings(PASSWORD_HASHER_PARAMS={'pbkdf2_sha256': {'iterations': 2_000}})
+    def test_sync_check_rehashes_with_new_params(self):
+        self.assertEqual(authenticate(username='olena@dyvo.ua', password='Benchmark123'), self.user)
+        self.assertTrue(self._stored_hash().startswith('pbkdf2_sha256$2000$'))
+
+    @override_settings(PASSWORD_HASHER_PARAMS={'pbkdf2_sha256': {'iterations': 2_000}})
+    def test_wrong_password_keeps_the_hash(self):
+        old = self._stored_hash()
+        self.assertIsNone(authenticate(username='olena@dyvo.ua', password='wrong'))
+        self.assertEqual(self._stored_hash(), old)
+
+    def test_current_hash_is_not_saved_again(self):
+        with mock.patch.object(CustomUser, 'save') as save:
+            self.assertIsNotNone(authenticate(username='olena@dyvo.ua', password='Benchmark123'))
+        save.assert_not_called()
+
+
+class FakeSMTPConnection:
+    """Stands in for the SMTP backend; ``errors`` maps recipients to what sending to them raises."""
+
+    def __init__(self, errors=None):
+        self.errors = errors or {}
+        self.sent = []
+        self.closed = 0
+
+    def open(self):
+        pass
+
+    def close(self):
+        self.closed += 1
+
+    def send_messages(self, messages):
+        for message in messages:
+            if message.to[0] in self.errors:
+                raise self.errors[message.to[0]]
+            self.sent.append(message.to[0])
+        return len(messages)
+
+
+class MailWorkerTests(TestCase):
+    def _queue(self, *recipients, **fields):
+        now = timezone.now()
+        return [
+            EmailJob.objects.create(recipient=recipient, subject='Вітаємо', body='...',
+                                    run_after=now - timedelta(minutes=len(recipients) - i), **fields)
+            for i, recipient in enumerate(recipients)
+        ]
+
+    def _run(self, errors=None):
+        connection = FakeSMTPConnection(errors)
+        sent = mail.Worker(connection=connection).run_batch()
+        return sent, connection
+
+    def test_sent_jobs_are_deleted(self):
+        self._queue('a@dyvo.ua', 'b@dyvo.ua')
+        sent, connection = self._run()
+        self.assertEqual(sent, 2)
+        self.assertEqual(connection.sent, ['a@dyvo.ua', 'b@dyvo.ua'])
+        self.assertFalse(EmailJob.objects.exists())
+
+    def test_refused_message_is_retried_later(self):
+        _, refused, _ = self._queue('a@dyvo.ua', 'b@dyvo.ua', 'c@dyvo.ua')
+        error = smtplib.SMTPRecipientsRefused({'b@dyvo.ua': (550, b'No such user')})
+        sent, connection = self._run({'b@dyvo.ua': error})
+        # Only that message failed; the connection was kept for the rest
+        self.assertEqual(sent, 2)
+        self.assertEqual(connection.sent, ['a@dyvo.ua', 'c@dyvo.ua'])
+        self.assertEqual(connection.closed, 0)
+        refused.refresh_from_db()
+        self.assertEqual((refused.status, refused.attempts), (EmailJob.PENDING, 1))
+        self.assertIn('SMTPRecipientsRefused', refused.last_error)
+        self.assertGreater(refused.run_after, timezone.now() + timedelta(seconds=20))
+
+    def test_connection_errors_end_the_batch(self):
+        for error in (
+            smtplib.SMTPServerDisconnected('gone'),
+            smtplib.SMTPAuthenticationError(535, b'Bad credentials'),
+            ConnectionResetError(),
+            OSError(101, 'Network is unreachable'),
+        ):
+            with self.subTest(error=error):
+                EmailJob.objects.all().delete()
+                first, failed, untouched = self._queue('a@dyvo.ua', 'b@dyvo.ua', 'c@dyvo.ua')
+                sent, connection = self._run({'b@dyvo.ua': error})
+                self.assertEqual(sent, 1)
+                self.assertEqual(connection.closed, 1)
+                self.assertFalse(EmailJob.objects.filter(pk=first.pk).exists())
+                failed.refresh_from_db()
+                self.assertEqual(failed.attempts, 1)
+                untouched.refresh_from_db()
+                self.assertEqual((untouched.attempts, untouched.last_error), (0, ''))
+
+    def test_backoff_grows_with_the_attempts(self):
+        job, = self._queue('a@dyvo.ua', attempts=3)
+        with mock.patch('users.mail.random.uniform', return_value=1.0):
+            before = timezone.now()
+            self._run({'a@dyvo.ua': smtplib.SMTPDataError(451, b'Try again later')})
+        job.refresh_from_db()
+        self.assertEqual(job.attempts, 4)
+        self.assertAlmostEqual((job.run_after - before).total_seconds(), 240, delta=5)
+
+    def test_gives_up_after_max_attempts(self):
+        job, = self._queue('a@dyvo.ua', attempts=settings.EMAIL_QUEUE['MAX_ATTEMPTS'] - 1)
+        with self.assertLogs('users.mail', 'ERROR'):
+            self._run({'a@dyvo.ua': smtplib.SMTPDataError(554, b'Rejected')})
+        job.refresh_from_db()
+        self.assertEqual(job.status, EmailJob.FAILED)
+        # Not picked up again
+        self.assertEqual(self._run(), (0, mock.ANY))
+
+    def test_not_before_run_after(self):
+        EmailJob.objects.create(recipient='a@dyvo.ua', subject='Вітаємо', body='...',
+                                run_after=timezone.now() + timedelta(minutes=1))
+        self.assertEqual(self._run()[0], 0)
+
+
+@override_settings(**FAST_HASHING)
+class WelcomeEmailTests(TestCase):
+    def _user(self, email='olena@dyvo.ua'):
+        user = CustomUser(email=email, first_name='Olena')
+        user.set_password('Benchmark123')
+        return user
+
+    def test_user_and_mail_are_saved_together(self):
+        user = self._user()
+        mail.save_with_welcome_email(user)
+        self.assertIsNotNone(user.pk)
+        self.assertEqual(EmailJob.objects.get().recipient, 'olena@dyvo.ua')
+
+    def test_failed_user_insert_queues_no_mail(self):
+        CustomUser.objects.create_user(email='olena@dyvo.ua', first_name='Olena')
+        with self.assertRaises(IntegrityError):
+            mail.save_with_welcome_email(self._user())
+        self.assertFalse(EmailJob.objects.exists())
+
+    def test_failed_mail_insert_keeps_no_user(self):
+        with mock.patch.object(EmailJob, 'save', side_effect=DatabaseError('full')):
+            with self.assertRaises(DatabaseError):
+                mail.save_with_welcome_email(self._user())
+        self.assertFalse(CustomUser.objects.filter(email='olena@dyvo.ua').exists())
+
+
+class EstimatedCountPaginatorTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        EmailJob.objects.bulk_create(
+            EmailJob(recipient=f'user{i}@dyvo.ua', subject='Вітаємо', body='...', attempts=i % 2) for i in range(5)
+        )
+
+    def setUp(self):
+        patcher = mock.patch.object(EstimatedCountPaginator, 'exact_limit', 3)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _count(self, queryset):
+        return EstimatedCountPaginator(queryset.order_by('pk'), 2).count
+
+    def test_exact_below_the_limit(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(self._count(EmailJob.objects.filter(attempts=1)), 2)
+
+    def test_whole_table_uses_reltuples(self):
+        with mock.patch.object(EstimatedCountPaginator, '_table_estimate', return_value=1_000_000) as estimate:
+            paginator = EstimatedCountPaginator(EmailJob.objects.order_by('pk'), 2)
+            self.assertEqual(paginator.count, 1_000_000)
+            self.assertEqual(paginator.num_pages, 500_000)
+        estimate.assert_called_once()
+
+    def test_reltuples_before_analyze(self):
+        # -1 until the table is analyzed: never below what was counted
+        with mock.patch.object(EstimatedCountPaginator, '_table_estimate', return_value=-1):
+            self.assertEqual(self._count(EmailJob.objects.all()), 4)
+        queryset = EmailJob.objects.all()
+        self.assertIsInstance(EstimatedCountPaginator(queryset, 2)._table_estimate(queryset), int)
+
+    def test_filtered_queryset_uses_the_plan(self):
+        plan = json.dumps([{'Plan': {'Node Type': 'Seq Scan', 'Plan Rows': 50_000}}])
+        queryset = EmailJob.objects.filter(status=EmailJob.PENDING)
+        with mock.patch.object(type(queryset), 'explain', return_value=plan) as explain:
+            self.assertEqual(self._count(queryset), 50_000)
+        explain.assert_called_once_with(format='json')
+
+    def test_filtered_queryset_with_a_real_plan(self):
+        self.assertGreaterEqual(self._count(EmailJob.objects.filter(status=EmailJob.PENDING)), 4)
+
+
+class ExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.region = Region.objects.get(code='UA-05')
+        kyiv = zoneinfo.ZoneInfo('Europe/Kyiv')
+        joined = {
+            # Still February in UTC
+            'first@dyvo.ua': datetime(2025, 3, 1, 0, 30, tzinfo=kyiv),
+            'last@dyvo.ua': datetime(2025, 3, 31, 23, 59, tzinfo=kyiv),
+            # Already April in Kyiv, still March in UTC
+            'april@dyvo.ua': datetime(2025, 4, 1, 0, 0, tzinfo=kyiv),
+        }
+        for email, date_joined in joined.items():
+            user = CustomUser.objects.create_user(email=email, first_name='=HYPERLINK("x")',
+                                                  location=Point(28.4682, 49.2331, srid=4326))
+            CustomUser.objects.filter(pk=user.pk).update(date_joined=date_joined, region=cls.region)
+        CustomUser.objects.create_user(email='nowhere@dyvo.ua', first_name='Nowhere')
+
+    def _emails(self, queryset):
+        return [row[1] for row in queryset]
+
+    def test_joined_range_is_in_the_current_time_zone(self):
+        with timezone.override('Europe/Kyiv'):
+            queryset = export_queryset(joined_from=date(2025, 3, 1), joined_to=date(2025, 3, 31))
+            self.assertEqual(self._emails(queryset), ['first@dyvo.ua', 'last@dyvo.ua'])
+        with timezone.override('UTC'):
+            queryset = export_queryset(joined_from=date(2025, 3, 1), joined_to=date(2025, 3, 31))
+            self.assertEqual(self._emails(queryset), ['last@dyvo.ua', 'april@dyvo.ua'])
+
+    def test_joined_range_uses_plain_bounds(self):
+        sql = str(export_queryset(joined_from=date(2025, 3, 1), joined_to=date(2025, 3, 31)).query)
+        self.assertNotIn('AT TIME ZONE', sql)
+
+    def test_region(self):
+        self.assertEqual(len(export_queryset(region=self.region)), 3)
+
+    def test_csv(self):
+        with mock.patch('users.export.ROWS_PER_PART', 2):
+            parts = list(iter_export(export_queryset(), 'csv', chunk_size=2))
+        # Header, two parts of rows, footer
+        self.assertEqual(len(parts), 4)
+        text = ''.join(parts)
+        self.assertTrue(text.startswith('\ufeff'))
+        rows = list(csv.reader(io.StringIO(text.lstrip('\ufeff'))))
+        self.assertEqual(rows[0], EXPORT_FIELDS)
+        self.assertEqual(len(rows), 5)
+        first = dict(zip(EXPORT_FIELDS, rows[1]))
+        self.assertEqual(first['first_name'], "'=HYPERLINK(\"x\")")
+        self.assertEqual(first['region'], self.region.name)
+        self.assertAlmostEqual(float(first['longitude']), 28.4682)
+        nowhere = dict(zip(EXPORT_FIELDS, rows[4]))
+        self.assertEqual((nowhere['region'], nowhere['longitude'], nowhere['latitude']), ('', '', ''))
+
+    def test_geojson(self):
+        with mock.patch('users.export.ROWS_PER_PART', 3):
+            collection = json.loads(''.join(iter_export(export_queryset(), 'geojson')))
+        self.assertEqual(collection['type'], 'FeatureCollection')
+        features = collection['features']
+        self.assertEqual(len(features), 4)
+        self.assertEqual(features[0]['geometry']['type'], 'Point')
+        self.assertAlmostEqual(features[0]['geometry']['coordinates'][1], 49.2331)
+        self.assertEqual(features[0]['properties']['first_name'], '=HYPERLINK("x")')
+        self.assertIsNone(features[3]['geometry'])
+
+    async def test_async_export_matches_the_sync_one(self):
+        with mock.patch('users.export.ROWS_PER_PART', 3):
+            parts = [part async for part in aiter_export(export_queryset(), 'geojson')]
+            expected = await sync_to_async(lambda: list(iter_export(export_queryset(), 'geojson')))()
+        self.assertEqual(parts, expected)
+
+    def test_response_streams(self):
+        response = export_response(RequestFactory().get('/'), export_queryset(), 'geojson', filename='export')
+        self.assertTrue(response.streaming)
+        self.assertFalse(response.is_async)
+        self.assertEqual(response['Content-Type'], 'application/geo+json')
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="export.geojson"')
+        self.assertEqual(len(json.loads(b''.join(response.streaming_content))['features']), 4)
+
+
+class SignupRollupTests(TestCase):
+    def _register(self, count, joined):
+        users = [
+            CustomUser.objects.create_user(email=f'user{CustomUser.objects.count()}@dyvo.ua', first_name='Test')
+            for _ in range(count)
+        ]
+        CustomUser.objects.filter(pk__in=[user.pk for user in users]).update(date_joined=joined)
+        return users
+
+    def test_each_user_is_counted_once(self):
+        joined = timezone.now() - timedelta(days=1)
+        users = self._register(3, joined)
+        self.assertEqual(rollup_signups(batch_size=2), 3)
+        self.assertEqual(RollupWatermark.objects.get(name=SIGNUPS_ROLLUP).last_id, users[-1].pk)
+        # Nothing new, nothing counted
+        self.assertEqual(rollup_signups(), 0)
+
+        self._register(2, joined)
+        self.assertEqual(rollup_signups(), 2)
+        day = timezone.localdate(joined)
+        self.assertEqual(DailySignups.objects.get(day=day, region=None).count, 5)
+        self.assertEqual(signup_series(day, day), [{'date': day.isoformat(), 'count': 5, 'regions': {'unknown': 5}}])
+
+    def test_recent_users_wait_for_the_next_run(self):
+        self._register(1, timezone.now() - timedelta(days=1))
+        recent = self._register(1, timezone.now())
+        self.assertEqual(rollup_signups(lag=timedelta(minutes=1)), 1)
+        self.assertLess(RollupWatermark.objects.get(name=SIGNUPS_ROLLUP).last_id, recent[0].pk)
+
+        CustomUser.objects.filter(pk=recent[0].pk).update(date_joined=timezone.now() - timedelta(minutes=2))
+        self.assertEqual(rollup_signups(lag=timedelta(minutes=1)), 1)
+        self.assertEqual(RollupWatermark.objects.get(name=SIGNUPS_ROLLUP).last_id, recent[0].pk)
+
+
+class UserSearchTests(TestCase):
+    kyiv = (30.5234, 50.4501)
+
+    @classmethod
+    def setUpTestData(cls):
+        def user(email, first_name, location=None):
+            return CustomUser.objects.create_user(
+                email=email, first_name=first_name, location=location and Point(*location, srid=4326),
+            )
+
+        cls.exact = user('o.k@dyvo.ua', 'Oleksandr', (30.5300, 50.4500))
+        cls.by_email = user('oleksandr.m@dyvo.ua', 'Mariia', (30.6000, 50.4000))
+        cls.longer = user('sasha@dyvo.ua', 'Oleksandra', (24.0316, 49.8429))
+        cls.nowhere = user('n@dyvo.ua', 'Oleksandr')
+        user('olena@dyvo.ua', 'Olena', cls.kyiv)
+
+    def _pks(self, users):
+        return [user.pk for user in users]
+
+    def test_best_matches_first(self):
+        users = list(search_users(CustomUser.objects.all(), 'oleksandr'))
+        # Whole words rank 1 whatever the case or the column, ties by id
+        self.assertEqual(self._pks(users), [self.exact.pk, self.by_email.pk, self.nowhere.pk, self.longer.pk])
+        ranks = {user.pk: user.search_rank for user in users}
+        self.assertAlmostEqual(ranks[self.exact.pk], 1.0)
+        self.assertAlmostEqual(ranks[self.by_email.pk], 1.0)
+        self.assertLess(ranks[self.longer.pk], 1.0)
+        self.assertGreater(ranks[self.longer.pk], 0.6)
+
+    def test_dissimilar_names_are_left_out(self):
+        self.assertEqual(list(search_users(CustomUser.objects.all(), 'Petro')), [])
+
+    def test_within_the_radius(self):
+        users = list(search_users(CustomUser.objects.all(), 'Oleksandr', near=self.kyiv, radius=10_000))
+        self.assertEqual(self._pks(users), [self.exact.pk, self.by_email.pk])
+        distances = {user.pk: user.distance.m for user in users}
+        self.assertAlmostEqual(distances[self.exact.pk], 460, delta=20)
+        self.assertLess(distances[self.by_email.pk], 10_000)
+
+    def test_radius_bounds_the_distance(self):
+        users = search_users(CustomUser.objects.all(), 'Oleksandr', near=self.kyiv, radius=1_000)
+        self.assertEqual(self._pks(users), [self.exact.pk])
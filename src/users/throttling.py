@@ -0,0 +1,198 @@
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+from django.core.cache import caches
+
+
+class MemoryLimiter:
+    """
+    Sliding-window log kept in process memory: a key is limited once it has
+    ``limit`` hits within the last ``window`` seconds. Exact, but every
+    worker process counts on its own.
+    """
+
+    # Sweep keys whose hits all expired once this many keys are tracked
+    sweep_above = 10_000
+
+    def __init__(self, window):
+        self.window = window
+        self._hits = {}
+        self._lock = threading.Lock()
+
+    def retry_after(self, key, limit):
+        """Seconds until ``key`` may try again, 0 if it is not limited."""
+        now = time.monotonic()
+        with self._lock:
+            hits = self._hits.get(key)
+            if not hits:
+                return 0
+            self._expire(hits, now)
+            if len(hits) < limit:
+                return 0
+            return hits[-limit] + self.window - now
+
+    def acquire(self, key, limit):
+        """
+        Count an attempt for ``key`` unless it is limited. Returns 0 when the
+        attempt was counted, else the seconds until ``key`` may try again.
+        Check and count happen under one lock, so concurrent attempts cannot
+        all slip in under the limit.
+        """
+        now = time.monotonic()
+        with self._lock:
+            if len(self._hits) > self.sweep_above:
+                self._sweep(now)
+            hits = self._hits.setdefault(key, deque())
+            self._expire(hits, now)
+            if len(hits) >= limit:
+                return hits[-limit] + self.window - now
+            hits.append(now)
+            return 0
+
+    def release(self, key):
+        """Take back the last attempt counted for ``key``."""
+        with self._lock:
+            hits = self._hits.get(key)
+            if hits:
+                hits.pop()
+
+    def reset(self, key):
+        with self._lock:
+            self._hits.pop(key, None)
+
+    def _expire(self, hits, now):
+        while hits and hits[0] <= now - self.window:
+            hits.popleft()
+
+    def _sweep(self, now):
+        for key in [key for key, hits in self._hits.items() if not hits or hits[-1] <= now - self.window]:
+            del self._hits[key]
+
+
+class CacheLimiter:
+    """
+    Sliding window approximated from two fixed-window counters in a Django
+    cache, so all processes that share the cache share the limits. The
+    previous window counts in proportion to how much of it still overlaps.
+
+    ``acquire()`` increments first and takes the attempt back when that went
+    over the limit, so it is only as atomic as the backend's ``incr()``:
+    exact with memcached or Redis, close with the local memory cache, and
+    approximate with the file cache, whose ``incr()`` is a read and a write.
+    """
+
+    key_prefix = 'throttle'
+
+    def __init__(self, window, alias='default'):
+        self.window = window
+        self.cache = caches[alias]
+
+    def _keys(self, key, now):
+        slot = int(now // self.window)
+        return f'{self.key_prefix}:{key}:{slot}', f'{self.key_prefix}:{key}:{slot - 1}'
+
+    def retry_after(self, key, limit):
+        now = time.time()
+        current_key, previous_key = self._keys(key, now)
+        counts = self.cache.get_many([current_key, previous_key])
+        elapsed = now % self.window
+        weighted = counts.get(current_key, 0) + counts.get(previous_key, 0) * (1 - elapsed / self.window)
+        return 0 if weighted < limit else self.window - elapsed
+
+    def acquire(self, key, limit):
+        now = time.time()
+        current_key, previous_key = self._keys(key, now)
+        self.cache.add(current_key, 0, timeout=self.window * 2)
+        try:
+            count = self.cache.incr(current_key)
+        except ValueError:
+            # Evicted between add() and incr()
+            self.cache.set(current_key, 1, timeout=self.window * 2)
+            count = 1
+        elapsed = now % self.window
+        weighted = count + self.cache.get(previous_key, 0) * (1 - elapsed / self.window)
+        if weighted <= limit:
+            return 0
+        self._decrement(current_key)
+        return self.window - elapsed
+
+    def release(self, key):
+        # The current window, even if the attempt was counted in the one before
+        self._decrement(self._keys(key, time.time())[0])
+
+    def _decrement(self, cache_key):
+        try:
+            if self.cache.decr(cache_key) < 0:
+                self.cache.set(cache_key, 0, timeout=self.window * 2)
+        except ValueError:
+            pass
+
+    def reset(self, key):
+        now = time.time()
+        self.cache.delete_many(self._keys(key, now))
+
+
+_limiter = None
+_limiter_lock = threading.Lock()
+
+
+def get_login_limiter():
+    global _limiter
+    if _limiter is None:
+        with _limiter_lock:
+            if _limiter is None:
+                options = settings.LOGIN_THROTTLE
+                if options['BACKEND'] == 'cache':
+                    _limiter = CacheLimiter(options['WINDOW'], options.get('CACHE_ALIAS', 'default'))
+                else:
+                    _limiter = MemoryLimiter(options['WINDOW'])
+    return _limiter
+
+
+def login_throttle_keys(request, email):
+    """``(key, limit)`` pairs checked before a login attempt is allowed to hash."""
+    options = settings.LOGIN_THROTTLE
+    # REMOTE_ADDR is the client when the server trusts the proxy headers
+    # (uvicorn/gunicorn forwarded_allow_ips)
+    return [
+        (f"login:ip:{request.META.get('REMOTE_ADDR', '')}", options['IP_LIMIT']),
+        (f'login:email:{email.lower()}', options['EMAIL_LIMIT']),
+    ]
+
+
+def reserve_login_attempt(request, email):
+    """
+    Count a login attempt against the client IP and the email before any
+    password is hashed. Returns 0 to go ahead, else the seconds to wait; a
+    refused attempt is not counted against either key.
+    """
+    limiter = get_login_limiter()
+    acquired = []
+    for key, limit in login_throttle_keys(request, email):
+        retry_after = limiter.acquire(key, limit)
+        if retry_after:
+            for acquired_key in acquired:
+                limiter.release(acquired_key)
+            return retry_after
+        acquired.append(key)
+    return 0
+
+
+def reserve_email_check(request):
+    """
+    Count an email availability lookup against the client IP, so the
+    endpoint cannot be used to find out which emails are registered.
+    Returns 0 to go ahead, else the seconds to wait.
+    """
+    key = f"email-check:ip:{request.META.get('REMOTE_ADDR', '')}"
+    return get_login_limiter().acquire(key, settings.LOGIN_THROTTLE['EMAIL_CHECK_LIMIT'])
+
+
+def login_succeeded(request, email):
+    """Clear the email's failures and take back the IP's attempt."""
+    limiter = get_login_limiter()
+    (ip_key, _), (email_key, _) = login_throttle_keys(request, email)
+    limiter.release(ip_key)
+    limiter.reset(email_key)
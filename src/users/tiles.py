@@ -0,0 +1,177 @@
+import math
+import os
+import shutil
+import threading
+import time
+from pathlib import Path
+
+from django.conf import settings
+
+# Half the extent of the Web Mercator (EPSG:3857) square, in meters
+MERCATOR_HALF_EXTENT = 20037508.342789244
+# Latitude where Web Mercator ends
+MAX_LATITUDE = 85.0511287798066
+
+# Only users whose row changes in these fields can change a tile
+TILE_FIELDS = {'location', 'is_active'}
+
+
+def tile_size(z):
+    """Width of a tile at zoom ``z`` in Web Mercator meters."""
+    return 2 * MERCATOR_HALF_EXTENT / 2**z
+
+
+def cluster_cell_size(z):
+    return tile_size(z) / settings.TILES['CLUSTER_CELLS']
+
+
+def tile_for_point(point, z):
+    """``(x, y)`` of the tile containing a WGS 84 ``point`` at zoom ``z``."""
+    n = 2**z
+    lat = math.radians(max(-MAX_LATITUDE, min(MAX_LATITUDE, point.y)))
+    x = int((point.x + 180) / 360 * n)
+    y = int((1 - math.asinh(math.tan(lat)) / math.pi) / 2 * n)
+    return min(max(x, 0), n - 1), min(max(y, 0), n - 1)
+
+
+def is_valid_tile(z, x, y):
+    return 0 <= z <= settings.TILES['MAX_ZOOM'] and 0 <= x < 2**z and 0 <= y < 2**z
+
+
+class TileCache:
+    """
+    Rendered tiles as files ``directory/z/x/y.mvt``, shared by every worker
+    process, bounded to ``max_bytes`` by ``prune()``.
+
+    A hit touches the file's mtime, so mtimes order the tiles by last use.
+    Requests never walk the directory: ``manage.py prune_tiles`` deletes the
+    least recently used tiles down to 90% of the bound, so between two runs
+    the cache can grow past it.
+
+    Invalidation leaves a marker file stamped with the time, ``y.stale`` next
+    to the tile or ``CLEARED`` for the whole cache. A render passes the time
+    it started to ``set()``, which throws the tile away again when a marker
+    is newer: the render may have read the rows from before the change.
+    """
+
+    cleared_marker = 'CLEARED'
+    # Markers outlive any render, after that they only take up inodes
+    marker_max_age = 600
+
+    def __init__(self, directory, max_bytes):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+
+    def _path(self, z, x, y):
+        return self.directory / str(z) / str(x) / f'{y}.mvt'
+
+    def now(self):
+        """Timestamp to take before rendering and pass to ``set()``."""
+        return time.time_ns()
+
+    def get(self, z, x, y):
+        path = self._path(z, x, y)
+        try:
+            data = path.read_bytes()
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return data
+
+    def set(self, z, x, y, data, started=None):
+        """Store a tile rendered since ``started``; False if it went stale meanwhile."""
+        path = self._path(z, x, y)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Readers never see half a file
+        temp = path.with_name(f'{path.name}.{os.getpid()}.{threading.get_ident()}.tmp')
+        temp.write_bytes(data)
+        os.replace(temp, path)
+
+        # Checked after the file is in place: an invalidation that comes later
+        # deletes it, one that came earlier is seen here
+        if started is not None and self._invalidated_since(path, started):
+            path.unlink(missing_ok=True)
+            return False
+        return True
+
+    def delete(self, z, x, y):
+        path = self._path(z, x, y)
+        self._stamp(path.with_suffix('.stale'))
+        path.unlink(missing_ok=True)
+
+    def clear(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+        self._stamp(self.directory / self.cleared_marker)
+
+    def _stamp(self, marker):
+        marker.parent.mkdir(parents=True, exist_ok=True)
+        marker.touch()
+        # Set explicitly, filesystem timestamps can lag behind the clock
+        now = time.time_ns()
+        os.utime(marker, ns=(now, now))
+
+    def _invalidated_since(self, path, started):
+        for marker in (path.with_suffix('.stale'), self.directory / self.cleared_marker):
+            try:
+                if os.stat(marker).st_mtime_ns >= started:
+                    return True
+            except FileNotFoundError:
+                pass
+        return False
+
+    def _files(self):
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                yield name, stat, path
+
+    def prune(self):
+        """
+        Delete least recently used tiles down to 90% of ``max_bytes`` and
+        expired markers and leftover temp files. Returns ``(deleted tiles,
+        bytes left)``.
+        """
+        tiles = []
+        expired = time.time() - self.marker_max_age
+        for name, stat, path in self._files():
+            if name.endswith('.mvt'):
+                tiles.append((stat.st_mtime, stat.st_size, path))
+            elif name.endswith(('.stale', '.tmp')) and stat.st_mtime < expired:
+                Path(path).unlink(missing_ok=True)
+
+        tiles.sort()
+        size = sum(file_size for _, file_size, _ in tiles)
+        deleted = 0
+        if size > self.max_bytes:
+            for _, file_size, path in tiles:
+                if size <= self.max_bytes * 0.9:
+                    break
+                Path(path).unlink(missing_ok=True)
+                size -= file_size
+                deleted += 1
+        return deleted, size
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_tile_cache():
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = TileCache(settings.TILES['CACHE_DIR'], settings.TILES['CACHE_MAX_BYTES'])
+    return _cache
+
+
+def invalidate_tiles(points):
+    """Drop the cached tiles containing any of ``points``, one per zoom level."""
+    cache = get_tile_cache()
+    for point in points:
+        for z in range(settings.TILES['MAX_ZOOM'] + 1):
+            cache.delete(z, *tile_for_point(point, z))
@@ -1,8 +1,16 @@
 ﻿from django.urls import path
-from .views import register_view, terms_view, login_view
+from .views import (register_view, terms_view, login_view, nearby_view, email_available_view, settlements_view,
+                    signup_stats_view, tile_view, user_search_view, metrics_view)
 
 urlpatterns = [
     path('register/', register_view, name='register'),
     path('terms/', terms_view, name='terms'),
     path('login/', login_view, name='login'),
+    path('api/nearby/', nearby_view, name='nearby'),
+    path('api/email-available/', email_available_view, name='email_available'),
+    path('api/settlements/', settlements_view, name='settlements'),
+    path('api/stats/signups/', signup_stats_view, name='signup_stats'),
+    path('api/users/search/', user_search_view, name='user_search'),
+    path('tiles/<int:z>/<int:x>/<int:y>.mvt', tile_view, name='tile'),
+    path('metrics', metrics_view, name='metrics'),
 ]
@@ -1,26 +1,332 @@
+import ipaddress
+import math
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.core import signing
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import IntegrityError
+from django.http import Http404, HttpResponse, JsonResponse
 from django.shortcuts import render, redirect
-from django.contrib.auth import login
-from .forms import RegistrationForm
+from django.utils import timezone
+from django.utils.cache import patch_cache_control
+from django.utils.crypto import constant_time_compare
+from django.contrib.auth import aauthenticate, alogin
+from django.views.decorators.http import require_GET
+from . import metrics
+from .analytics import signup_series
+from .availability import is_email_available, mark_registered
+from .caching import cache_anonymous_page
+from .forms import LoginForm, RegistrationForm
+from .hashing import aset_password
+from .mail import asave_with_welcome_email
+from .models import AuthEvent, CustomUser
+from .regions import aget_regions, get_regions
+from .search import MIN_QUERY_LENGTH, search_users
+from .settlements import get_settlement_index
+from .throttling import login_succeeded, reserve_email_check, reserve_login_attempt
+from .tiles import cluster_cell_size, get_tile_cache, is_valid_tile
+from .writebehind import record_event
+
+NEARBY_PAGE_SIZE = 20
+NEARBY_MAX_PAGE_SIZE = 100
+NEARBY_CURSOR_SALT = 'users.nearby'
+NEARBY_CURSOR_MAX_AGE = 60 * 60
+# Exposed precision: distances in whole kilometers, measured from a point
+# snapped to 0.01° (about 1 km), so moving the reference point around does
+# not narrow down where anyone is
+NEARBY_DISTANCE_STEP = 1000
+NEARBY_ORIGIN_PRECISION = 2
+SETTLEMENTS_PAGE_SIZE = 10
+SIGNUP_STATS_DAYS = 30
+SIGNUP_STATS_MAX_DAYS = 366
+USER_SEARCH_PAGE_SIZE = 20
+USER_SEARCH_MAX_PAGE_SIZE = 100
+USER_SEARCH_MAX_RADIUS = 1_000_000
+
 
+@cache_anonymous_page
+async def register_view(request):
+    # Warm the region cache with the async ORM; after that the form is
+    # validated and rendered without touching the database
+    await aget_regions()
 
-def register_view(request):
     if request.method == 'POST':
         form = RegistrationForm(request.POST)
         if form.is_valid():
-            user = form.save(commit=False)
-            user.set_password(form.cleaned_data['password'])
-            user.save()
-            login(request, user)
-            return redirect('home')
+            email = form.cleaned_data['email']
+            # Cheap check before hashing, the unique index still decides races
+            if await CustomUser.objects.filter(email__lower=email.lower()).aexists():
+                form.add_error('email', RegistrationForm.EMAIL_TAKEN_ERROR)
+            else:
+                user = form.build_user()
+                # The only password hash of the request, computed off the event loop
+                await aset_password(user, form.cleaned_data['password'])
+                try:
+                    # The welcome mail is queued with the user, sent by the
+                    # worker; the response never waits for SMTP
+                    await asave_with_welcome_email(user)
+                except IntegrityError:
+                    # Lost the race for this email (case-insensitive unique index)
+                    form.add_error('email', RegistrationForm.EMAIL_TAKEN_ERROR)
+                else:
+                    mark_registered(user.email)
+                    record_event(AuthEvent.REGISTER, request, user)
+                    await alogin(request, user)
+                    return redirect(settings.LOGIN_REDIRECT_URL)
     else:
         form = RegistrationForm()
 
     return render(request, 'users/register.html', {'form': form})
 
 
-def terms_view(request):
+@cache_anonymous_page
+async def terms_view(request):
     return render(request, 'users/terms.html')
 
 
-def login_view(request):
-    return render(request, 'users/login.html')
+@cache_anonymous_page
+async def login_view(request):
+    status = 200
+    if request.method == 'POST':
+        form = LoginForm(request.POST)
+        if form.is_valid():
+            email = form.cleaned_data['username']
+            # Counted before the backend gets to hash anything, so a burst of
+            # concurrent attempts cannot get past the limit either
+            retry_after = reserve_login_attempt(request, email)
+            if retry_after:
+                form.add_error(None, LoginForm.THROTTLED_ERROR.format(minutes=math.ceil(retry_after / 60)))
+                status = 429
+            else:
+                user = await aauthenticate(request, username=email, password=form.cleaned_data['password'])
+                if user is None:
+                    record_event(AuthEvent.LOGIN_FAILED, request, email=email)
+                    form.add_error(None, LoginForm.INVALID_LOGIN_ERROR)
+                else:
+                    login_succeeded(request, email)
+                    await alogin(request, user)
+                    return redirect(settings.LOGIN_REDIRECT_URL)
+    else:
+        form = LoginForm()
+
+    response = render(request, 'users/login.html', {'form': form}, status=status)
+    if status == 429:
+        response['Retry-After'] = str(math.ceil(retry_after))
+    return response
+
+
+@require_GET
+def nearby_view(request):
+    if not request.user.is_authenticated:
+        return JsonResponse({'error': 'Увійдіть, щоб бачити користувачів поруч.'}, status=401)
+    # Reference point: explicit ?lng=&lat= or the caller's own location
+    exclude_pk = None
+    if 'lng' in request.GET or 'lat' in request.GET:
+        try:
+            lng = float(request.GET['lng'])
+            lat = float(request.GET['lat'])
+        except (KeyError, ValueError):
+            return JsonResponse({'error': 'Некоректні координати.'}, status=400)
+        if not (-180 <= lng <= 180 and -90 <= lat <= 90):
+            return JsonResponse({'error': 'Некоректні координати.'}, status=400)
+    elif request.user.location is not None:
+        lng, lat = request.user.location.coords
+        exclude_pk = request.user.pk
+    else:
+        return JsonResponse({'error': 'Вкажіть координати або область у профілі.'}, status=400)
+    lng, lat = round(lng, NEARBY_ORIGIN_PRECISION), round(lat, NEARBY_ORIGIN_PRECISION)
+
+    try:
+        limit = int(request.GET.get('limit', NEARBY_PAGE_SIZE))
+    except ValueError:
+        return JsonResponse({'error': 'Некоректний параметр limit.'}, status=400)
+    limit = max(1, min(limit, NEARBY_MAX_PAGE_SIZE))
+
+    after = None
+    if request.GET.get('cursor'):
+        try:
+            after = signing.loads(request.GET['cursor'], salt=NEARBY_CURSOR_SALT, max_age=NEARBY_CURSOR_MAX_AGE)
+        except signing.SignatureExpired:
+            return JsonResponse({'error': 'Курсор застарів, почніть з першої сторінки.'}, status=400)
+        except signing.BadSignature:
+            return JsonResponse({'error': 'Некоректний курсор.'}, status=400)
+        if not (isinstance(after, list) and len(after) == 2 and all(isinstance(value, int) for value in after)):
+            # Issued by an older version
+            return JsonResponse({'error': 'Некоректний курсор.'}, status=400)
+
+    users = CustomUser.objects.nearby(lng, lat, limit=limit, after=after, exclude_pk=exclude_pk)
+    for user in users:
+        # Rounded up: "within N km", never 0
+        user['distance_m'] = max(1, math.ceil(user['distance'] / NEARBY_DISTANCE_STEP)) * NEARBY_DISTANCE_STEP
+
+    next_cursor = None
+    if len(users) == limit:
+        # Signed, not encrypted: the pk and the lower bound of the distance
+        # bucket, both shown in the response anyway
+        last = users[-1]
+        next_cursor = signing.dumps([last['pk'], last['distance_m'] - NEARBY_DISTANCE_STEP], salt=NEARBY_CURSOR_SALT)
+
+    return JsonResponse({
+        'results': [
+            {'id': user['pk'], 'first_name': user['first_name'], 'distance_m': user['distance_m']}
+            for user in users
+        ],
+        'next_cursor': next_cursor,
+    })
+
+
+@require_GET
+def email_available_view(request):
+    email = request.GET.get('email', '').strip()
+    try:
+        validate_email(email)
+    except ValidationError:
+        return JsonResponse({'error': 'Введіть коректну електронну адресу.'}, status=400)
+    retry_after = reserve_email_check(request)
+    if retry_after:
+        response = JsonResponse({'error': 'Забагато перевірок. Спробуйте пізніше.'}, status=429)
+        response['Retry-After'] = str(math.ceil(retry_after))
+    else:
+        response = JsonResponse({'email': email, 'available': is_email_available(email)})
+    # Every lookup has to reach the limiter, not a copy cached by the proxy
+    patch_cache_control(response, private=True, no_store=True)
+    return response
+
+
+@require_GET
+def settlements_view(request):
+    try:
+        limit = int(request.GET.get('limit', SETTLEMENTS_PAGE_SIZE))
+    except ValueError:
+        return JsonResponse({'error': 'Некоректний параметр limit.'}, status=400)
+
+    settlements = get_settlement_index().search(request.GET.get('q', ''), limit=max(1, limit))
+    region_names = {region.code: region.name for region in get_regions().values()}
+    response = JsonResponse({
+        'results': [
+            {'id': settlement.id, 'name': settlement.name, 'region': region_names.get(settlement.region_code)}
+            for settlement in settlements
+        ],
+    })
+    # The gazetteer only changes with a release
+    patch_cache_control(response, public=True, max_age=3600)
+    return response
+
+
+@require_GET
+def tile_view(request, z, x, y):
+    if not is_valid_tile(z, x, y):
+        raise Http404
+    cache = get_tile_cache()
+    data = cache.get(z, x, y)
+    if data is None:
+        started = cache.now()
+        data = CustomUser.objects.tile(z, x, y, cluster_cell_size(z))
+        cache.set(z, x, y, data, started)
+    response = HttpResponse(data, content_type='application/vnd.mapbox-vector-tile')
+    # Invalidation only reaches the server cache, keep browser copies short
+    patch_cache_control(response, public=True, max_age=settings.TILES['MAX_AGE'])
+    return response
+
+
+@require_GET
+def signup_stats_view(request):
+    # For the operations dashboards, read from the rollup and never from the
+    # user table (see analytics.rollup_signups)
+    if not request.user.is_staff:
+        return JsonResponse({'error': 'Доступ лише для персоналу.'}, status=403)
+    try:
+        end = date.fromisoformat(request.GET['to']) if request.GET.get('to') else timezone.localdate()
+        start = (
+            date.fromisoformat(request.GET['from']) if request.GET.get('from')
+            else end - timedelta(days=SIGNUP_STATS_DAYS - 1)
+        )
+    except ValueError:
+        return JsonResponse({'error': 'Некоректна дата.'}, status=400)
+    if not 0 <= (end - start).days < SIGNUP_STATS_MAX_DAYS:
+        return JsonResponse({'error': f'Період має бути від 1 до {SIGNUP_STATS_MAX_DAYS} днів.'}, status=400)
+
+    region = None
+    if request.GET.get('region'):
+        regions = {region.code: region for region in get_regions().values()}
+        region = regions.get(request.GET['region'])
+        if region is None:
+            return JsonResponse({'error': 'Невідома область.'}, status=400)
+
+    series = signup_series(start, end, region)
+    response = JsonResponse({
+        'from': start.isoformat(),
+        'to': end.isoformat(),
+        'total': sum(day['count'] for day in series),
+        'days': series,
+    })
+    patch_cache_control(response, private=True, max_age=60)
+    return response
+
+
+@require_GET
+def user_search_view(request):
+    # Emails are personal data, staff only like the admin that also uses it
+    if not request.user.is_staff:
+        return JsonResponse({'error': 'Доступ лише для персоналу.'}, status=403)
+    query = request.GET.get('q', '').strip()
+    if len(query) < MIN_QUERY_LENGTH:
+        return JsonResponse({'error': f'Запит має містити щонайменше {MIN_QUERY_LENGTH} символи.'}, status=400)
+
+    try:
+        limit = int(request.GET.get('limit', USER_SEARCH_PAGE_SIZE))
+    except ValueError:
+        return JsonResponse({'error': 'Некоректний параметр limit.'}, status=400)
+    limit = max(1, min(limit, USER_SEARCH_MAX_PAGE_SIZE))
+
+    # Optional distance filter: ?lng=&lat=&radius= (meters)
+    near = radius = None
+    if 'lng' in request.GET or 'lat' in request.GET:
+        try:
+            lng = float(request.GET['lng'])
+            lat = float(request.GET['lat'])
+            radius = float(request.GET['radius'])
+        except (KeyError, ValueError):
+            return JsonResponse({'error': 'Вкажіть lng, lat і radius у метрах.'}, status=400)
+        if not (-180 <= lng <= 180 and -90 <= lat <= 90):
+            return JsonResponse({'error': 'Некоректні координати.'}, status=400)
+        if not 0 < radius <= USER_SEARCH_MAX_RADIUS:
+            return JsonResponse({'error': f'Радіус має бути до {USER_SEARCH_MAX_RADIUS} м.'}, status=400)
+        near = (lng, lat)
+
+    users = search_users(CustomUser.objects.filter(is_active=True), query, near, radius)
+    fields = ['pk', 'email', 'first_name', 'search_rank'] + (['distance'] if near else [])
+    results = []
+    for user in users.values(*fields)[:limit]:
+        result = {
+            'id': user['pk'],
+            'email': user['email'],
+            'first_name': user['first_name'],
+            'rank': round(user['search_rank'], 3),
+        }
+        if near:
+            result['distance_m'] = round(user['distance'].m, 1)
+        results.append(result)
+    return JsonResponse({'results': results})
+
+
+def _may_scrape(request):
+    token = settings.METRICS_TOKEN
+    if token and constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return True
+    try:
+        client = ipaddress.ip_address(request.META.get('REMOTE_ADDR', ''))
+    except ValueError:
+        return False
+    return any(client in ipaddress.ip_network(network) for network in settings.METRICS_ALLOWED_NETWORKS)
+
+
+@require_GET
+def metrics_view(request):
+    # Per worker process, and not for the public: only allowed networks or
+    # the scrape token (see docs); nginx does not route it either
+    if not _may_scrape(request):
+        raise Http404
+    return HttpResponse(metrics.expose(), content_type='text/plain; version=0.0.4; charset=utf-8')
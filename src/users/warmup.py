@@ -0,0 +1,94 @@
+import logging
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connections
+from django.template import engines
+from django.urls import URLResolver, get_resolver
+
+from .hashing import _measure_check_duration
+from .regions import get_region_index, get_regions
+from .settlements import get_settlement_index
+
+logger = logging.getLogger(__name__)
+
+
+def _compile_url_patterns(patterns):
+    for pattern in patterns:
+        # Regexes compile on first access
+        pattern.pattern.regex
+        if isinstance(pattern, URLResolver):
+            _compile_url_patterns(pattern.url_patterns)
+
+
+def warm_urls():
+    resolver = get_resolver()
+    _compile_url_patterns(resolver.url_patterns)
+    # Builds the lookup tables behind every reverse()
+    resolver.reverse_dict
+
+
+def warm_templates():
+    """Compile the project's own templates into the cached loader."""
+    base_dir = Path(settings.BASE_DIR)
+    for engine in engines.all():
+        for directory in engine.template_dirs:
+            directory = Path(directory)
+            if not directory.is_relative_to(base_dir):
+                continue
+            for path in directory.rglob('*'):
+                if path.is_file():
+                    engine.get_template(path.relative_to(directory).as_posix())
+
+
+def warm_database():
+    """Open the pool and wait for its ``min_size`` connections."""
+    connection = connections['default']
+    pool = connection.pool
+    if pool is None:
+        connection.ensure_connection()
+    else:
+        pool.open()
+        pool.wait(timeout=settings.DATABASES['default']['OPTIONS']['pool'].get('timeout', 30))
+
+
+def warm_regions():
+    get_regions()
+    if settings.REGION_LOOKUP_IN_MEMORY:
+        get_region_index()
+
+
+def warm_up(database=True):
+    """
+    Do the work that otherwise lands on the first requests of a worker and
+    return ``{step: seconds}``. Without ``database`` only steps that are safe
+    before a fork run: no connections, no threads, just memory that forked
+    workers share copy-on-write. Failed steps are logged and skipped.
+    """
+    steps = [
+        ('urls', warm_urls),
+        ('templates', warm_templates),
+        ('settlements', get_settlement_index),
+        ('password check', _measure_check_duration),
+    ]
+    if database:
+        steps += [('database', warm_database), ('regions', warm_regions)]
+
+    timings = {}
+    for name, step in steps:
+        started = time.perf_counter()
+        try:
+            step()
+        except Exception:
+            logger.exception('Warmup step %r failed', name)
+            continue
+        timings[name] = time.perf_counter() - started
+    if database:
+        # Back to the pool, the worker's requests take them from there
+        connections.close_all()
+    return timings
+
+
+def describe(timings):
+    return ', '.join(f'{name} {seconds * 1000:.0f} ms' for name, seconds in timings.items())
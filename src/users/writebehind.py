@@ -0,0 +1,213 @@
+import atexit
+import ipaddress
+import logging
+import threading
+from collections import Counter
+
+from django.conf import settings
+from django.db import InterfaceError, OperationalError, connection, connections, transaction
+from django.utils import timezone
+
+from . import metrics
+from .models import AuthEvent, CustomUser
+
+logger = logging.getLogger(__name__)
+
+LAST_LOGIN = 'last_login'
+STAGING_TABLE = 'auth_event_staging'
+
+
+class WriteBehindBuffer:
+    """
+    Side effects of signing in, kept in process memory and written by a
+    background thread instead of inside the request: ``last_login`` updates,
+    coalesced to the latest per user, and ``AuthEvent`` rows. One flush is
+    one transaction with an ``UPDATE ... FROM (VALUES ...)`` and a COPY.
+
+    A flush runs every ``flush_interval`` seconds, as soon as ``batch_size``
+    events are waiting, and at shutdown. At most ``max_pending`` events and
+    as many users are held; past that, new ones are dropped and counted in
+    ``dyvo_write_behind_dropped_total``. A process killed without shutting
+    down loses what it had not flushed.
+    """
+
+    def __init__(self, batch_size, flush_interval, max_pending):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._events = []
+        self._last_logins = {}
+        self._lock = threading.Lock()
+        # Only one flush writes at a time (the thread and the shutdown flush)
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+
+    def record_login(self, user):
+        with self._lock:
+            if user.pk in self._last_logins or len(self._last_logins) < self.max_pending:
+                self._last_logins[user.pk] = max(user.last_login, self._last_logins.get(user.pk, user.last_login))
+                dropped = False
+            else:
+                dropped = True
+        if dropped:
+            metrics.WRITE_BEHIND_DROPPED.inc(LAST_LOGIN)
+        self._started()
+
+    def record_event(self, kind, user_id, email, ip, user_agent):
+        with self._lock:
+            if len(self._events) < self.max_pending:
+                self._events.append((kind, user_id, email, ip, user_agent, timezone.now()))
+                full = len(self._events) >= self.batch_size
+                dropped = False
+            else:
+                full = dropped = True
+        if dropped:
+            metrics.WRITE_BEHIND_DROPPED.inc(kind)
+        if full:
+            self._wakeup.set()
+        self._started()
+
+    def _started(self):
+        # Also restarts the thread in a process forked from one that had it
+        if self._thread is None or not self._thread.is_alive():
+            with self._lock:
+                if self._thread is None or not self._thread.is_alive():
+                    self._thread = threading.Thread(target=self._run, name='write-behind', daemon=True)
+                    self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('Write-behind flush failed')
+            finally:
+                # Hand the connection back to the pool between flushes
+                connections.close_all()
+
+    def flush(self):
+        """Write everything buffered so far, return how many rows went out."""
+        with self._flush_lock:
+            with self._lock:
+                events, self._events = self._events, []
+                last_logins, self._last_logins = self._last_logins, {}
+            if not events and not last_logins:
+                return 0
+            try:
+                self._write(events, last_logins)
+            except (OperationalError, InterfaceError):
+                # The database is unreachable, keep what fits for the next flush
+                logger.warning('Write-behind flush failed, retrying later', exc_info=True)
+                self._requeue(events, last_logins)
+                return 0
+            except Exception:
+                # Retrying would fail the same way and hold up everything after it
+                self._count(metrics.WRITE_BEHIND_DROPPED, events, len(last_logins))
+                raise
+            self._count(metrics.WRITE_BEHIND_WRITTEN, events, len(last_logins))
+            return len(events) + len(last_logins)
+
+    def _write(self, events, last_logins):
+        users = connection.ops.quote_name(CustomUser._meta.db_table)
+        auth_events = connection.ops.quote_name(AuthEvent._meta.db_table)
+        with transaction.atomic(), connection.cursor() as cursor:
+            # In id order, so concurrent flushes from other workers lock the
+            # same rows in the same order and cannot deadlock
+            pending = sorted(last_logins.items())
+            for start in range(0, len(pending), self.batch_size):
+                chunk = pending[start:start + self.batch_size]
+                values = ', '.join(['(%s::bigint, %s::timestamptz)'] * len(chunk))
+                cursor.execute(
+                    f'UPDATE {users} AS u SET last_login = v.last_login '
+                    f'FROM (VALUES {values}) AS v (id, last_login) '
+                    'WHERE u.id = v.id AND (u.last_login IS NULL OR u.last_login < v.last_login)',
+                    [value for row in chunk for value in row],
+                )
+
+            if events:
+                cursor.execute(
+                    f'CREATE TEMPORARY TABLE {STAGING_TABLE} ('
+                    'kind varchar(16), user_id bigint, email varchar(254), ip inet, '
+                    'user_agent varchar(255), created_at timestamptz'
+                    ') ON COMMIT DROP'
+                )
+                with cursor.copy(
+                    f'COPY {STAGING_TABLE} (kind, user_id, email, ip, user_agent, created_at) FROM STDIN'
+                ) as copy:
+                    for row in events:
+                        copy.write_row(row)
+                # Users deleted since the event was recorded become NULL
+                # instead of failing the foreign key
+                cursor.execute(
+                    f'INSERT INTO {auth_events} (kind, user_id, email, ip, user_agent, created_at) '
+                    f'SELECT s.kind, u.id, s.email, s.ip, s.user_agent, s.created_at FROM {STAGING_TABLE} AS s '
+                    f'LEFT JOIN {users} AS u ON u.id = s.user_id ORDER BY s.created_at'
+                )
+
+    def _requeue(self, events, last_logins):
+        with self._lock:
+            kept_events = events[:max(0, self.max_pending - len(self._events))]
+            self._events[:0] = kept_events
+            kept_logins = 0
+            for pk, last_login in last_logins.items():
+                if pk in self._last_logins:
+                    self._last_logins[pk] = max(self._last_logins[pk], last_login)
+                    kept_logins += 1
+                elif len(self._last_logins) < self.max_pending:
+                    self._last_logins[pk] = last_login
+                    kept_logins += 1
+        self._count(metrics.WRITE_BEHIND_DROPPED, events[len(kept_events):], len(last_logins) - kept_logins)
+
+    def _count(self, counter, events, last_logins):
+        for kind, count in Counter(event[0] for event in events).items():
+            counter.inc(kind, count)
+        if last_logins:
+            counter.inc(LAST_LOGIN, last_logins)
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def get_buffer():
+    global _buffer
+    if _buffer is None:
+        with _buffer_lock:
+            if _buffer is None:
+                options = settings.AUTH_EVENTS
+                _buffer = WriteBehindBuffer(options['BATCH_SIZE'], options['FLUSH_INTERVAL'], options['MAX_PENDING'])
+                atexit.register(_buffer.flush)
+    return _buffer
+
+
+def flush():
+    """Write out this process's buffer, e.g. when a worker stops."""
+    return _buffer.flush() if _buffer is not None else 0
+
+
+def _client(request):
+    ip = request.META.get('REMOTE_ADDR', '') if request is not None else ''
+    try:
+        ip = str(ipaddress.ip_address(ip))
+    except ValueError:
+        # Unix sockets and test clients have no address
+        ip = None
+    user_agent = request.META.get('HTTP_USER_AGENT', '')[:255] if request is not None else ''
+    return ip, user_agent
+
+
+def record_login(request, user):
+    """Buffer ``user.last_login`` (already set on the instance) and a login event."""
+    buffer = get_buffer()
+    buffer.record_login(user)
+    buffer.record_event(AuthEvent.LOGIN, user.pk, user.email[:254], *_client(request))
+
+
+def record_event(kind, request, user=None, email=''):
+    """Buffer an ``AuthEvent`` of ``kind`` for ``user`` or, without one, for ``email``."""
+    if user is not None:
+        email = user.email
+    get_buffer().record_event(kind, user.pk if user is not None else None, email[:254], *_client(request))